@@ -0,0 +1,342 @@
+import inspect
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import torch
+from transformers import AutoConfig, GenerationConfig
+from transformers.modeling_outputs import CausalLMOutputWithPast
+
+from app.model_loader import load_causal_lm
+from app.scheduler import cache_to_layers, layers_to_cache, sample_next_tokens
+
+logger = logging.getLogger("mlops_api")
+
+SUPPORTED_BACKENDS = ("eager", "compile", "onnx")
+
+# The ONNX export lives in a subdirectory of the model snapshot
+ONNX_DIR = "onnx"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_EXPORT_INFO = "export_info.json"
+ONNX_FORMAT = "decoder-with-past/v1"
+ONNX_OPSET = 17
+
+# Blocks of a decoder layer that never see the KV cache (matched by class name suffix)
+COMPILED_MODULE_SUFFIXES = ("MLP", "RMSNorm")
+
+# Prompts of different lengths, so warm-up batches are padded like real ones
+WARMUP_PROMPTS = (
+    "Hello",
+    "Summarize the main benefits of continuous integration in two sentences.",
+    "Write a short product description for a reusable water bottle that keeps drinks cold for a whole day.",
+)
+
+
+def compile_model(model, cache_dir=None):
+    """
+    Compiles the cache-free blocks of a causal LM with torch.compile, in place.
+
+    Compiling the whole forward pass recompiles every time the KV cache grows,
+    so only the MLPs and RMSNorms of each layer are compiled, with dynamic
+    shapes. They hold most of the small elementwise ops, and since every layer
+    runs the same code they share one compiled graph. Kernels are cached in
+    `cache_dir`, so a restart on the same machine does not compile them again.
+    """
+    if cache_dir is not None:
+        # Inductor may already have filled in its default while other modules were imported
+        os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(cache_dir)
+    compiled = 0
+    for module in model.modules():
+        if type(module).__name__.endswith(COMPILED_MODULE_SUFFIXES):
+            module.compile(dynamic=True)
+            compiled += 1
+    logger.info("model_compiled modules=%s cache_dir=%s", compiled, os.environ.get("TORCHINDUCTOR_CACHE_DIR"))
+    return model
+
+
+def warm_up(tokenizer, model, texts: Sequence[str], batch_sizes: Sequence[int] = (1,), max_new_tokens: int = 4) -> float:
+    """
+    Runs a short greedy generation at each batch size and returns the seconds taken.
+
+    Covers the prefill and single-token decode shapes, so compilation (and
+    onnxruntime's first-run allocations) happen before real traffic arrives.
+    """
+    start = time.perf_counter()
+    for batch_size in batch_sizes:
+        batch = [texts[row % len(texts)] for row in range(batch_size)]
+        inputs = tokenizer(batch, return_tensors="pt", padding=True)
+        with torch.no_grad():
+            model.generate(
+                **inputs, max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=tokenizer.eos_token_id
+            )
+    return time.perf_counter() - start
+
+
+def _kv_shape(config) -> tuple:
+    head_dim = getattr(config, "head_dim", None) or config.hidden_size // config.num_attention_heads
+    return getattr(config, "num_key_value_heads", None) or config.num_attention_heads, head_dim
+
+
+def _past_names(num_layers: int) -> List[str]:
+    return [f"past_{kind}_{layer}" for layer in range(num_layers) for kind in ("key", "value")]
+
+
+class _DecoderWithPast(torch.nn.Module):
+    """Flat-tensor signature for export: past keys/values per layer in, logits and present keys/values out."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, position_ids, *past):
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=layers_to_cache(list(zip(past[0::2], past[1::2]))),
+            use_cache=True,
+        )
+        return (outputs.logits, *[t for layer in cache_to_layers(outputs.past_key_values) for t in layer])
+
+
+def export_onnx(model, output_dir) -> dict:
+    """
+    Exports a causal LM as one ONNX decoder graph with KV-cache inputs and outputs.
+
+    The same graph serves prefill (empty past, whole prompt) and decode (one
+    new token on top of the past). Writes the graph and export_info.json to
+    `output_dir` and returns the export info.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    config = model.config
+    num_layers = config.num_hidden_layers
+    kv_heads, head_dim = _kv_shape(config)
+
+    # Example shapes only; every axis below is exported as dynamic
+    batch, sequence, past = 2, 3, 4
+    example = (
+        torch.ones((batch, sequence), dtype=torch.long),
+        torch.ones((batch, past + sequence), dtype=torch.long),
+        torch.arange(past, past + sequence).expand(batch, -1),
+        *[torch.zeros((batch, kv_heads, past, head_dim), dtype=model.dtype) for _ in range(2 * num_layers)],
+    )
+    past_names = _past_names(num_layers)
+    present_names = [name.replace("past_", "present_", 1) for name in past_names]
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "total_sequence"},
+        "position_ids": {0: "batch", 1: "sequence"},
+        "logits": {0: "batch", 1: "sequence"},
+    }
+    dynamic_axes.update({name: {0: "batch", 2: "past_sequence"} for name in past_names})
+    dynamic_axes.update({name: {0: "batch", 2: "total_sequence"} for name in present_names})
+
+    # The TorchScript exporter handles the cache's data-dependent shapes with dynamic_axes
+    export_kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    start = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(
+            _DecoderWithPast(model).eval(),
+            example,
+            str(output_dir / ONNX_MODEL_FILE),
+            input_names=["input_ids", "attention_mask", "position_ids", *past_names],
+            output_names=["logits", *present_names],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            **export_kwargs,
+        )
+    info = {
+        "format": ONNX_FORMAT,
+        "num_layers": num_layers,
+        "num_key_value_heads": kv_heads,
+        "head_dim": head_dim,
+        "dtype": str(model.dtype).replace("torch.", ""),
+        "opset": ONNX_OPSET,
+    }
+    with open(output_dir / ONNX_EXPORT_INFO, "w") as f:
+        json.dump(info, f, indent=2)
+    logger.info("onnx_exported path=%s seconds=%.2f", output_dir, time.perf_counter() - start)
+    return info
+
+
+class OnnxCausalLM:
+    """
+    Causal LM running an exported decoder graph on onnxruntime (CPU).
+
+    Covers what the API uses of a transformers model: calling it runs one
+    forward pass and returns logits and a DynamicCache, so the continuous
+    scheduler can drive it, and `generate` runs a greedy or sampled decode loop
+    that honors logits processors, stopping criteria and streamers.
+    """
+
+    def __init__(self, session, config, generation_config, export_info: dict, nbytes: int = 0):
+        self.session = session
+        self.config = config
+        self.generation_config = generation_config
+        self.num_layers = export_info["num_layers"]
+        self.kv_shape = (export_info["num_key_value_heads"], export_info["head_dim"])
+        self.nbytes = nbytes
+        self.dtype = torch.float32
+        self.device = torch.device("cpu")
+        self._past_names = _past_names(self.num_layers)
+        # The exporter drops inputs the graph does not use
+        self._input_names = {graph_input.name for graph_input in session.get_inputs()}
+
+    @classmethod
+    def from_pretrained(cls, model_dir, intra_op_threads: int = 0) -> "OnnxCausalLM":
+        import onnxruntime
+
+        model_dir = Path(model_dir)
+        onnx_dir = model_dir / ONNX_DIR
+        if not (onnx_dir / ONNX_MODEL_FILE).exists():
+            raise FileNotFoundError(
+                f"No ONNX export in {onnx_dir}; run `python -m src.train` with INFERENCE_BACKEND=onnx"
+            )
+        with open(onnx_dir / ONNX_EXPORT_INFO) as f:
+            export_info = json.load(f)
+        if export_info.get("format") != ONNX_FORMAT:
+            raise ValueError(f"Unsupported ONNX export format {export_info.get('format')!r} in {onnx_dir}")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        session = onnxruntime.InferenceSession(
+            str(onnx_dir / ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+
+        config = AutoConfig.from_pretrained(str(model_dir), local_files_only=True)
+        if (model_dir / "generation_config.json").exists():
+            generation_config = GenerationConfig.from_pretrained(str(model_dir))
+        else:
+            generation_config = GenerationConfig.from_model_config(config)
+        nbytes = sum(path.stat().st_size for path in onnx_dir.iterdir() if path.is_file())
+        return cls(session, config, generation_config, export_info, nbytes)
+
+    def eval(self):
+        return self
+
+    def _run(self, input_ids, attention_mask, position_ids, layers):
+        batch = input_ids.shape[0]
+        if layers is None:
+            empty = torch.zeros((batch, self.kv_shape[0], 0, self.kv_shape[1]), dtype=self.dtype)
+            layers = [(empty, empty)] * self.num_layers
+        feeds = {
+            "input_ids": input_ids.long(),
+            "attention_mask": attention_mask.long(),
+            "position_ids": position_ids.long(),
+        }
+        feeds.update(zip(self._past_names, [t for layer in layers for t in layer]))
+        outputs = self.session.run(
+            None, {name: tensor.contiguous().numpy() for name, tensor in feeds.items() if name in self._input_names}
+        )
+        present = [torch.from_numpy(array) for array in outputs[1:]]
+        return torch.from_numpy(outputs[0]), list(zip(present[0::2], present[1::2]))
+
+    def __call__(self, input_ids, attention_mask=None, position_ids=None, past_key_values=None, use_cache=True, **kwargs):
+        layers = cache_to_layers(past_key_values) if past_key_values is not None else None
+        past_length = layers[0][0].shape[2] if layers else 0
+        if attention_mask is None:
+            attention_mask = torch.ones((input_ids.shape[0], past_length + input_ids.shape[1]), dtype=torch.long)
+        if position_ids is None:
+            position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)[:, -input_ids.shape[1]:]
+        logits, layers = self._run(input_ids, attention_mask, position_ids, layers)
+        return CausalLMOutputWithPast(logits=logits, past_key_values=layers_to_cache(layers))
+
+    def _eos_token_ids(self) -> torch.Tensor:
+        eos = self.generation_config.eos_token_id
+        return torch.tensor([token for token in (eos if isinstance(eos, (list, tuple)) else [eos]) if token is not None])
+
+    def generate(
+        self,
+        input_ids,
+        attention_mask=None,
+        max_new_tokens: int = 20,
+        do_sample: bool = False,
+        temperature: Optional[float] = None,
+        top_k: Optional[int] = None,
+        top_p: Optional[float] = None,
+        pad_token_id: Optional[int] = None,
+        logits_processor=None,
+        stopping_criteria=None,
+        streamer=None,
+        **kwargs,
+    ) -> torch.Tensor:
+        """Decodes up to `max_new_tokens` tokens per row; returns prompts and new tokens like `generate`."""
+        if kwargs:
+            raise TypeError(f"OnnxCausalLM.generate does not support {sorted(kwargs)}")
+        batch = input_ids.shape[0]
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        eos_ids = self._eos_token_ids()
+        if pad_token_id is None:
+            pad_token_id = int(eos_ids[0]) if len(eos_ids) else 0
+        if do_sample:
+            vocab_size = self.config.vocab_size
+            sampling = (
+                torch.full((batch,), float(temperature or 1.0)),
+                torch.full((batch,), top_k or vocab_size, dtype=torch.long),
+                torch.full((batch,), float(top_p or 1.0)),
+            )
+
+        if streamer is not None:
+            streamer.put(input_ids)
+        sequences = input_ids
+        unfinished = torch.ones(batch, dtype=torch.bool)
+        logits, layers = self._run(input_ids, attention_mask, (attention_mask.cumsum(-1) - 1).clamp(min=0), None)
+        for step in range(max_new_tokens):
+            scores = logits[:, -1, :].float()
+            for processor in logits_processor or []:
+                scores = processor(sequences, scores)
+            next_tokens = sample_next_tokens(scores, *sampling) if do_sample else scores.argmax(dim=-1)
+            # Finished rows keep emitting padding, as in `generate`
+            next_tokens = torch.where(unfinished, next_tokens, torch.full_like(next_tokens, pad_token_id))
+            sequences = torch.cat([sequences, next_tokens.unsqueeze(-1)], dim=-1)
+            if streamer is not None:
+                streamer.put(next_tokens)
+
+            unfinished &= ~torch.isin(next_tokens, eos_ids)
+            stopped = any(bool(criteria(sequences, scores).all()) for criteria in stopping_criteria or [])
+            if stopped or not unfinished.any() or step == max_new_tokens - 1:
+                break
+            attention_mask = torch.cat([attention_mask, attention_mask.new_ones((batch, 1))], dim=-1)
+            position_ids = attention_mask.sum(-1, keepdim=True) - 1
+            logits, layers = self._run(next_tokens.unsqueeze(-1), attention_mask, position_ids, layers)
+
+        if streamer is not None:
+            streamer.end()
+        return sequences
+
+
+def load_inference_model(
+    model_source: str,
+    precision: str = "fp32",
+    backend: str = "eager",
+    phase_durations: Optional[Dict[str, float]] = None,
+    compile_cache_dir=None,
+):
+    """
+    Loads a causal LM for the requested inference backend.
+
+    `eager` and `compile` load the PyTorch model through `load_causal_lm`
+    (`compile` then compiles it in place); `onnx` opens the graph exported
+    into the model directory by `python -m src.train`.
+    """
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unsupported INFERENCE_BACKEND '{backend}', expected one of {SUPPORTED_BACKENDS}")
+    if backend == "onnx":
+        if precision != "fp32":
+            raise ValueError("INFERENCE_BACKEND=onnx serves the fp32 export; set MODEL_PRECISION=fp32")
+        start = time.perf_counter()
+        model = OnnxCausalLM.from_pretrained(model_source)
+        if phase_durations is not None:
+            phase_durations["onnx_session"] = time.perf_counter() - start
+        return model
+
+    model = load_causal_lm(model_source, precision, phase_durations)
+    if backend == "compile":
+        model = compile_model(model, compile_cache_dir)
+    return model
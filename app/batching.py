@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Hashable, List, Optional, Sequence
+
+logger = logging.getLogger("mlops_api")
+
+
+class _PendingRequest:
+    __slots__ = ("item", "future", "enqueued_at")
+
+    def __init__(self, item):
+        self.item = item
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches for a single model call.
+
+    Callers block in `submit` while a background worker collects pending items
+    for up to `max_wait_seconds` (or until `max_batch_size` is reached), splits
+    them into groups by `group_key` and hands each group to `run_batch`, which
+    must return one result per item in the same order.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List], Sequence],
+        max_batch_size: int = 8,
+        max_wait_seconds: float = 0.01,
+        group_key: Optional[Callable[[object], Hashable]] = None,
+        batch_size_histogram=None,
+        queue_wait_histogram=None,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max(0.0, max_wait_seconds)
+        self.group_key = group_key or (lambda item: None)
+        self.batch_size_histogram = batch_size_histogram
+        self.queue_wait_histogram = queue_wait_histogram
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopped.clear()
+            self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is None:
+            return
+        self._stopped.set()
+        self._queue.put(None)
+        worker.join(timeout)
+
+    def submit(self, item, timeout: Optional[float] = None):
+        """Queues `item` and blocks until its batch has been processed."""
+        if self._worker is None:
+            self.start()
+        pending = _PendingRequest(item)
+        self._queue.put(pending)
+        return pending.future.result(timeout)
+
+    def _collect(self, first: _PendingRequest) -> List[_PendingRequest]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                self._stopped.set()
+                break
+            batch.append(pending)
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+
+            groups = {}
+            for pending in batch:
+                groups.setdefault(self.group_key(pending.item), []).append(pending)
+
+            for group in groups.values():
+                self._run_group(group)
+
+        # Fail anything still queued so callers do not hang on shutdown.
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is not None:
+                pending.future.set_exception(RuntimeError("Batcher stopped"))
+
+    def _run_group(self, group: List[_PendingRequest]) -> None:
+        started_at = time.perf_counter()
+        if self.batch_size_histogram is not None:
+            self.batch_size_histogram.observe(len(group))
+        if self.queue_wait_histogram is not None:
+            for pending in group:
+                self.queue_wait_histogram.observe(started_at - pending.enqueued_at)
+
+        try:
+            results = self.run_batch([pending.item for pending in group])
+            if len(results) != len(group):
+                raise RuntimeError(
+                    f"run_batch returned {len(results)} results for {len(group)} items"
+                )
+        except Exception as exc:
+            logger.exception("batch_failed batch_size=%s", len(group))
+            for pending in group:
+                pending.future.set_exception(exc)
+            return
+
+        for pending, result in zip(group, results):
+            pending.future.set_result(result)
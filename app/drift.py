@@ -0,0 +1,328 @@
+import json
+import logging
+import math
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("mlops_api")
+
+FEATURES = (
+    "prompt_tokens",
+    "output_tokens",
+    "latency_seconds",
+    "temperature",
+    "top_p",
+    "top_k",
+    "max_new_tokens",
+)
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with bounded relative error (DDSketch style).
+
+    Values are counted in logarithmic buckets, so quantiles are within
+    `relative_accuracy` of the true value and two sketches merge by adding
+    bucket counts. Memory grows with the log of the value range, not with
+    the number of observations. Values at or below zero share one bucket.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.02):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        if value <= 1e-9:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return self._value(index)
+        return self._value(max(self.buckets))
+
+    def cdf(self, value: float) -> float:
+        """Fraction of observations at or below `value`."""
+        if self.count == 0:
+            return 0.0
+        below = self.zero_count if value >= 0 else 0
+        below += sum(count for index, count in self.buckets.items() if self._value(index) <= value)
+        return below / self.count
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "buckets": {str(index): count for index, count in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.buckets = {int(index): count for index, count in data["buckets"].items()}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+
+def ks_statistic(reference: QuantileSketch, current: QuantileSketch) -> float:
+    """Largest gap between the two empirical CDFs, evaluated at every bucket boundary."""
+    if reference.count == 0 or current.count == 0:
+        return 0.0
+    statistic = abs(reference.zero_count / reference.count - current.zero_count / current.count)
+    ref_seen, cur_seen = reference.zero_count, current.zero_count
+    for index in sorted(set(reference.buckets) | set(current.buckets)):
+        ref_seen += reference.buckets.get(index, 0)
+        cur_seen += current.buckets.get(index, 0)
+        statistic = max(statistic, abs(ref_seen / reference.count - cur_seen / current.count))
+    return statistic
+
+
+def population_stability_index(reference: QuantileSketch, current: QuantileSketch, bins: int = 10) -> float:
+    """PSI over bins cut at the reference deciles (or fewer when values repeat)."""
+    if reference.count == 0 or current.count == 0:
+        return 0.0
+    edges = sorted({reference.quantile(i / bins) for i in range(1, bins)})
+    ref_cdf = [0.0] + [reference.cdf(edge) for edge in edges] + [1.0]
+    cur_cdf = [0.0] + [current.cdf(edge) for edge in edges] + [1.0]
+    psi = 0.0
+    for i in range(1, len(ref_cdf)):
+        expected = max(ref_cdf[i] - ref_cdf[i - 1], 1e-4)
+        actual = max(cur_cdf[i] - cur_cdf[i - 1], 1e-4)
+        psi += (actual - expected) * math.log(actual / expected)
+    return psi
+
+
+class SlidingWindowSketch:
+    """Sketch of the last `window_seconds`, kept as `slots` sub-window sketches that expire whole."""
+
+    def __init__(self, window_seconds: float, slots: int = 12, relative_accuracy: float = 0.02):
+        self.slot_seconds = window_seconds / max(1, slots)
+        self.slots = max(1, slots)
+        self.relative_accuracy = relative_accuracy
+        self._slots = deque()
+
+    def add(self, value: float, now: float) -> None:
+        slot = int(now // self.slot_seconds)
+        if not self._slots or self._slots[-1][0] != slot:
+            self._slots.append((slot, QuantileSketch(self.relative_accuracy)))
+        self._slots[-1][1].add(value)
+        self._expire(slot)
+
+    def merged(self, now: float) -> QuantileSketch:
+        self._expire(int(now // self.slot_seconds))
+        sketch = QuantileSketch(self.relative_accuracy)
+        for _, slot_sketch in self._slots:
+            sketch.merge(slot_sketch)
+        return sketch
+
+    def _expire(self, current_slot: int) -> None:
+        while self._slots and self._slots[0][0] <= current_slot - self.slots:
+            self._slots.popleft()
+
+
+class DriftMonitor:
+    """
+    Tracks the distribution of /predict traffic and scores it against a reference.
+
+    `observe` only enqueues the raw request/response (dropping it when the
+    bounded queue is full); a background thread turns it into features,
+    adds them to per-feature sliding windows and periodically publishes KS
+    and PSI scores. Without a saved reference summary, the first
+    `reference_samples` observations become the reference and are saved.
+    """
+
+    def __init__(
+        self,
+        reference_path,
+        count_tokens: Callable,
+        window_seconds: float = 3600,
+        window_slots: int = 12,
+        reference_samples: int = 1000,
+        min_samples: int = 100,
+        psi_threshold: float = 0.2,
+        eval_interval_seconds: float = 15,
+        max_queue: int = 10000,
+        score_gauge=None,
+        drift_detected_gauge=None,
+        drifted_features_gauge=None,
+        window_samples_gauge=None,
+        dropped_counter=None,
+    ):
+        self.reference_path = Path(reference_path)
+        self.count_tokens = count_tokens
+        self.reference_samples = reference_samples
+        self.min_samples = min_samples
+        self.psi_threshold = psi_threshold
+        self.eval_interval_seconds = max(0.1, eval_interval_seconds)
+        self.score_gauge = score_gauge
+        self.drift_detected_gauge = drift_detected_gauge
+        self.drifted_features_gauge = drifted_features_gauge
+        self.window_samples_gauge = window_samples_gauge
+        self.dropped_counter = dropped_counter
+
+        self.windows = {feature: SlidingWindowSketch(window_seconds, window_slots) for feature in FEATURES}
+        self.reference = self._load_reference()
+        self._bootstrap = {feature: QuantileSketch() for feature in FEATURES}
+        self._status = {"drift_detected": False, "features": {}, "reference_ready": self.reference is not None}
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stopped = threading.Event()
+
+    def observe(self, record: dict) -> None:
+        """Queues one completed prediction; never blocks the request."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if self.dropped_counter is not None:
+                self.dropped_counter.inc()
+
+    def features(self, record: dict) -> Dict[str, float]:
+        return {
+            "prompt_tokens": self.count_tokens(record["model_version"], record["prompt"]),
+            "output_tokens": self.count_tokens(record["model_version"], record["output"]),
+            "latency_seconds": record["latency_seconds"],
+            # Greedy requests ignore the sampling parameters; temperature 0 marks them
+            "temperature": record["temperature"] if record["do_sample"] else 0.0,
+            "top_p": record["top_p"] if record["do_sample"] else 1.0,
+            "top_k": record["top_k"] if record["do_sample"] else 1.0,
+            "max_new_tokens": record["max_new_tokens"],
+        }
+
+    def update(self, record: dict, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        values = self.features(record)
+        with self._lock:
+            for feature, value in values.items():
+                if value is None:
+                    continue
+                self.windows[feature].add(float(value), now)
+                if self.reference is None:
+                    self._bootstrap[feature].add(float(value))
+            if self.reference is None and self._bootstrap["latency_seconds"].count >= self.reference_samples:
+                self.reference = self._bootstrap
+                self._save_reference()
+
+    def evaluate(self, now: Optional[float] = None) -> dict:
+        """Scores every feature window against the reference and updates the gauges."""
+        now = time.time() if now is None else now
+        with self._lock:
+            reference = self.reference
+            windows = {feature: window.merged(now) for feature, window in self.windows.items()}
+
+        features = {}
+        for feature, window in windows.items():
+            if self.window_samples_gauge is not None:
+                self.window_samples_gauge.labels(feature=feature).set(window.count)
+            if reference is None or window.count < self.min_samples:
+                continue
+            ks = ks_statistic(reference[feature], window)
+            psi = population_stability_index(reference[feature], window)
+            features[feature] = {
+                "ks_stat": ks,
+                "psi": psi,
+                "window_p50": window.quantile(0.5),
+                "reference_p50": reference[feature].quantile(0.5),
+                "window_samples": window.count,
+                "drift_detected": psi > self.psi_threshold,
+            }
+            if self.score_gauge is not None:
+                self.score_gauge.labels(feature=feature, statistic="ks").set(ks)
+                self.score_gauge.labels(feature=feature, statistic="psi").set(psi)
+
+        drifted = [feature for feature, result in features.items() if result["drift_detected"]]
+        if self.drift_detected_gauge is not None:
+            self.drift_detected_gauge.set(int(bool(drifted)))
+        if self.drifted_features_gauge is not None:
+            self.drifted_features_gauge.set(len(drifted))
+        self._status = {"drift_detected": bool(drifted), "features": features, "reference_ready": reference is not None}
+        return self._status
+
+    @property
+    def status(self) -> dict:
+        return self._status
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopped.clear()
+            self._worker = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+            self._worker.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is None:
+            return
+        self._stopped.set()
+        worker.join(self.eval_interval_seconds + 1)
+
+    def _run(self) -> None:
+        next_evaluation = time.monotonic() + self.eval_interval_seconds
+        while not self._stopped.is_set():
+            try:
+                record = self._queue.get(timeout=max(0.0, next_evaluation - time.monotonic()))
+                self.update(record)
+            except queue.Empty:
+                pass
+            except Exception:
+                logger.exception("drift_monitor_update_failed")
+            if time.monotonic() >= next_evaluation:
+                try:
+                    self.evaluate()
+                except Exception:
+                    logger.exception("drift_monitor_evaluation_failed")
+                next_evaluation = time.monotonic() + self.eval_interval_seconds
+
+    def _load_reference(self):
+        if not self.reference_path.exists():
+            return None
+        with open(self.reference_path) as f:
+            data = json.load(f)
+        return {feature: QuantileSketch.from_dict(data["features"][feature]) for feature in FEATURES}
+
+    def _save_reference(self) -> None:
+        self.reference_path.parent.mkdir(parents=True, exist_ok=True)
+        # A temp file of its own: every worker bootstraps a reference into the same path
+        fd, tmp_name = tempfile.mkstemp(dir=self.reference_path.parent, prefix=f".{self.reference_path.name}-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                {"features": {feature: sketch.to_dict() for feature, sketch in self.reference.items()}},
+                f,
+            )
+        os.replace(tmp_name, self.reference_path)
+        logger.info("drift_reference_saved path=%s samples=%s", self.reference_path, self.reference_samples)
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class InferenceQueueFullError(Exception):
+    """Raised when the inference wait queue is full and a request is rejected."""
+
+
+class InferenceExecutor:
+    """
+    Dedicated thread pool for blocking model work with a bounded wait queue.
+
+    At most `max_concurrency` jobs run at once and at most `max_queue` more may
+    wait for a worker; anything beyond that is rejected immediately with
+    `InferenceQueueFullError` so overload turns into fast rejections instead of
+    unbounded latency, and the event loop stays free for /health and /metrics.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_queue: int = 64,
+        queue_depth_gauge=None,
+        active_gauge=None,
+        wait_histogram=None,
+        rejected_counter=None,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_depth_gauge = queue_depth_gauge
+        self.active_gauge = active_gauge
+        self.wait_histogram = wait_histogram
+        self.rejected_counter = rejected_counter
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="inference"
+        )
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Schedules `fn` or raises `InferenceQueueFullError` when saturated."""
+        with self._lock:
+            if self.active + self.queued >= self.max_concurrency + self.max_queue:
+                if self.rejected_counter is not None:
+                    self.rejected_counter.inc()
+                raise InferenceQueueFullError(
+                    f"{self.queued} requests already waiting for {self.max_concurrency} workers"
+                )
+            self.queued += 1
+            self._update_gauges()
+        enqueued_at = time.perf_counter()
+
+        def run():
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self._update_gauges()
+            if self.wait_histogram is not None:
+                self.wait_histogram.observe(time.perf_counter() - enqueued_at)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self._update_gauges()
+
+        try:
+            return self._executor.submit(run)
+        except RuntimeError:
+            with self._lock:
+                self.queued -= 1
+                self._update_gauges()
+            raise
+
+    async def run(self, fn, *args, **kwargs):
+        """Awaits `fn` on the inference pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _update_gauges(self) -> None:
+        if self.queue_depth_gauge is not None:
+            self.queue_depth_gauge.set(self.queued)
+        if self.active_gauge is not None:
+            self.active_gauge.set(self.active)
@@ -0,0 +1,213 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger("mlops_api")
+
+
+def active_file_name(writer_id: str) -> str:
+    return f"inference.{writer_id}.jsonl"
+
+
+class InferenceLog:
+    """
+    Writes one JSON line per prediction to a rotating file, off the request path.
+
+    `log` only enqueues the record (dropping it when the bounded queue is
+    full); a background thread drains the queue in batches, adds prompt and
+    output token counts and appends each batch with a single write. The
+    active file is rotated once it reaches `max_bytes` or `rotate_seconds`,
+    and rotated files are gzipped when `compress` is set.
+
+    Every file name carries `writer_id` (the process id by default), so
+    several workers can log into one directory without rotating each
+    other's active file.
+    """
+
+    def __init__(
+        self,
+        directory,
+        count_tokens: Optional[Callable] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        rotate_seconds: float = 3600,
+        compress: bool = True,
+        batch_size: int = 256,
+        flush_interval_seconds: float = 1.0,
+        max_queue: int = 10000,
+        written_counter=None,
+        dropped_counter=None,
+        writer_id: Optional[str] = None,
+    ):
+        self.directory = Path(directory)
+        self.writer_id = str(os.getpid()) if writer_id is None else writer_id
+        self.count_tokens = count_tokens
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_seconds = max(0.01, flush_interval_seconds)
+        self.written_counter = written_counter
+        self.dropped_counter = dropped_counter
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file = None
+        self._file_bytes = 0
+        self._file_opened_at = 0.0
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stopped = threading.Event()
+
+    @property
+    def active_path(self) -> Path:
+        return self.directory / active_file_name(self.writer_id)
+
+    def log(self, record: dict) -> None:
+        """Queues one record; never blocks the request."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if self.dropped_counter is not None:
+                self.dropped_counter.inc()
+
+    def flush(self) -> int:
+        """Writes everything queued so far; returns the number of records written."""
+        written = 0
+        while True:
+            batch = self._drain()
+            if not batch:
+                return written
+            self.write_batch(batch)
+            written += len(batch)
+
+    def write_batch(self, batch, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        lines = []
+        for record in batch:
+            try:
+                lines.append(json.dumps(self._enrich(record), ensure_ascii=False, separators=(",", ":")))
+            except Exception:
+                logger.exception("inference_log_record_failed request_id=%s", record.get("request_id"))
+                if self.dropped_counter is not None:
+                    self.dropped_counter.inc()
+        if not lines:
+            return
+        with self._lock:
+            if self._file is not None and self._should_rotate(now):
+                self._rotate(now)
+            if self._file is None:
+                self._open(now)
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            self._file.write(data)
+            self._file.flush()
+            self._file_bytes += len(data)
+        if self.written_counter is not None:
+            self.written_counter.inc(len(lines))
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopped.clear()
+            self._worker = threading.Thread(target=self._run, name="inference-log", daemon=True)
+            self._worker.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is not None:
+            self._stopped.set()
+            worker.join(self.flush_interval_seconds + 5)
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval_seconds)
+            except queue.Empty:
+                continue
+            try:
+                self.write_batch([first] + self._drain(self.batch_size - 1))
+            except Exception:
+                logger.exception("inference_log_write_failed")
+
+    def _drain(self, limit: Optional[int] = None):
+        batch = []
+        limit = self.batch_size if limit is None else limit
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _enrich(self, record: dict) -> dict:
+        if self.count_tokens is None:
+            return record
+        record = dict(record)
+        record.setdefault("prompt_tokens", self.count_tokens(record.get("model_version"), record["prompt"]))
+        record.setdefault("output_tokens", self.count_tokens(record.get("model_version"), record["output"]))
+        return record
+
+    def _should_rotate(self, now: float) -> bool:
+        return self._file_bytes >= self.max_bytes or now - self._file_opened_at >= self.rotate_seconds
+
+    def _open(self, now: float) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # A file left by an earlier process with the same id is rotated first so every file covers one process lifetime
+        if self.active_path.exists() and self.active_path.stat().st_size > 0:
+            self._rotate(now)
+        self._file = open(self.active_path, "ab")
+        self._file_bytes = 0
+        self._file_opened_at = now
+
+    def _rotate(self, now: float) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        stamp = datetime.fromtimestamp(now).strftime("%Y%m%d-%H%M%S")
+        # Zero-padded sequence keeps names in write order when several rotations share a second
+        sequence = 0
+        rotated = self.directory / f"inference-{stamp}-{sequence:04d}-{self.writer_id}.jsonl"
+        while rotated.exists() or rotated.with_suffix(".jsonl.gz").exists():
+            sequence += 1
+            rotated = self.directory / f"inference-{stamp}-{sequence:04d}-{self.writer_id}.jsonl"
+        self.active_path.replace(rotated)
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated.with_suffix(".jsonl.gz"), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
+        logger.info("inference_log_rotated path=%s", rotated)
+
+
+def iter_records(directory) -> Iterator[dict]:
+    """
+    Yields logged records from rotated (plain or gzipped) files and then the
+    active ones. Files are read oldest first; records of different writers
+    are only ordered to the rotation second.
+    """
+    directory = Path(directory)
+    rotated = sorted(
+        list(directory.glob("inference-*.jsonl")) + list(directory.glob("inference-*.jsonl.gz")),
+        key=lambda path: path.name,
+    )
+    for path in rotated + sorted(directory.glob(active_file_name("*"))):
+        if not path.exists():
+            continue
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
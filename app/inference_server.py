@@ -0,0 +1,90 @@
+import logging
+import os
+import socketserver
+from pathlib import Path
+
+from app.ipc import recv_message, send_message
+
+logger = logging.getLogger("mlops_api")
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # Connections are persistent: serve messages until the client hangs up
+        while True:
+            message = recv_message(self.request)
+            if message is None:
+                return
+            send_message(self.request, self.server.dispatch(message))
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server run by the single process that owns the model.
+
+    Each client connection gets its own thread which blocks in `generate`,
+    so requests from every HTTP worker meet in the same batcher.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, generate, health, activate=None):
+        path = Path(socket_path)
+        if path.exists():
+            path.unlink()
+        self.generate = generate
+        self.health = health
+        self.activate = activate
+        super().__init__(socket_path, _ConnectionHandler)
+
+    def dispatch(self, message: dict) -> dict:
+        op = message.get("op")
+        try:
+            if op == "generate":
+                result = self.generate(message["request"])
+                # `generate` may return extra fields, such as phase timings, next to the text
+                return result if isinstance(result, dict) else {"generated_text": result}
+            if op == "health":
+                return self.health()
+            if op == "activate" and self.activate is not None:
+                self.activate(message["version"])
+                return {"version": message["version"], "status": "warming"}
+            return {"error": f"Unknown operation '{op}'"}
+        except Exception as exc:
+            logger.exception("inference_server_request_failed op=%s", op)
+            return {"error": exc.__class__.__name__}
+
+
+def main() -> None:
+    """Loads the model once and serves generation requests to local HTTP workers."""
+    # This process owns the model, so the API module must run inference locally
+    os.environ["INFERENCE_MODE"] = "local"
+    from app import main as api
+    from app.schemas import PredictRequest
+
+    api.warm_up_model(*api.get_model())
+    api.get_batcher().start()
+
+    def generate(payload: dict) -> dict:
+        req = PredictRequest(**payload)
+        return {"generated_text": api.generate_text(req), "phase_timings": req.phase_timings}
+
+    def health() -> dict:
+        return {
+            "model_ready": api.model_pool.is_resident(),
+            "model_version": api.model_version_label(api.model_pool.active_version),
+            "resident_versions": api.model_pool.resident_versions(),
+        }
+
+    server = InferenceServer(api.INFERENCE_SOCKET, generate, health, api.activate_model_version)
+    logger.info("inference_server_listening socket=%s pid=%s", api.INFERENCE_SOCKET, os.getpid())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        Path(api.INFERENCE_SOCKET).unlink(missing_ok=True)
+        api.get_batcher().stop()
+
+
+if __name__ == "__main__":
+    main()
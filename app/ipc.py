@@ -0,0 +1,110 @@
+import json
+import queue
+import socket
+import struct
+from typing import Optional
+
+_HEADER = struct.Struct(">I")
+# Longest wait for one reply; bounds how long a stuck inference process can hold a caller
+DEFAULT_TIMEOUT_SECONDS = 300.0
+
+
+class InferenceServerError(Exception):
+    """Raised when the inference process reports a failure for a request."""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+def send_message(sock: socket.socket, payload: dict) -> None:
+    """Writes one length-prefixed JSON message."""
+    data = json.dumps(payload).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock: socket.socket) -> Optional[dict]:
+    """Reads one length-prefixed JSON message, or None when the peer closed the connection."""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    data = _recv_exact(sock, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return json.loads(data.decode("utf-8"))
+
+
+class InferenceClient:
+    """
+    Forwards requests to the inference process over a Unix socket.
+
+    Keeps a pool of persistent connections so concurrent callers in one HTTP
+    worker do not serialize behind each other; the inference process batches
+    requests across all connections. Calls that get no reply within `timeout`
+    seconds raise `socket.timeout`.
+    """
+
+    def __init__(self, socket_path: str, pool_size: int = 8, timeout: Optional[float] = DEFAULT_TIMEOUT_SECONDS):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=max(1, pool_size))
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _release(self, sock: socket.socket) -> None:
+        try:
+            self._idle.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+
+    def call(self, payload: dict) -> dict:
+        """Sends one message and waits for the reply, retrying once on a stale pooled connection."""
+        try:
+            sock, pooled = self._idle.get_nowait(), True
+        except queue.Empty:
+            sock, pooled = self._connect(), False
+
+        try:
+            send_message(sock, payload)
+            response = recv_message(sock)
+            if response is None:
+                raise ConnectionResetError("Inference process closed the connection")
+        except socket.timeout:
+            # A late reply would be read by the next caller, so the connection is dropped, not retried
+            sock.close()
+            raise
+        except OSError:
+            sock.close()
+            if not pooled:
+                raise
+            return self.call(payload)
+
+        self._release(sock)
+        return response
+
+    def generate(self, req) -> str:
+        response = self.call({"op": "generate", "request": req.model_dump()})
+        if "error" in response:
+            raise InferenceServerError(response["error"])
+        req.phase_timings.update(response.get("phase_timings", {}))
+        return response["generated_text"]
+
+    def health(self) -> dict:
+        return self.call({"op": "health"})
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
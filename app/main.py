@@ -1,17 +1,37 @@
+import time
+
+# Taken before any other import so the startup profile can report how long importing this module took
+IMPORT_STARTED_AT = time.time()
+
 import json
 import logging
 import os
-import time
+import queue
+import socket
+import threading
 import uuid
+from functools import lru_cache
 from pathlib import Path
 
-import psutil
-import torch
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, Response
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
+from app.batching import MicroBatcher
+from app.drift import DriftMonitor
+from app.executor import InferenceExecutor, InferenceQueueFullError
+from app.inference_log import InferenceLog
+from app.ipc import InferenceClient
+from app.model_pool import ModelPool
+from app.prefix_cache import PrefixCache
+from app.profiling import PHASES, FirstTokenTimer, PhaseTimer, capture_torch_profile, publish_phase, sample_stacks
+from app.resources import ResourceSampler
+from app.response_cache import ResponseCache, SqliteResponseCache, is_deterministic, response_cache_key
+from app.scoring import BatchScorer, UnsupportedMediaTypeError, decode_features, encode_scores
 from app.schemas import PredictRequest, PredictResponse
+from app.speculative import SpeculativeDecoder
+from app.startup import StartupTracker, import_modules, process_start_time
+from src.model_registry import ModelRegistry
 from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
 
 app = FastAPI(title="MLOps CI/CD API")
@@ -20,12 +40,22 @@ logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
     format="%(asctime)s %(levelname)s %(name)s %(message)s",
 )
-PROCESS = psutil.Process(os.getpid())
 START_TIME = time.time()
+# Process creation time, so startup metrics include interpreter and server startup before this module
+PROCESS_START_TIME = process_start_time()
 
 # Prometheus metrics
 PREDICTION_COUNT = Counter('ml_predictions_total', 'Total predictions made')
 PREDICTION_LATENCY = Histogram('ml_prediction_duration_seconds', 'Prediction latency')
+PREDICTION_BATCH_SIZE = Histogram(
+    "ml_prediction_batch_size",
+    "Number of requests sharing one batched generate call or decode step",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+PREDICTION_QUEUE_WAIT = Histogram(
+    "ml_prediction_queue_wait_seconds",
+    "Time a prediction waits in the batching queue before generation starts",
+)
 API_REQUESTS = Counter('api_requests_total', 'Total API requests', ['method', 'endpoint', 'status'])
 API_REQUEST_LATENCY = Histogram(
     "api_request_duration_seconds",
@@ -42,62 +72,474 @@ PREDICTION_ERRORS = Counter(
     "Prediction failures",
     ["reason"],
 )
+PREFIX_CACHE_HITS = Counter("ml_prefix_cache_hits_total", "Prompt prefills that reused cached KV states")
+PREFIX_CACHE_MISSES = Counter("ml_prefix_cache_misses_total", "Prompt prefills without a cached prefix")
+PREFIX_CACHE_HIT_RATIO = Gauge("ml_prefix_cache_hit_ratio", "Prefix KV cache hit ratio since startup")
+PREFIX_CACHE_BYTES = Gauge("ml_prefix_cache_bytes", "Memory held by cached prefix KV states")
+PREFIX_CACHE_ENTRIES = Gauge("ml_prefix_cache_entries", "Number of cached token prefixes")
+INFERENCE_QUEUE_DEPTH = Gauge("ml_inference_queue_depth", "Inference jobs waiting for a free executor worker")
+INFERENCE_ACTIVE = Gauge("ml_inference_active", "Inference jobs currently running on the executor")
+INFERENCE_QUEUE_WAIT = Histogram(
+    "ml_inference_queue_wait_seconds",
+    "Time an inference job waits for a free executor worker",
+)
+INFERENCE_REJECTED = Counter("ml_inference_rejected_total", "Inference requests rejected because the queue was full")
+RESPONSE_CACHE_HITS = Counter("ml_response_cache_hits_total", "Deterministic predictions served from the response cache")
+RESPONSE_CACHE_MISSES = Counter("ml_response_cache_misses_total", "Deterministic predictions not found in the response cache")
+STREAM_TIME_TO_FIRST_TOKEN = Histogram(
+    "ml_stream_time_to_first_token_seconds",
+    "Time from stream request to the first generated token",
+)
+STREAM_INTER_TOKEN_LATENCY = Histogram(
+    "ml_stream_inter_token_latency_seconds",
+    "Time between consecutive generated tokens on /predict/stream",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+STREAM_CANCELLED = Counter(
+    "ml_stream_cancelled_total",
+    "Streams stopped early because the client disconnected",
+)
 MODEL_LOAD_COUNT = Counter("ml_model_load_total", "Model load attempts", ["status"])
 MODEL_LOADED = Gauge("ml_model_loaded", "Model load status: 1=loaded, 0=not loaded")
+MODEL_LOAD_PHASE_SECONDS = Gauge(
+    "ml_model_load_phase_seconds",
+    "Duration of each phase of the last model load",
+    ["phase"],
+)
+STARTUP_DURATION_SECONDS = Gauge(
+    "service_startup_duration_seconds",
+    "Time from process start until the startup hook returned and the API began answering",
+)
+STARTUP_PHASE_SECONDS = Gauge(
+    "ml_startup_phase_seconds",
+    "Duration of each phase of the last process startup",
+    ["phase"],
+)
+SERVICE_READY = Gauge("service_ready", "Readiness: 1=model loaded and warmed up, 0=still starting or failed")
+READY_DURATION_SECONDS = Gauge(
+    "service_ready_duration_seconds",
+    "Time from process start until the background startup phases finished",
+)
+MODEL_POOL_LOAD_SECONDS = Histogram(
+    "ml_model_pool_load_seconds",
+    "Time to load a model version into the resident pool",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+MODEL_POOL_EVICTIONS = Counter("ml_model_pool_evictions_total", "Model versions evicted from the resident pool")
+MODEL_POOL_RESIDENT = Gauge("ml_model_pool_resident_models", "Model versions currently loaded in memory")
+MODEL_POOL_RESIDENT_BYTES = Gauge("ml_model_pool_resident_bytes", "Parameter and buffer memory of resident model versions")
+DRIFT_SCORE = Gauge(
+    "ml_drift_score",
+    "Drift of live /predict traffic against the reference summary",
+    ["feature", "statistic"],
+)
+DRIFT_DETECTED = Gauge("ml_drift_detected", "1 when any live traffic feature exceeds the PSI threshold")
+DRIFTED_FEATURE_COUNT = Gauge("ml_drifted_feature_count", "Live traffic features exceeding the PSI threshold")
+DRIFT_WINDOW_SAMPLES = Gauge("ml_drift_window_samples", "Observations in the drift sliding window", ["feature"])
+DRIFT_DROPPED = Counter("ml_drift_observations_dropped_total", "Predictions not sent to the drift monitor because its queue was full")
+INFERENCE_LOG_RECORDS = Counter("ml_inference_log_records_total", "Prediction records written to the inference log")
+INFERENCE_LOG_DROPPED = Counter("ml_inference_log_dropped_total", "Prediction records dropped because the inference log queue was full")
+INFERENCE_PHASE_SECONDS = Histogram(
+    "ml_inference_phase_seconds",
+    "Time each request spent per inference phase (template, tokenize, prefill, decode, detokenize)",
+    ["phase"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+for _phase in PHASES:
+    INFERENCE_PHASE_SECONDS.labels(phase=_phase)
+SPECULATIVE_ACCEPTANCE_RATE = Histogram(
+    "ml_speculative_acceptance_rate",
+    "Share of draft model tokens accepted by the target model per generate call",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+SPECULATIVE_TOKENS_PER_STEP = Histogram(
+    "ml_speculative_tokens_per_step",
+    "Tokens generated per target model forward pass with speculative decoding",
+    buckets=(1, 1.25, 1.5, 2, 2.5, 3, 4, 5, 6, 8),
+)
+SPECULATIVE_DRAFTED = Counter("ml_speculative_drafted_tokens_total", "Tokens proposed by the draft model")
+SPECULATIVE_ACCEPTED = Counter("ml_speculative_accepted_tokens_total", "Draft model tokens accepted by the target model")
 PROCESS_MEMORY_RSS_BYTES = Gauge("process_memory_rss_bytes", "Process resident memory in bytes")
 PROCESS_CPU_PERCENT = Gauge("process_cpu_percent", "Process CPU usage percent")
 PROCESS_THREAD_COUNT = Gauge("process_thread_count", "Process thread count")
 API_INFLIGHT_REQUESTS = Gauge("api_inflight_requests", "Requests currently being processed")
 SERVICE_UPTIME_SECONDS = Gauge("service_uptime_seconds", "API process uptime in seconds")
+BATCH_SCORING_ROWS = Counter("ml_batch_scoring_rows_total", "Rows scored by /score/batch")
+BATCH_SCORING_SECONDS = Histogram(
+    "ml_batch_scoring_seconds",
+    "Time per /score/batch phase: decode, score and encode",
+    ["phase"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+CLASSIFIER_LOADS = Counter("ml_classifier_load_total", "Loads of the joblib classifier served by /score/batch")
 
 # Update default model name
 DEFAULT_MODEL_NAME = "Qwen/Qwen2.5-0.5B-Instruct"
 MODEL_NAME = os.environ.get("MODEL_NAME", DEFAULT_MODEL_NAME)
+# Load-time weight conversion: fp32, bf16 or dynamic-int8
+MODEL_PRECISION = os.environ.get("MODEL_PRECISION", "fp32")
 # Corrected default model path to match DVC output
 MODEL_PATH = Path(os.environ.get("MODEL_PATH", Path(__file__).parent.parent / "artifacts" / "Qwen2.5-0.5B-Instruct"))
+# Inference backend: "eager" PyTorch, "compile" (torch.compile, kernels cached in TORCH_COMPILE_CACHE_DIR)
+# or "onnx" (the ONNX export written by src.train, run on onnxruntime); warmed up at startup
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "eager")
+TORCH_COMPILE_CACHE_DIR = Path(os.environ.get("TORCH_COMPILE_CACHE_DIR", Path(__file__).parent.parent / "artifacts" / "torch_compile_cache"))
+# Speculative decoding: a smaller draft model with the same tokenizer proposes tokens that the
+# served model verifies; loaded from DRAFT_MODEL_PATH if it exists, else DRAFT_MODEL_NAME (off when unset)
+DRAFT_MODEL_NAME = os.environ.get("DRAFT_MODEL_NAME", "")
+DRAFT_MODEL_PATH = os.environ.get("DRAFT_MODEL_PATH", "")
+SPECULATIVE_NUM_TOKENS = int(os.environ.get("SPECULATIVE_NUM_TOKENS", "5"))
+# Model directories registered in the registry can be served and activated by version;
+# without an active registered version MODEL_NAME (from MODEL_PATH or the hub) is served
+MODEL_REGISTRY_PATH = Path(os.environ.get("MODEL_REGISTRY_PATH", Path(__file__).parent.parent / "artifacts" / "registry"))
+MODEL_POOL_MAX_MODELS = int(os.environ.get("MODEL_POOL_MAX_MODELS", "2"))
+MODEL_POOL_MAX_MB = float(os.environ.get("MODEL_POOL_MAX_MB", "4096"))
+# Batching: "static" coalesces concurrent /predict calls into one generate call,
+# "continuous" runs the decode loop itself and admits new requests at every step
+BATCHING_MODE = os.environ.get("BATCHING_MODE", "static")
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "10"))
+# Admission control: at most INFERENCE_MAX_CONCURRENCY jobs run and INFERENCE_MAX_QUEUE wait;
+# concurrency should be at least BATCH_MAX_SIZE so batches can fill up
+INFERENCE_MAX_CONCURRENCY = int(os.environ.get("INFERENCE_MAX_CONCURRENCY", str(BATCH_MAX_SIZE)))
+INFERENCE_MAX_QUEUE = int(os.environ.get("INFERENCE_MAX_QUEUE", "64"))
+INFERENCE_RETRY_AFTER_SECONDS = int(os.environ.get("INFERENCE_RETRY_AFTER_SECONDS", "1"))
+# Process resource gauges are refreshed by a background sampler instead of per request
+RESOURCE_SAMPLE_INTERVAL_SECONDS = float(os.environ.get("RESOURCE_SAMPLE_INTERVAL_SECONDS", "5"))
+# "local" runs inference in this process; "remote" forwards to the inference process
+# (python -m app.inference_server) over a Unix socket so HTTP workers share one model copy
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "local")
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET", "/tmp/mlops-inference.sock")
+# Longest wait for the inference process to answer one remote request before it fails with 504
+INFERENCE_TIMEOUT_SECONDS = float(os.environ.get("INFERENCE_TIMEOUT_SECONDS", "300"))
+# Prefix KV cache for the continuous scheduler; set PREFIX_CACHE_MAX_ENTRIES=0 to disable
+PREFIX_CACHE_MAX_ENTRIES = int(os.environ.get("PREFIX_CACHE_MAX_ENTRIES", "32"))
+PREFIX_CACHE_MAX_MB = float(os.environ.get("PREFIX_CACHE_MAX_MB", "256"))
+# How often a stream waiting for its next token checks whether the client disconnected
+STREAM_DISCONNECT_POLL_SECONDS = float(os.environ.get("STREAM_DISCONNECT_POLL_SECONDS", "0.5"))
+# Exact-match cache for greedy or seeded requests: "memory", "sqlite" (shared by workers) or "none"
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_PATH = Path(os.environ.get("RESPONSE_CACHE_PATH", Path(__file__).parent.parent / "artifacts" / "response_cache.db"))
+# Streaming drift monitor over /predict traffic; the first DRIFT_REFERENCE_SAMPLES
+# predictions become the reference summary unless DRIFT_REFERENCE_PATH already exists
+DRIFT_MONITOR_ENABLED = os.environ.get("DRIFT_MONITOR_ENABLED", "1") == "1"
+DRIFT_REFERENCE_PATH = Path(os.environ.get("DRIFT_REFERENCE_PATH", Path(__file__).parent.parent / "artifacts" / "drift_reference.json"))
+DRIFT_REFERENCE_SAMPLES = int(os.environ.get("DRIFT_REFERENCE_SAMPLES", "1000"))
+DRIFT_WINDOW_SECONDS = float(os.environ.get("DRIFT_WINDOW_SECONDS", "3600"))
+DRIFT_MIN_SAMPLES = int(os.environ.get("DRIFT_MIN_SAMPLES", "100"))
+DRIFT_PSI_THRESHOLD = float(os.environ.get("DRIFT_PSI_THRESHOLD", "0.2"))
+DRIFT_EVAL_INTERVAL_SECONDS = float(os.environ.get("DRIFT_EVAL_INTERVAL_SECONDS", "15"))
+# Structured JSONL log of every prediction, written by a background thread
+INFERENCE_LOG_ENABLED = os.environ.get("INFERENCE_LOG_ENABLED", "1") == "1"
+INFERENCE_LOG_DIR = Path(os.environ.get("INFERENCE_LOG_DIR", Path(__file__).parent.parent / "artifacts" / "inference_logs"))
+INFERENCE_LOG_MAX_MB = float(os.environ.get("INFERENCE_LOG_MAX_MB", "64"))
+INFERENCE_LOG_ROTATE_SECONDS = float(os.environ.get("INFERENCE_LOG_ROTATE_SECONDS", "3600"))
+INFERENCE_LOG_COMPRESS = os.environ.get("INFERENCE_LOG_COMPRESS", "1") == "1"
+INFERENCE_LOG_MAX_QUEUE = int(os.environ.get("INFERENCE_LOG_MAX_QUEUE", "10000"))
+# Opt-in profiling: X-Profile request header and the /debug endpoints
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", Path(__file__).parent.parent / "artifacts" / "profiles"))
+PROFILE_MAX_SAMPLE_SECONDS = float(os.environ.get("PROFILE_MAX_SAMPLE_SECONDS", "60"))
+# Classical model scored by /score/batch; the registry points this file at the active joblib version
+CLASSIFIER_PATH = Path(os.environ.get("CLASSIFIER_PATH", Path(__file__).parent.parent / "artifacts" / "model.joblib"))
+SCORING_MAX_ROWS = int(os.environ.get("SCORING_MAX_ROWS", "1000000"))
+SYSTEM_PROMPT = "You are a helpful AI assistant."
 
-_tokenizer = None
-_model = None
+model_registry = ModelRegistry(MODEL_REGISTRY_PATH)
 
-def get_model():
-    global _tokenizer, _model
-    if _model is None or _tokenizer is None:
-        model_path_str = str(MODEL_PATH)
-        if MODEL_PATH.exists():
-            logger.info("loading_model_from_path path=%s", model_path_str)
-            model_source = model_path_str
-        else:
-            logger.info("loading_model_from_hub model_name=%s", MODEL_NAME)
-            model_source = MODEL_NAME
+def registered_model_dir(version: str):
+    """Registry metadata for a servable model directory, or None."""
+    info = model_registry.get_version(version)
+    if info is not None and info.get("format") == "hf":
+        return info
+    return None
 
-        try:
-            # Removed trust_remote_code=True for security
-            _tokenizer = AutoTokenizer.from_pretrained(model_source)
-            _model = AutoModelForCausalLM.from_pretrained(model_source)
-
-            # Ensure padding token is set
-            if _tokenizer.pad_token is None:
-                _tokenizer.pad_token = _tokenizer.eos_token
-
-            MODEL_LOAD_COUNT.labels(status="success").inc()
-            MODEL_LOADED.set(1)
-            logger.info("model_loaded_successfully model_name=%s", model_source)
-        except Exception:
-            MODEL_LOAD_COUNT.labels(status="failure").inc()
+def registry_active_version() -> str:
+    version, info = model_registry.get_active_version()
+    if info is not None and info.get("format") == "hf":
+        return version
+    return MODEL_NAME
+
+def model_version_label(version: str) -> str:
+    """Version reported to clients and used in response cache keys."""
+    label = f"{version}:{MODEL_PRECISION}"
+    # Other backends may round differently, so their outputs are cached separately
+    if INFERENCE_BACKEND != "eager":
+        label += f"+{INFERENCE_BACKEND}"
+    return label
+
+def model_source_for(version: str):
+    """Returns (model_source, local_files_only) for a version."""
+    info = registered_model_dir(version)
+    if info is not None:
+        logger.info("loading_model_from_registry version=%s path=%s", version, info["path"])
+        return info["path"], True
+    if MODEL_PATH.exists():
+        logger.info("loading_model_from_path path=%s", MODEL_PATH)
+        return str(MODEL_PATH), True
+    logger.info("loading_model_from_hub model_name=%s", MODEL_NAME)
+    return MODEL_NAME, False
+
+def load_model_version(version: str):
+    from transformers import AutoTokenizer
+
+    from app.backends import load_inference_model
+
+    model_source, local_files_only = model_source_for(version)
+    try:
+        phase_durations = {}
+        tokenizer_start = time.perf_counter()
+        # Removed trust_remote_code=True for security
+        tokenizer = AutoTokenizer.from_pretrained(
+            model_source, local_files_only=local_files_only
+        )
+        phase_durations["tokenizer"] = time.perf_counter() - tokenizer_start
+        model = load_inference_model(
+            model_source, MODEL_PRECISION, INFERENCE_BACKEND, phase_durations, TORCH_COMPILE_CACHE_DIR
+        )
+        for phase, seconds in phase_durations.items():
+            MODEL_LOAD_PHASE_SECONDS.labels(phase=phase).set(seconds)
+
+        # Ensure padding token is set
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        # Decoder-only models need left padding so batched prompts end at the same position
+        tokenizer.padding_side = "left"
+
+        MODEL_LOAD_COUNT.labels(status="success").inc()
+        MODEL_LOADED.set(1)
+        # The draft model is shared by all versions and loaded with the first one
+        speculative_decoder()
+        logger.info(
+            "model_loaded_successfully version=%s model_name=%s precision=%s backend=%s",
+            version, model_source, MODEL_PRECISION, INFERENCE_BACKEND,
+        )
+    except Exception:
+        MODEL_LOAD_COUNT.labels(status="failure").inc()
+        if not model_pool.resident_versions():
             MODEL_LOADED.set(0)
-            logger.exception("failed_to_load_model model_name=%s", model_source)
-            raise
-    return _tokenizer, _model
+        logger.exception("failed_to_load_model version=%s model_name=%s", version, model_source)
+        raise
+    return tokenizer, model
+
+def draft_model_source():
+    """DRAFT_MODEL_PATH if it exists, else DRAFT_MODEL_NAME; None when speculative decoding is off."""
+    if DRAFT_MODEL_PATH and Path(DRAFT_MODEL_PATH).exists():
+        return DRAFT_MODEL_PATH
+    return DRAFT_MODEL_NAME or None
+
+@lru_cache(maxsize=1)
+def speculative_decoder():
+    """Loads the draft model once; None when speculative decoding is off or the draft failed to load."""
+    draft_source = draft_model_source()
+    if draft_source is None:
+        return None
+    if INFERENCE_BACKEND == "onnx":
+        logger.warning("speculative_decoding_unsupported backend=onnx")
+        return None
+    from app.model_loader import load_causal_lm
+
+    try:
+        draft_model = load_causal_lm(draft_source, MODEL_PRECISION)
+    except Exception:
+        logger.exception("failed_to_load_draft_model model_name=%s speculative_decoding=disabled", draft_source)
+        return None
+    logger.info("draft_model_loaded model_name=%s num_draft_tokens=%s", draft_source, SPECULATIVE_NUM_TOKENS)
+    return SpeculativeDecoder(
+        draft_model,
+        num_draft_tokens=SPECULATIVE_NUM_TOKENS,
+        acceptance_histogram=SPECULATIVE_ACCEPTANCE_RATE,
+        tokens_per_step_histogram=SPECULATIVE_TOKENS_PER_STEP,
+        drafted_counter=SPECULATIVE_DRAFTED,
+        accepted_counter=SPECULATIVE_ACCEPTED,
+    )
+
+def draft_model_id():
+    """Identifies the draft configuration in response cache keys; None without a draft."""
+    draft_source = draft_model_source()
+    if draft_source is None or INFERENCE_BACKEND == "onnx":
+        return None
+    return f"{draft_source}:{SPECULATIVE_NUM_TOKENS}"
+
+def generate_with_model(model, speculative: bool = True, **generate_kwargs):
+    """
+    `model.generate`, assisted by the draft model when one is loaded, `speculative`
+    is set and there is a single sequence.
+    """
+    decoder = speculative_decoder() if speculative else None
+    if decoder is not None and generate_kwargs["input_ids"].shape[0] == 1:
+        return decoder.generate(model, **generate_kwargs)
+    return model.generate(**generate_kwargs)
+
+def warm_up_model(tokenizer, model):
+    """Runs short generations so a loaded or newly activated version serves its first request at full speed."""
+    from app.backends import WARMUP_PROMPTS, warm_up
+
+    texts = [build_prompt_text(tokenizer, prompt) for prompt in WARMUP_PROMPTS]
+    # torch.compile specializes batch size 1; one larger batch covers every other size
+    batch_sizes = (1,) if INFERENCE_BACKEND == "eager" else sorted({1, BATCH_MAX_SIZE})
+    seconds = warm_up(tokenizer, model, texts, batch_sizes)
+    MODEL_LOAD_PHASE_SECONDS.labels(phase="warmup").set(seconds)
+    logger.info("model_warmed_up backend=%s batch_sizes=%s seconds=%.2f", INFERENCE_BACKEND, batch_sizes, seconds)
+
+model_pool = ModelPool(
+    load_model_version,
+    active_version=registry_active_version(),
+    max_models=MODEL_POOL_MAX_MODELS,
+    memory_budget_bytes=int(MODEL_POOL_MAX_MB * 1024 * 1024) if MODEL_POOL_MAX_MB > 0 else None,
+    warmup=warm_up_model,
+    load_histogram=MODEL_POOL_LOAD_SECONDS,
+    evictions_counter=MODEL_POOL_EVICTIONS,
+    resident_gauge=MODEL_POOL_RESIDENT,
+    resident_bytes_gauge=MODEL_POOL_RESIDENT_BYTES,
+)
+
+def get_model(version: str = None):
+    """Returns (tokenizer, model) for a version, by default the active one."""
+    return model_pool.get(version)
+
+@lru_cache(maxsize=MODEL_POOL_MAX_MODELS)
+def load_tokenizer(version: str):
+    from transformers import AutoTokenizer
+
+    model_source, local_files_only = model_source_for(version)
+    return AutoTokenizer.from_pretrained(model_source, local_files_only=local_files_only)
+
+def count_tokens(version: str, text: str) -> int:
+    """Token count with the version's own cached tokenizer; never loads the model weights."""
+    return len(load_tokenizer(version)(text).input_ids)
+
+def active_model_version() -> str:
+    if inference_client is not None:
+        # The inference process switches versions; the registry records its choice
+        return registry_active_version()
+    return model_pool.active_version
 
-def update_resource_metrics() -> None:
-    PROCESS_MEMORY_RSS_BYTES.set(PROCESS.memory_info().rss)
-    PROCESS_CPU_PERCENT.set(PROCESS.cpu_percent(interval=None))
-    PROCESS_THREAD_COUNT.set(PROCESS.num_threads())
-    SERVICE_UPTIME_SECONDS.set(time.time() - START_TIME)
+def resolve_model_version(requested):
+    """Maps a requested version (or None for the active one) to a servable version."""
+    if requested is None:
+        return active_model_version()
+    if requested == MODEL_NAME or registered_model_dir(requested) is not None:
+        return requested
+    # Accept the label returned in responses, e.g. "20240101_120000:fp32"
+    base, _, variant = requested.rpartition(":")
+    if base and f"{base}:{variant}" == model_version_label(base):
+        return resolve_model_version(base)
+    raise KeyError(requested)
+
+def activate_model_version(version: str):
+    """Warms a registered version in the background and makes it active once it is ready."""
+    return model_pool.activate(version, on_ready=model_registry.set_active_model)
+
+drift_monitor = None
+if DRIFT_MONITOR_ENABLED:
+    drift_monitor = DriftMonitor(
+        DRIFT_REFERENCE_PATH,
+        count_tokens,
+        window_seconds=DRIFT_WINDOW_SECONDS,
+        reference_samples=DRIFT_REFERENCE_SAMPLES,
+        min_samples=DRIFT_MIN_SAMPLES,
+        psi_threshold=DRIFT_PSI_THRESHOLD,
+        eval_interval_seconds=DRIFT_EVAL_INTERVAL_SECONDS,
+        score_gauge=DRIFT_SCORE,
+        drift_detected_gauge=DRIFT_DETECTED,
+        drifted_features_gauge=DRIFTED_FEATURE_COUNT,
+        window_samples_gauge=DRIFT_WINDOW_SAMPLES,
+        dropped_counter=DRIFT_DROPPED,
+    )
+
+inference_log = None
+if INFERENCE_LOG_ENABLED:
+    inference_log = InferenceLog(
+        INFERENCE_LOG_DIR,
+        count_tokens=count_tokens,
+        max_bytes=int(INFERENCE_LOG_MAX_MB * 1024 * 1024),
+        rotate_seconds=INFERENCE_LOG_ROTATE_SECONDS,
+        compress=INFERENCE_LOG_COMPRESS,
+        max_queue=INFERENCE_LOG_MAX_QUEUE,
+        written_counter=INFERENCE_LOG_RECORDS,
+        dropped_counter=INFERENCE_LOG_DROPPED,
+    )
+
+def observe_prediction(request: Request, req: PredictRequest, generated_text: str, latency_seconds: float, **details) -> None:
+    """Hands a completed prediction to the drift monitor and the inference log; both only enqueue it."""
+    record = {
+        "request_id": getattr(request.state, "request_id", None),
+        "timestamp": time.time(),
+        "endpoint": request.url.path,
+        "model_version": req.model_version,
+        "prompt": req.prompt,
+        "output": generated_text,
+        "latency_seconds": latency_seconds,
+        "do_sample": req.do_sample,
+        "temperature": req.temperature,
+        "top_p": req.top_p,
+        "top_k": req.top_k,
+        "max_new_tokens": req.max_new_tokens,
+        **details,
+    }
+    if drift_monitor is not None:
+        drift_monitor.observe(record)
+    if inference_log is not None:
+        inference_log.log(record)
+
+def registered_classifier_version(path: Path):
+    """Registry version of the joblib file `path` resolves to, if it is registered."""
+    for version, info in model_registry.list_models(model_format="joblib").items():
+        blob = Path(info["path"])
+        if blob.exists() and os.path.samefile(blob, path):
+            return version
+    return None
+
+batch_scorer = BatchScorer(CLASSIFIER_PATH, version_lookup=registered_classifier_version, load_counter=CLASSIFIER_LOADS)
+
+resource_sampler = ResourceSampler(
+    START_TIME,
+    interval_seconds=RESOURCE_SAMPLE_INTERVAL_SECONDS,
+    memory_gauge=PROCESS_MEMORY_RSS_BYTES,
+    cpu_gauge=PROCESS_CPU_PERCENT,
+    threads_gauge=PROCESS_THREAD_COUNT,
+    uptime_gauge=SERVICE_UPTIME_SECONDS,
+)
+
+# The ML stack is imported by the background startup phases, after the API already answers /health
+ML_MODULES = ("torch", "transformers", "app.backends", "app.model_loader", "app.scheduler", "app.streaming")
+
+startup_tracker = StartupTracker(
+    PROCESS_START_TIME,
+    phase_gauge=STARTUP_PHASE_SECONDS,
+    ready_gauge=SERVICE_READY,
+    ready_duration_gauge=READY_DURATION_SECONDS,
+)
+
+def load_classifier():
+    if CLASSIFIER_PATH.exists():
+        batch_scorer.current()
+
+def warm_up_active_model():
+    # A failed model_load phase is not retried here; the first request retries it
+    if model_pool.is_resident():
+        warm_up_model(*get_model())
+
+def startup_phases() -> list:
+    """(name, fn) phases run in the background after the startup hook returns."""
+    if inference_client is not None:
+        # The inference process owns the model; HTTP workers only need the classifier
+        return [("classifier_load", load_classifier)]
+    return [
+        ("ml_import", lambda: import_modules(ML_MODULES)),
+        ("model_load", get_model),
+        ("warmup", warm_up_active_model),
+        ("batcher_start", lambda: get_batcher().start()),
+        ("classifier_load", load_classifier),
+    ]
 
 @app.middleware("http")
 async def track_requests(request: Request, call_next):
-    request_id = str(uuid.uuid4())
+    request_id = request.headers.get("x-request-id") or str(uuid.uuid4())
+    request.state.request_id = request_id
     start_time = time.perf_counter()
     status_code = 500
     API_INFLIGHT_REQUESTS.inc()
@@ -105,6 +547,7 @@ async def track_requests(request: Request, call_next):
     try:
         response = await call_next(request)
         status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
         return response
     except Exception as exc:
         API_ERRORS.labels(
@@ -131,7 +574,6 @@ async def track_requests(request: Request, call_next):
             endpoint=request.url.path,
         ).observe(duration_seconds)
         API_INFLIGHT_REQUESTS.dec()
-        update_resource_metrics()
         logger.info(
             "request_completed request_id=%s method=%s path=%s status=%s latency_ms=%.2f",
             request_id,
@@ -143,89 +585,537 @@ async def track_requests(request: Request, call_next):
 
 @app.on_event("startup")
 def startup_event():
-    try:
-        get_model()
-    except Exception:
-        logger.critical("could_not_load_model_on_startup")
+    # Everything slow runs in the background so liveness probes pass right away; /ready reports when it is done
+    startup_tracker.start(startup_phases())
+    resource_sampler.start()
+    if drift_monitor is not None:
+        drift_monitor.start()
+    if inference_log is not None:
+        inference_log.start()
+    STARTUP_DURATION_SECONDS.set(time.time() - PROCESS_START_TIME)
+
+@app.on_event("shutdown")
+def shutdown_event():
+    resource_sampler.stop()
+    if drift_monitor is not None:
+        drift_monitor.stop()
+    if inference_log is not None:
+        inference_log.stop()
+    inference_executor.shutdown()
+    if _batcher is not None:
+        _batcher.stop()
+    if inference_client is not None:
+        inference_client.close()
 
 @app.get("/")
 def root():
     return {
         "message": "MLOps API is running",
         "model_name": MODEL_NAME,
-        "endpoints": ["/health", "/predict", "/metrics", "/docs"],
+        "endpoints": ["/health", "/ready", "/predict", "/predict/stream", "/models", "/score/batch", "/drift-status", "/metrics", "/docs"],
     }
 
+async def model_is_ready() -> bool:
+    """Whether the serving model is loaded, here or in the inference process."""
+    if inference_client is None:
+        return model_pool.is_resident()
+    try:
+        return bool((await run_in_threadpool(inference_client.health)).get("model_ready"))
+    except OSError:
+        return False
+
 @app.get("/health")
-def health():
-    update_resource_metrics()
-    model_ready = _model is not None and _tokenizer is not None
+async def health():
+    model_ready = await model_is_ready()
     return {
         "status": "ok" if model_ready else "degraded",
         "model_ready": model_ready,
+        "startup_phase": startup_tracker.phase,
         "model_name": MODEL_NAME,
+        "model_precision": MODEL_PRECISION,
+        "inference_backend": INFERENCE_BACKEND,
+        "model_version": model_version_label(active_model_version()),
         "uptime_seconds": round(time.time() - START_TIME, 3),
-        "resource_usage": {
-            "memory_rss_bytes": int(PROCESS.memory_info().rss),
-            "cpu_percent": float(PROCESS.cpu_percent(interval=None)),
-            "thread_count": int(PROCESS.num_threads()),
-        },
+        # Cached snapshot from the background sampler
+        "resource_usage": dict(resource_sampler.snapshot),
     }
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the background startup phases finished and the model is loaded, else 503."""
+    status = startup_tracker.status(await model_is_ready())
+    return JSONResponse(content=status, status_code=200 if status["ready"] else 503)
+
 @app.get("/metrics")
-def metrics():
-    update_resource_metrics()
+async def metrics():
+    # Ensures the resource gauges hold at least one sample before the sampler's first tick
+    resource_sampler.snapshot
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
+def build_prompt_text(tokenizer, prompt: str) -> str:
+    # Check for chat template support and apply it
+    if hasattr(tokenizer, 'chat_template') and tokenizer.chat_template:
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        return tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True
+        )
+    # Fallback for models without a chat template
+    return prompt
+
+def sampling_kwargs(req: PredictRequest) -> dict:
+    """Maps request sampling fields to `generate` keyword arguments."""
+    if not req.do_sample:
+        return {"do_sample": False}
+    return {
+        "do_sample": True,
+        "temperature": req.temperature,
+        "top_k": req.top_k, # Use top_k from the request
+        "top_p": req.top_p,
+    }
+
+def sampling_key(req: PredictRequest):
+    """Requests can only share a generate call when their sampling parameters match."""
+    if req.seed is not None:
+        # Seeded output must not depend on which other requests share the batch
+        return (req.model_version, "seed", id(req))
+    if not req.do_sample:
+        return (req.model_version, "greedy")
+    return (req.model_version, req.temperature, req.top_k, req.top_p)
+
+def generate_batch(requests):
+    """Runs one left-padded generate call for requests sharing model version and sampling parameters."""
+    import torch
+    from transformers import LogitsProcessorList
+
+    from app.scheduler import SeededSampler
+
+    first = requests[0]
+    tokenizer, model = get_model(first.model_version)
+    timer = PhaseTimer(INFERENCE_PHASE_SECONDS)
+
+    with timer.phase("template"):
+        texts = [build_prompt_text(tokenizer, req.prompt) for req in requests]
+    with timer.phase("tokenize"):
+        inputs = tokenizer(texts, return_tensors="pt", padding=True)
+
+    input_length = inputs.input_ids.shape[1]
+
+    first_token = FirstTokenTimer()
+    logits_processor = LogitsProcessorList([first_token])
+    sampling = sampling_kwargs(first)
+    seeded = first.seed is not None and first.do_sample
+    if seeded:
+        # Sampled from the request's own generator: seeding the global RNG would race with
+        # streams and profiled requests sampling on other threads
+        logits_processor.append(SeededSampler(requests))
+        sampling = {"do_sample": False}
+    generate_start = time.perf_counter()
+    with torch.no_grad():
+        # Drafting would draw from the request's generator too, so a seed would give other text
+        outputs = generate_with_model(
+            model,
+            speculative=not seeded,
+            **inputs,
+            max_new_tokens=max(req.max_new_tokens for req in requests),
+            pad_token_id=tokenizer.eos_token_id,
+            logits_processor=logits_processor,
+            **sampling,
+        )
+    for phase, seconds in first_token.split(generate_start, time.perf_counter()).items():
+        timer.add(phase, seconds)
+
+    # Slice each row to remove the (padded) prompt and cap it at its own max_new_tokens
+    with timer.phase("detokenize"):
+        texts = [
+            tokenizer.decode(
+                outputs[row][input_length:input_length + req.max_new_tokens],
+                skip_special_tokens=True,
+            )
+            for row, req in enumerate(requests)
+        ]
+    timer.publish(requests)
+    return texts
+
+def create_prefix_cache():
+    if PREFIX_CACHE_MAX_ENTRIES <= 0:
+        return None
+    return PrefixCache(
+        max_entries=PREFIX_CACHE_MAX_ENTRIES,
+        max_bytes=int(PREFIX_CACHE_MAX_MB * 1024 * 1024),
+        hits_counter=PREFIX_CACHE_HITS,
+        misses_counter=PREFIX_CACHE_MISSES,
+        hit_ratio_gauge=PREFIX_CACHE_HIT_RATIO,
+        bytes_gauge=PREFIX_CACHE_BYTES,
+        entries_gauge=PREFIX_CACHE_ENTRIES,
+    )
+
+def create_batcher():
+    if BATCHING_MODE == "continuous":
+        from app.scheduler import ContinuousBatchScheduler
+
+        if DRAFT_MODEL_NAME or DRAFT_MODEL_PATH:
+            logger.warning("speculative_decoding_unsupported batching_mode=continuous applies_to=stream")
+        return ContinuousBatchScheduler(
+            get_model,
+            build_prompt_text,
+            max_batch_size=BATCH_MAX_SIZE,
+            prefix_cache=create_prefix_cache(),
+            batch_size_histogram=PREDICTION_BATCH_SIZE,
+            queue_wait_histogram=PREDICTION_QUEUE_WAIT,
+            phase_histogram=INFERENCE_PHASE_SECONDS,
+        )
+    if BATCHING_MODE != "static":
+        logger.warning("unknown_batching_mode mode=%s falling_back=static", BATCHING_MODE)
+    return MicroBatcher(
+        generate_batch,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_seconds=BATCH_MAX_WAIT_MS / 1000,
+        group_key=sampling_key,
+        batch_size_histogram=PREDICTION_BATCH_SIZE,
+        queue_wait_histogram=PREDICTION_QUEUE_WAIT,
+    )
+
+# Created on first use: the continuous scheduler imports torch, which the API must not wait for at import time
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = create_batcher()
+        return _batcher
+
+def create_response_cache():
+    kwargs = dict(
+        max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+        hits_counter=RESPONSE_CACHE_HITS,
+        misses_counter=RESPONSE_CACHE_MISSES,
+    )
+    if RESPONSE_CACHE_BACKEND == "memory":
+        return ResponseCache(**kwargs)
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        return SqliteResponseCache(RESPONSE_CACHE_PATH, **kwargs)
+    return None
+
+response_cache = create_response_cache()
+
+inference_executor = InferenceExecutor(
+    max_concurrency=INFERENCE_MAX_CONCURRENCY,
+    max_queue=INFERENCE_MAX_QUEUE,
+    queue_depth_gauge=INFERENCE_QUEUE_DEPTH,
+    active_gauge=INFERENCE_ACTIVE,
+    wait_histogram=INFERENCE_QUEUE_WAIT,
+    rejected_counter=INFERENCE_REJECTED,
+)
+
+inference_client = None
+if INFERENCE_MODE == "remote":
+    inference_client = InferenceClient(
+        INFERENCE_SOCKET, pool_size=INFERENCE_MAX_CONCURRENCY, timeout=INFERENCE_TIMEOUT_SECONDS
+    )
+
+def generate_text(req: PredictRequest) -> str:
+    """Runs generation in this process or forwards it to the shared inference process."""
+    if inference_client is not None:
+        return inference_client.generate(req)
+    # A pinned version that is not resident loads on this executor thread, so the
+    # shared batch loop keeps serving other versions instead of waiting on the load
+    get_model(req.model_version)
+    return get_batcher().submit(req)
+
+def overloaded_error() -> HTTPException:
+    PREDICTION_ERRORS.labels(reason="overloaded").inc()
+    return HTTPException(
+        status_code=503,
+        detail="Inference capacity exhausted, retry later.",
+        headers={"Retry-After": str(INFERENCE_RETRY_AFTER_SECONDS)},
+    )
+
+def pin_model_version(req: PredictRequest) -> PredictRequest:
+    """Resolves the request's model version once so a concurrent activation cannot change it mid-flight."""
+    try:
+        version = resolve_model_version(req.model_version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version '{req.model_version}'.")
+    return req.model_copy(update={"model_version": version})
+
+def profile_generation(req: PredictRequest, profile_id: str) -> str:
+    """Generates one request on its own, outside the batcher, under torch.profiler."""
+    return capture_torch_profile(generate_batch, [req], trace_path=PROFILE_DIR / f"{profile_id}.json")[0]
+
+def requested_profile_id(request: Request):
+    """A new profile id when profiling is enabled and the request asks for it with `X-Profile: 1`."""
+    if not PROFILING_ENABLED or request.headers.get("x-profile") != "1":
+        return None
+    if inference_client is not None:
+        raise HTTPException(status_code=501, detail="Profiling is not available in remote inference mode.")
+    return uuid.uuid4().hex
+
 @app.post("/predict", response_model=PredictResponse)
-def predict(req: PredictRequest):
+async def predict(req: PredictRequest, request: Request, response: Response):
+    start_time = time.perf_counter()
+    profile_id = requested_profile_id(request)
+    req = await run_in_threadpool(pin_model_version, req)
+    model_version = model_version_label(req.model_version)
+    timings = {"resolve_version_seconds": time.perf_counter() - start_time}
     with PREDICTION_LATENCY.time():
         try:
-            tokenizer, model = get_model()
-
-            # Check for chat template support and apply it
-            if hasattr(tokenizer, 'chat_template') and tokenizer.chat_template:
-                messages = [
-                    {"role": "system", "content": "You are a helpful AI assistant."},
-                    {"role": "user", "content": req.prompt}
-                ]
-                text = tokenizer.apply_chat_template(
-                    messages,
-                    tokenize=False,
-                    add_generation_prompt=True
-                )
+            cache_key = None
+            # Profiled requests always run the model
+            if response_cache is not None and is_deterministic(req) and profile_id is None:
+                cache_key = response_cache_key(req, model_version, draft=draft_model_id())
+                lookup_start = time.perf_counter()
+                cached_text = await run_in_threadpool(response_cache.get, cache_key)
+                timings["cache_lookup_seconds"] = time.perf_counter() - lookup_start
+                if cached_text is not None:
+                    PREDICTION_COUNT.inc()
+                    observe_prediction(
+                        request, req, cached_text, time.perf_counter() - start_time, cached=True, timings=timings
+                    )
+                    return PredictResponse(generated_text=cached_text, model_version=model_version)
+
+            generate_start = time.perf_counter()
+            if profile_id is not None:
+                generated_text = await inference_executor.run(profile_generation, req, profile_id)
+                response.headers["X-Profile-Id"] = profile_id
             else:
-                # Fallback for models without a chat template
-                text = req.prompt
-
-            inputs = tokenizer([text], return_tensors="pt")
-
-            input_length = inputs.input_ids.shape[1]
-
-            with torch.no_grad():
-                outputs = model.generate(
-                    **inputs,
-                    max_new_tokens=req.max_new_tokens,
-                    temperature=req.temperature,
-                    do_sample=True,
-                    top_k=req.top_k, # Use top_k from the request
-                    top_p=req.top_p,
-                    pad_token_id=tokenizer.eos_token_id
-                )
-            
-            # Slice the output to remove the input prompt tokens
-            generated_tokens = outputs[0][input_length:]
-            generated_text = tokenizer.decode(generated_tokens, skip_special_tokens=True)
+                generated_text = await inference_executor.run(generate_text, req)
+            # Includes the wait for an executor slot and for the batch to fill
+            timings["generate_seconds"] = time.perf_counter() - generate_start
+            timings["phases"] = dict(req.phase_timings)
+            if cache_key is not None:
+                await run_in_threadpool(response_cache.set, cache_key, generated_text)
 
             PREDICTION_COUNT.inc()
-            
-            return PredictResponse(generated_text=generated_text, model_version=MODEL_NAME)
-        
+            observe_prediction(
+                request, req, generated_text, time.perf_counter() - start_time,
+                cached=False, timings=timings, profile_id=profile_id,
+            )
+
+            return PredictResponse(generated_text=generated_text, model_version=model_version)
+
+        except InferenceQueueFullError:
+            raise overloaded_error()
+        except socket.timeout:
+            PREDICTION_ERRORS.labels(reason="inference_timeout").inc()
+            logger.error("prediction_inference_timeout seconds=%s", INFERENCE_TIMEOUT_SECONDS)
+            raise HTTPException(status_code=504, detail="Inference process did not respond in time.")
         except Exception as e:
             PREDICTION_ERRORS.labels(reason="inference_failure").inc()
             logger.exception("prediction_inference_failed error=%s", e.__class__.__name__)
             raise HTTPException(status_code=500, detail="Prediction failed due to internal error.")
 
+def _run_streaming_generate(model, streamer, generate_kwargs):
+    import torch
+
+    try:
+        with torch.no_grad():
+            generate_with_model(model, **generate_kwargs)
+    except Exception as e:
+        PREDICTION_ERRORS.labels(reason="stream_failure").inc()
+        logger.exception("stream_generation_failed error=%s", e.__class__.__name__)
+        # Unblock the consumer; the stream simply ends early
+        streamer.end()
+
+@app.post("/predict/stream")
+async def predict_stream(req: PredictRequest, request: Request):
+    """Streams generated text as Server-Sent Events while tokens are decoded."""
+    start_time = time.perf_counter()
+    if inference_client is not None:
+        raise HTTPException(status_code=501, detail="Streaming is not available in remote inference mode.")
+    req = await run_in_threadpool(pin_model_version, req)
+    try:
+        tokenizer, model = await run_in_threadpool(get_model, req.model_version)
+    except Exception as e:
+        PREDICTION_ERRORS.labels(reason="inference_failure").inc()
+        logger.exception("prediction_inference_failed error=%s", e.__class__.__name__)
+        raise HTTPException(status_code=500, detail="Prediction failed due to internal error.")
+    # Imported once the model is loaded, so the event loop never waits on a background import
+    from transformers import StoppingCriteriaList
+
+    from app.streaming import CancelledCriteria, TimedTextStreamer
+
+    timer = PhaseTimer()
+    with timer.phase("template"):
+        text = build_prompt_text(tokenizer, req.prompt)
+    with timer.phase("tokenize"):
+        inputs = tokenizer([text], return_tensors="pt")
+
+    cancel_event = threading.Event()
+    streamer = TimedTextStreamer(
+        tokenizer,
+        ttft_histogram=STREAM_TIME_TO_FIRST_TOKEN,
+        inter_token_histogram=STREAM_INTER_TOKEN_LATENCY,
+        skip_prompt=True,
+        skip_special_tokens=True,
+        timeout=STREAM_DISCONNECT_POLL_SECONDS,
+    )
+    generate_kwargs = dict(
+        **inputs,
+        **sampling_kwargs(req),
+        max_new_tokens=req.max_new_tokens,
+        pad_token_id=tokenizer.eos_token_id,
+        streamer=streamer,
+        stopping_criteria=StoppingCriteriaList([CancelledCriteria(cancel_event)]),
+    )
+    try:
+        inference_executor.submit(_run_streaming_generate, model, streamer, generate_kwargs)
+    except InferenceQueueFullError:
+        raise overloaded_error()
+
+    async def event_stream():
+        chunks = []
+        try:
+            while True:
+                try:
+                    chunk = await run_in_threadpool(next, streamer, None)
+                except queue.Empty:
+                    # No new text within the poll interval; a client that left during a long gap is still noticed
+                    chunk = ""
+                if chunk is None:
+                    break
+                if await request.is_disconnected():
+                    STREAM_CANCELLED.inc()
+                    logger.info("stream_client_disconnected tokens=%s", streamer.token_count)
+                    return
+                if chunk:
+                    chunks.append(chunk)
+                    yield f"data: {json.dumps({'text': chunk})}\n\n"
+            PREDICTION_COUNT.inc()
+            publish_phase(req, {**timer.durations, **streamer.phase_durations()}, INFERENCE_PHASE_SECONDS)
+            observe_prediction(
+                request,
+                req,
+                "".join(chunks),
+                time.perf_counter() - start_time,
+                cached=False,
+                timings={
+                    "time_to_first_token_seconds": streamer.time_to_first_token,
+                    "decode_seconds": streamer.decode_seconds,
+                    "phases": dict(req.phase_timings),
+                },
+            )
+            yield "data: [DONE]\n\n"
+        finally:
+            # Stops the decode loop on disconnect or cancellation of this generator
+            cancel_event.set()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.get("/models")
+async def list_models():
+    """Registered model versions, the active one and, in local mode, those resident in memory."""
+    versions = await run_in_threadpool(model_registry.list_models, model_format="hf")
+    resident_versions = model_pool.resident_versions()
+    if inference_client is not None:
+        try:
+            resident_versions = (await run_in_threadpool(inference_client.health)).get("resident_versions", [])
+        except OSError:
+            resident_versions = []
+    return {
+        "active_version": active_model_version(),
+        "resident_versions": resident_versions,
+        "versions": versions,
+    }
+
+@app.post("/models/{version}/activate", status_code=202)
+async def activate_model(version: str):
+    """
+    Starts warming a registered version; traffic switches to it once it is loaded.
+
+    In local mode only the process that received the call switches; run several
+    workers with `python -m app.serve` so they share one inference process.
+    """
+    if await run_in_threadpool(registered_model_dir, version) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown model version '{version}'.")
+    if inference_client is not None:
+        response = await run_in_threadpool(inference_client.call, {"op": "activate", "version": version})
+        if "error" in response:
+            raise HTTPException(status_code=500, detail="Model activation failed.")
+    else:
+        activate_model_version(version)
+    return {"version": version, "status": "warming"}
+
+def score_feature_batch(body: bytes, content_type: str, accept: str) -> tuple:
+    """Decodes, scores and encodes one batch; returns (body, media_type, rows)."""
+    timer = PhaseTimer()
+    with timer.phase("decode"):
+        features = decode_features(body, content_type, batch_scorer.feature_names(), batch_scorer.n_features())
+    if features.shape[0] > SCORING_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {SCORING_MAX_ROWS} rows per request.")
+    with timer.phase("score"):
+        scores = batch_scorer.score(features)
+    with timer.phase("encode"):
+        content, media_type = encode_scores(scores, accept)
+    publish_phase(None, timer.durations, BATCH_SCORING_SECONDS)
+    return content, media_type, features.shape[0]
+
+@app.post("/score/batch")
+async def score_batch(request: Request):
+    """
+    Scores many feature rows with the classical joblib model in one `predict_proba` call.
+
+    The body is columnar JSON, a .npy matrix or an Arrow IPC stream (see the
+    README); the result is columnar JSON, or Arrow with `Accept: application/vnd.apache.arrow.stream`.
+    """
+    body = await request.body()
+    try:
+        content, media_type, rows = await run_in_threadpool(
+            score_feature_batch,
+            body,
+            request.headers.get("content-type", "application/json"),
+            request.headers.get("accept", ""),
+        )
+    except UnsupportedMediaTypeError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Classifier model is not available.")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    BATCH_SCORING_ROWS.inc(rows)
+    return Response(content=content, media_type=media_type)
+
+@app.get("/drift-status")
+async def drift_status():
+    """Latest drift scores of live /predict traffic against the reference summary."""
+    if drift_monitor is None:
+        raise HTTPException(status_code=404, detail="Drift monitoring is disabled.")
+    return drift_monitor.status
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, summary: bool = False):
+    """Chrome trace (or with `summary=true`, the operator table) of a request sent with `X-Profile: 1`."""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    if not (len(profile_id) == 32 and all(c in "0123456789abcdef" for c in profile_id)):
+        raise HTTPException(status_code=404, detail=f"Unknown profile '{profile_id}'.")
+    path = PROFILE_DIR / f"{profile_id}.{'txt' if summary else 'json'}"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=f"Unknown profile '{profile_id}'.")
+    if summary:
+        return PlainTextResponse(path.read_text())
+    return FileResponse(path, media_type="application/json")
+
+@app.get("/debug/stacks")
+async def debug_stacks(seconds: float = 5.0, interval_ms: float = 10.0):
+    """Samples the Python stacks of all threads in this process and returns them in collapsed format."""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SAMPLE_SECONDS)
+    stacks = await run_in_threadpool(sample_stacks, seconds, max(interval_ms, 1.0) / 1000)
+    return PlainTextResponse(stacks)
+
 @app.get("/favicon.ico", include_in_schema=False)
 async def favicon():
     return JSONResponse(content={"message": "No favicon"}, status_code=200)
+
+# Startup profile up to here: interpreter and server startup, then importing this module
+STARTUP_PHASE_SECONDS.labels(phase="interpreter").set(max(0.0, IMPORT_STARTED_AT - PROCESS_START_TIME))
+STARTUP_PHASE_SECONDS.labels(phase="app_import").set(time.time() - IMPORT_STARTED_AT)
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import mmap
+import struct
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import torch
+from safetensors.torch import load_file, save_file
+from transformers import AutoConfig, AutoModelForCausalLM, GenerationConfig
+
+logger = logging.getLogger("mlops_api")
+
+SUPPORTED_PRECISIONS = ("fp32", "bf16", "dynamic-int8")
+# Floating-point dtype the weights are loaded in for each precision; int8 is quantized from fp32.
+# Checkpoints are often stored in bf16 and from_pretrained would otherwise keep their dtype.
+PRECISION_DTYPES = {"fp32": torch.float32, "bf16": torch.bfloat16, "dynamic-int8": torch.float32}
+
+SNAPSHOT_FORMAT = "mmap-safetensors/v1"
+SNAPSHOT_MANIFEST = "snapshot_manifest.json"
+SNAPSHOT_BUFFERS_FILE = "snapshot_buffers.safetensors"
+
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+@contextmanager
+def _timed_phase(name: str, phase_durations: Optional[Dict[str, float]]):
+    start = time.perf_counter()
+    yield
+    if phase_durations is not None:
+        phase_durations[name] = time.perf_counter() - start
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_snapshot_manifest(model, model_dir, model_name: str) -> dict:
+    """
+    Turns a `save_pretrained` directory into an mmap-loadable snapshot.
+
+    Saves every module buffer (including non-persistent ones such as rotary
+    frequencies, which are not part of the checkpoint) next to the weights and
+    writes a manifest listing each file with its size and sha256.
+    """
+    model_dir = Path(model_dir)
+    buffers = {name: buffer.detach().contiguous() for name, buffer in model.named_buffers()}
+    save_file(buffers, str(model_dir / SNAPSHOT_BUFFERS_FILE))
+
+    weights_files = sorted(
+        path.name for path in model_dir.glob("*.safetensors") if path.name != SNAPSHOT_BUFFERS_FILE
+    )
+    files = {
+        path.name: {"size": path.stat().st_size, "sha256": _sha256(path)}
+        for path in sorted(model_dir.iterdir())
+        if path.is_file() and path.name != SNAPSHOT_MANIFEST
+    }
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "model_name": model_name,
+        "dtype": str(model.dtype).replace("torch.", ""),
+        "weights_files": weights_files,
+        "buffers_file": SNAPSHOT_BUFFERS_FILE,
+        "files": files,
+        "created_at": datetime.now().isoformat(),
+    }
+    with open(model_dir / SNAPSHOT_MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_snapshot_manifest(model_dir) -> Optional[dict]:
+    """Returns the snapshot manifest if `model_dir` holds a complete snapshot."""
+    manifest_path = Path(model_dir) / SNAPSHOT_MANIFEST
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        return None
+    for name, info in manifest["files"].items():
+        path = Path(model_dir) / name
+        if not path.exists() or path.stat().st_size != info["size"]:
+            logger.warning("snapshot_file_mismatch file=%s", name)
+            return None
+    return manifest
+
+
+def mmap_safetensors(path) -> Dict[str, torch.Tensor]:
+    """
+    Maps a safetensors file into memory without copying the tensor data.
+
+    Pages are mapped copy-on-write, so they stay shared through the page cache
+    with every other process mapping the same file until something writes to them.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    header_length = struct.unpack("<Q", mapped[:8])[0]
+    header = json.loads(mapped[8:8 + header_length])
+    data_start = 8 + header_length
+
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        if end == start:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        tensors[name] = torch.frombuffer(
+            mapped, dtype=dtype, count=count, offset=data_start + start
+        ).view(info["shape"])
+    return tensors
+
+
+def load_mmap_snapshot(model_dir, manifest: dict):
+    """Builds the model on the meta device and points its weights at the mapped files."""
+    model_dir = Path(model_dir)
+    config = AutoConfig.from_pretrained(str(model_dir), local_files_only=True)
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(config)
+
+    state_dict = {}
+    for weights_file in manifest["weights_files"]:
+        state_dict.update(mmap_safetensors(model_dir / weights_file))
+    model.load_state_dict(state_dict, strict=False, assign=True)
+
+    for name, buffer in load_file(str(model_dir / manifest["buffers_file"])).items():
+        module_name, _, buffer_name = name.rpartition(".")
+        module = model.get_submodule(module_name) if module_name else model
+        module._buffers[buffer_name] = buffer
+
+    model.tie_weights()
+    if (model_dir / "generation_config.json").exists():
+        model.generation_config = GenerationConfig.from_pretrained(str(model_dir))
+    missing = [name for name, tensor in model.state_dict().items() if tensor.is_meta]
+    if missing:
+        raise RuntimeError(f"Snapshot is missing tensors: {missing[:5]}")
+    return model
+
+
+def quantize_dynamic_int8(model):
+    """
+    Converts the model's Linear layers to dynamically quantized int8.
+
+    The output projection is left in full precision because it is usually tied
+    to the input embeddings; quantizing it would add a second copy of the
+    largest matrix instead of shrinking anything.
+    """
+    output_embeddings = model.get_output_embeddings()
+    linear_names = {
+        name
+        for name, module in model.named_modules()
+        if isinstance(module, torch.nn.Linear) and module is not output_embeddings
+    }
+    return torch.ao.quantization.quantize_dynamic(model, linear_names, dtype=torch.qint8)
+
+
+def load_causal_lm(model_source: str, precision: str = "fp32", phase_durations: Optional[Dict[str, float]] = None):
+    """
+    Loads a causal LM and applies the conversion for the requested precision.
+
+    Local directories with a snapshot manifest are memory-mapped; anything else
+    goes through `from_pretrained`. Phase timings are written to `phase_durations`.
+    """
+    if precision not in SUPPORTED_PRECISIONS:
+        raise ValueError(
+            f"Unsupported MODEL_PRECISION '{precision}', expected one of {SUPPORTED_PRECISIONS}"
+        )
+
+    model = None
+    manifest = read_snapshot_manifest(model_source) if Path(model_source).is_dir() else None
+    if manifest is not None:
+        try:
+            with _timed_phase("weights_mmap", phase_durations):
+                model = load_mmap_snapshot(model_source, manifest)
+            logger.info("model_loaded_from_snapshot path=%s dtype=%s", model_source, manifest["dtype"])
+        except Exception:
+            logger.exception("snapshot_load_failed path=%s falling_back=from_pretrained", model_source)
+
+    if model is None:
+        with _timed_phase("weights", phase_durations):
+            model = AutoModelForCausalLM.from_pretrained(model_source, dtype=PRECISION_DTYPES[precision])
+    model.eval()
+
+    with _timed_phase("precision", phase_durations):
+        # A snapshot keeps the dtype it was saved in
+        if model.dtype != PRECISION_DTYPES[precision]:
+            model = model.to(PRECISION_DTYPES[precision])
+        if precision == "dynamic-int8":
+            model = quantize_dynamic_int8(model)
+    logger.info("model_precision_applied precision=%s", precision)
+    return model
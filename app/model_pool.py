@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+logger = logging.getLogger("mlops_api")
+
+
+def model_nbytes(model) -> int:
+    """Memory held by a model's parameters and buffers (or its own `nbytes` for non-PyTorch backends)."""
+    nbytes = getattr(model, "nbytes", None)
+    if nbytes is not None:
+        return nbytes
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelPool:
+    """
+    LRU pool of loaded model versions bounded by count and memory budget.
+
+    `loader(version)` returns a (tokenizer, model) pair. The active version is
+    never evicted, and evicting a version only drops the pool's reference, so
+    requests already holding that model finish on it. `activate` loads and
+    warms a version in the background and switches to it once it is ready.
+    """
+
+    def __init__(
+        self,
+        loader: Callable,
+        active_version: str,
+        max_models: int = 2,
+        memory_budget_bytes: Optional[int] = None,
+        warmup: Optional[Callable] = None,
+        load_histogram=None,
+        evictions_counter=None,
+        resident_gauge=None,
+        resident_bytes_gauge=None,
+    ):
+        self.loader = loader
+        self.active_version = active_version
+        self.max_models = max(1, max_models)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.warmup = warmup
+        self.load_histogram = load_histogram
+        self.evictions_counter = evictions_counter
+        self.resident_gauge = resident_gauge
+        self.resident_bytes_gauge = resident_bytes_gauge
+
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, version: Optional[str] = None):
+        """Returns (tokenizer, model) for `version` (default: active), loading it if needed."""
+        version = version or self.active_version
+        with self._lock:
+            if version in self._resident:
+                self._resident.move_to_end(version)
+                return self._resident[version][:2]
+            load_lock = self._load_locks.setdefault(version, threading.Lock())
+
+        # One load per version at a time; other versions keep serving meanwhile
+        with load_lock:
+            with self._lock:
+                if version in self._resident:
+                    return self._resident[version][:2]
+
+            start = time.perf_counter()
+            tokenizer, model = self.loader(version)
+            if self.load_histogram is not None:
+                self.load_histogram.observe(time.perf_counter() - start)
+
+            with self._lock:
+                self._resident[version] = (tokenizer, model, model_nbytes(model))
+                self._evict(keep=version)
+                self._update_gauges()
+            logger.info("model_pool_loaded version=%s resident=%s", version, list(self._resident))
+            return tokenizer, model
+
+    def is_resident(self, version: Optional[str] = None) -> bool:
+        with self._lock:
+            return (version or self.active_version) in self._resident
+
+    def resident_versions(self) -> List[str]:
+        with self._lock:
+            return list(self._resident)
+
+    def activate(self, version: str, on_ready: Optional[Callable] = None) -> threading.Thread:
+        """Warms `version` on a background thread, then makes it the active version."""
+
+        def warm():
+            try:
+                tokenizer, model = self.get(version)
+                if self.warmup is not None:
+                    self.warmup(tokenizer, model)
+            except Exception:
+                logger.exception("model_pool_activation_failed version=%s", version)
+                return
+            with self._lock:
+                previous, self.active_version = self.active_version, version
+            logger.info("model_pool_activated version=%s previous=%s", version, previous)
+            if on_ready is not None:
+                on_ready(version)
+
+        thread = threading.Thread(target=warm, name=f"model-warmup-{version}", daemon=True)
+        thread.start()
+        return thread
+
+    def _evict(self, keep: str) -> None:
+        protected = {keep, self.active_version}
+        while len(self._resident) > self.max_models or (
+            self.memory_budget_bytes is not None
+            and sum(entry[2] for entry in self._resident.values()) > self.memory_budget_bytes
+        ):
+            victim = next((v for v in self._resident if v not in protected), None)
+            if victim is None:
+                break
+            del self._resident[victim]
+            if self.evictions_counter is not None:
+                self.evictions_counter.inc()
+            logger.info("model_pool_evicted version=%s", victim)
+
+    def _update_gauges(self) -> None:
+        if self.resident_gauge is not None:
+            self.resident_gauge.set(len(self._resident))
+        if self.resident_bytes_gauge is not None:
+            self.resident_bytes_gauge.set(sum(entry[2] for entry in self._resident.values()))
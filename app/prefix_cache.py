@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+
+def _layers_nbytes(layers: List[tuple]) -> int:
+    return sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in layers)
+
+
+class PrefixCache:
+    """
+    Bounded LRU cache of KV states keyed by prompt token prefixes.
+
+    Entries hold per-layer (key, value) tensors of shape (1, heads, length, dim)
+    for a token prefix. `lookup` returns the longest cached prefix of a prompt so
+    prefill only has to run on the remaining tokens. Entries are scoped by
+    `namespace` (the model version) since KV states are only valid for the
+    model that computed them.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 32,
+        max_bytes: int = 256 * 1024 * 1024,
+        hits_counter=None,
+        misses_counter=None,
+        hit_ratio_gauge=None,
+        bytes_gauge=None,
+        entries_gauge=None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits_counter = hits_counter
+        self.misses_counter = misses_counter
+        self.hit_ratio_gauge = hit_ratio_gauge
+        self.bytes_gauge = bytes_gauge
+        self.entries_gauge = entries_gauge
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, token_ids: Sequence[int], namespace=None) -> Tuple[int, Optional[List[tuple]]]:
+        """Returns (prefix_length, layers) for the longest cached prefix, or (0, None)."""
+        token_ids = tuple(token_ids)
+        with self._lock:
+            best_key = None
+            for key in self._entries:
+                key_namespace, key_ids = key
+                if key_namespace != namespace or len(key_ids) > len(token_ids):
+                    continue
+                if (best_key is None or len(key_ids) > len(best_key[1])) and token_ids[:len(key_ids)] == key_ids:
+                    best_key = key
+
+            if best_key is None:
+                self.misses += 1
+                if self.misses_counter is not None:
+                    self.misses_counter.inc()
+                self._update_gauges()
+                return 0, None
+
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            if self.hits_counter is not None:
+                self.hits_counter.inc()
+            self._update_gauges()
+            return len(best_key[1]), self._entries[best_key]
+
+    def put(self, token_ids: Sequence[int], layers: List[tuple], namespace=None) -> None:
+        """Stores KV states for `token_ids`, evicting least recently used entries."""
+        if self.max_entries <= 0:
+            return
+        key = (namespace, tuple(token_ids))
+        size = _layers_nbytes(layers)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = layers
+            self.nbytes += size
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= _layers_nbytes(evicted)
+            self._update_gauges()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        total = self.hits + self.misses
+        if self.hit_ratio_gauge is not None and total:
+            self.hit_ratio_gauge.set(self.hits / total)
+        if self.bytes_gauge is not None:
+            self.bytes_gauge.set(self.nbytes)
+        if self.entries_gauge is not None:
+            self.entries_gauge.set(len(self._entries))
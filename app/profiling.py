@@ -0,0 +1,121 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+
+PHASES = ("template", "tokenize", "prefill", "decode", "detokenize")
+
+
+class PhaseTimer:
+    """
+    Accumulates the duration of named inference phases for one model call.
+
+    `publish` copies the durations into the `phase_timings` of every request
+    served by the call and observes them in a histogram labeled by phase, so
+    each request reports the phases it actually waited for.
+    """
+
+    def __init__(self, histogram=None):
+        self.histogram = histogram
+        self.durations = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + max(0.0, seconds)
+
+    def publish(self, requests: Iterable) -> None:
+        for request in requests:
+            publish_phase(request, self.durations, self.histogram)
+
+
+def publish_phase(request, durations: dict, histogram=None) -> None:
+    timings = getattr(request, "phase_timings", None)
+    if timings is not None:
+        timings.update(durations)
+    if histogram is not None:
+        for name, seconds in durations.items():
+            histogram.labels(phase=name).observe(seconds)
+
+
+class FirstTokenTimer:
+    """
+    Records when `generate` first asks for next-token scores.
+
+    That happens right after the prompt's forward pass, so the time from the
+    start of `generate` to this point is prefill and the rest is decode. It
+    implements the logits processor call protocol without subclassing
+    `transformers.LogitsProcessor`, so importing this module stays cheap.
+    """
+
+    def __init__(self):
+        self.first_call_at = None
+
+    def __call__(self, input_ids, scores):
+        if self.first_call_at is None:
+            self.first_call_at = time.perf_counter()
+        return scores
+
+    def split(self, started_at: float, finished_at: float) -> dict:
+        """Returns {"prefill": ..., "decode": ...} for a generate call between the two timestamps."""
+        first_token_at = self.first_call_at or finished_at
+        return {"prefill": first_token_at - started_at, "decode": finished_at - first_token_at}
+
+
+def capture_torch_profile(fn, *args, trace_path, summary_rows: int = 30):
+    """
+    Runs `fn(*args)` under torch.profiler and writes a Chrome trace to `trace_path`.
+
+    A table of the most expensive operators is written next to it as .txt.
+    Returns the result of `fn`.
+    """
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+
+    trace_path = Path(trace_path)
+    trace_path.parent.mkdir(parents=True, exist_ok=True)
+    with profile(activities=activities, record_shapes=True) as prof:
+        result = fn(*args)
+    prof.export_chrome_trace(str(trace_path))
+    summary = prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=summary_rows)
+    trace_path.with_suffix(".txt").write_text(summary)
+    return result
+
+
+def sample_stacks(seconds: float, interval_seconds: float = 0.01) -> str:
+    """
+    Samples the Python stack of every other thread for `seconds`.
+
+    Returns collapsed stacks ("thread;outer;...;inner count" per line), the
+    input format of flamegraph.pl and speedscope.
+    """
+    counts = Counter()
+    own_thread = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            counts[";".join([names.get(ident, str(ident))] + stack[::-1])] += 1
+        time.sleep(interval_seconds)
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import psutil
+
+
+class ResourceSampler:
+    """
+    Samples process resource usage on a background thread.
+
+    Keeps psutil syscalls off the request path: gauges are refreshed every
+    `interval_seconds` and readers such as /health use the cached `snapshot`.
+    """
+
+    def __init__(
+        self,
+        start_time: float,
+        interval_seconds: float = 5.0,
+        memory_gauge=None,
+        cpu_gauge=None,
+        threads_gauge=None,
+        uptime_gauge=None,
+    ):
+        self.start_time = start_time
+        self.interval_seconds = max(0.1, interval_seconds)
+        self.memory_gauge = memory_gauge
+        self.cpu_gauge = cpu_gauge
+        self.threads_gauge = threads_gauge
+        self.uptime_gauge = uptime_gauge
+
+        self.process = psutil.Process(os.getpid())
+        self._snapshot: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stopped = threading.Event()
+
+    def sample(self) -> dict:
+        """Reads current usage, updates the gauges and caches the result."""
+        with self.process.oneshot():
+            snapshot = {
+                "memory_rss_bytes": int(self.process.memory_info().rss),
+                "cpu_percent": float(self.process.cpu_percent(interval=None)),
+                "thread_count": int(self.process.num_threads()),
+            }
+        if self.memory_gauge is not None:
+            self.memory_gauge.set(snapshot["memory_rss_bytes"])
+        if self.cpu_gauge is not None:
+            self.cpu_gauge.set(snapshot["cpu_percent"])
+        if self.threads_gauge is not None:
+            self.threads_gauge.set(snapshot["thread_count"])
+        if self.uptime_gauge is not None:
+            self.uptime_gauge.set(time.time() - self.start_time)
+        self._snapshot = snapshot
+        return snapshot
+
+    @property
+    def snapshot(self) -> dict:
+        """Latest cached sample; takes one synchronously if none exists yet."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.sample()
+        return snapshot
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopped.clear()
+            self._worker = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+            self._worker.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is None:
+            return
+        self._stopped.set()
+        worker.join(self.interval_seconds + 1)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.sample()
+            self._stopped.wait(self.interval_seconds)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+
+def is_deterministic(req) -> bool:
+    """Only greedy or explicitly seeded requests produce repeatable output."""
+    return not req.do_sample or req.seed is not None
+
+
+def response_cache_key(req, model_name: str, draft: Optional[str] = None) -> str:
+    """Hashes the normalized request together with the model (and draft model, if any) that serves it."""
+    fields = {"model": model_name, "prompt": req.prompt, "max_new_tokens": req.max_new_tokens}
+    if draft is not None:
+        fields["draft"] = draft
+    if req.do_sample:
+        fields.update(
+            seed=req.seed, temperature=req.temperature, top_k=req.top_k, top_p=req.top_p
+        )
+    payload = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """In-process response cache with TTL expiry and size-bounded LRU eviction."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, hits_counter=None, misses_counter=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits_counter = hits_counter
+        self.misses_counter = misses_counter
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self._count(entry is not None)
+        return entry[0] if entry is not None else None
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _count(self, hit: bool) -> None:
+        counter = self.hits_counter if hit else self.misses_counter
+        if counter is not None:
+            counter.inc()
+
+
+class SqliteResponseCache(ResponseCache):
+    """
+    Response cache stored in a local SQLite file so every uvicorn worker on the
+    host shares the same entries. Eviction removes the least recently used rows.
+    """
+
+    def __init__(self, path, max_entries: int = 1024, ttl_seconds: float = 3600, hits_counter=None, misses_counter=None):
+        super().__init__(max_entries, ttl_seconds, hits_counter, misses_counter)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is not None:
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        self._count(row is not None)
+        return row[0] if row is not None else None
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl_seconds, now),
+        )
+        conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM responses")
@@ -0,0 +1,461 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import torch
+from transformers import DynamicCache
+
+from app.profiling import publish_phase
+
+logger = logging.getLogger("mlops_api")
+
+
+def cache_to_layers(cache) -> List[tuple]:
+    """Returns the (key, value) tensors of each layer for any supported cache format."""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [(layer[0], layer[1]) for layer in cache]
+
+
+def layers_to_cache(layers: List[tuple]):
+    """Builds a DynamicCache from per-layer (key, value) tensors."""
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(layers)
+
+
+def _left_pad(tensor: torch.Tensor, length: int, dim: int) -> torch.Tensor:
+    missing = length - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    pad_shape = list(tensor.shape)
+    pad_shape[dim] = missing
+    return torch.cat([tensor.new_zeros(pad_shape), tensor], dim=dim)
+
+
+def _concat_rows(layer_sets: List[List[tuple]], masks: List[torch.Tensor]):
+    """Left-pads several batched caches and attention masks to one length and stacks them."""
+    length = max(mask.shape[1] for mask in masks)
+    layers = [
+        (
+            torch.cat([_left_pad(k, length, 2) for k, _ in per_layer], dim=0),
+            torch.cat([_left_pad(v, length, 2) for _, v in per_layer], dim=0),
+        )
+        for per_layer in zip(*layer_sets)
+    ]
+    attention_mask = torch.cat([_left_pad(mask, length, 1) for mask in masks], dim=0)
+    return layers, attention_mask
+
+
+def sample_next_tokens(logits, temperature, top_k, top_p, generators=None) -> torch.Tensor:
+    """
+    Samples one token per row with per-row temperature, top-k and top-p.
+
+    `temperature` and `top_p` are float tensors and `top_k` a long tensor,
+    all of shape (batch,). Rows with an entry in `generators` draw from their
+    own torch.Generator so seeded output does not depend on the batch.
+    """
+    logits = logits.float() / temperature.unsqueeze(-1)
+    sorted_logits, sorted_indices = logits.sort(dim=-1, descending=True)
+
+    ranks = torch.arange(sorted_logits.shape[-1], device=logits.device).unsqueeze(0)
+    sorted_logits = sorted_logits.masked_fill(ranks >= top_k.unsqueeze(-1), float("-inf"))
+
+    probs = sorted_logits.softmax(dim=-1)
+    # Keep the smallest set of tokens whose cumulative probability reaches top_p
+    outside_top_p = (probs.cumsum(dim=-1) - probs) > top_p.unsqueeze(-1)
+    sorted_logits = sorted_logits.masked_fill(outside_top_p, float("-inf"))
+
+    probs = sorted_logits.softmax(dim=-1)
+    generators = list(generators or [])
+    if len(generators) == len(probs) and all(generator is not None for generator in generators):
+        # Fully seeded batches leave the process-wide RNG untouched
+        choice = torch.empty((len(probs), 1), dtype=torch.long, device=probs.device)
+    else:
+        choice = torch.multinomial(probs, num_samples=1)
+    for row, generator in enumerate(generators):
+        if generator is not None:
+            choice[row] = torch.multinomial(probs[row], num_samples=1, generator=generator)
+    return sorted_indices.gather(-1, choice).squeeze(-1)
+
+
+def sampling_params(requests, vocab_size: int) -> tuple:
+    """Per-row (temperature, top_k, top_p) tensors for `sample_next_tokens` from PredictRequests."""
+    temperature, top_k, top_p = [], [], []
+    for request in requests:
+        if request.do_sample:
+            temperature.append(request.temperature or 1.0)
+            top_k.append(request.top_k or vocab_size)
+            top_p.append(request.top_p or 1.0)
+        else:
+            # Greedy decoding is sampling from the single most likely token
+            temperature.append(1.0)
+            top_k.append(1)
+            top_p.append(1.0)
+    return (
+        torch.tensor(temperature, dtype=torch.float32),
+        torch.tensor(top_k, dtype=torch.long),
+        torch.tensor(top_p, dtype=torch.float32),
+    )
+
+
+class SeededSampler:
+    """
+    Logits processor that samples the next token of each row from its request's own torch.Generator.
+
+    Used with greedy `generate` (do_sample=False): every score but the sampled
+    token's is set to -inf, so the greedy pick is the sampled token and seeded
+    output never depends on the process-wide RNG that other threads draw from.
+    """
+
+    def __init__(self, requests):
+        self.requests = list(requests)
+        self.generators = [torch.Generator().manual_seed(request.seed) for request in self.requests]
+
+    def __call__(self, input_ids, scores):
+        tokens = sample_next_tokens(scores, *sampling_params(self.requests, scores.shape[-1]), self.generators)
+        return torch.full_like(scores, float("-inf")).scatter_(-1, tokens.unsqueeze(-1), 0.0)
+
+
+class _Sequence:
+    __slots__ = ("request", "version", "future", "enqueued_at", "generated", "generator", "timings", "prefilled_at")
+
+    def __init__(self, request):
+        self.request = request
+        self.version = getattr(request, "model_version", None)
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.generated = []
+        self.generator = None
+        self.timings = {}
+        self.prefilled_at = None
+        if request.seed is not None:
+            self.generator = torch.Generator().manual_seed(request.seed)
+
+
+class ContinuousBatchScheduler:
+    """
+    Iteration-level scheduler that runs the decode loop itself.
+
+    Unlike `MicroBatcher`, which waits for a whole `generate` call to finish,
+    new requests are prefilled and join the running batch between decode
+    steps and finished sequences leave immediately. Every row of the batch
+    owns its slice of the left-padded KV cache; rows are only copied when
+    sequences join or leave. With a `PrefixCache`, prefill starts from the
+    KV states of the longest cached prompt prefix.
+
+    A running batch is pinned to one model version: `get_model(version)` is
+    called with the version of the requests in it, and requests for another
+    version wait until the batch has drained.
+
+    Each sequence records how long its template, tokenize, prefill, decode
+    and detokenize phases took; decode is its time in the running batch.
+    """
+
+    def __init__(
+        self,
+        get_model: Callable,
+        build_prompt: Callable,
+        max_batch_size: int = 8,
+        prefix_cache=None,
+        batch_size_histogram=None,
+        queue_wait_histogram=None,
+        phase_histogram=None,
+    ):
+        self.get_model = get_model
+        self.build_prompt = build_prompt
+        self.max_batch_size = max(1, max_batch_size)
+        self.prefix_cache = prefix_cache
+        self._shared_prefixes = {}
+        self.batch_size_histogram = batch_size_histogram
+        self.queue_wait_histogram = queue_wait_histogram
+        self.phase_histogram = phase_histogram
+
+        self._queue = queue.Queue()
+        self._deferred = deque()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stopped = threading.Event()
+        self._reset_batch()
+
+    def _reset_batch(self) -> None:
+        self._active: List[_Sequence] = []
+        self._layers = None
+        self._attention_mask = None
+        self._last_tokens = None
+        self._batch_version = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopped.clear()
+            self._worker = threading.Thread(target=self._run, name="continuous-batcher", daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is None:
+            return
+        self._stopped.set()
+        self._queue.put(None)
+        worker.join(timeout)
+
+    def submit(self, request, timeout: Optional[float] = None):
+        """Queues a PredictRequest and blocks until its text has been generated."""
+        if self._worker is None:
+            self.start()
+        sequence = _Sequence(request)
+        self._queue.put(sequence)
+        return sequence.future.result(timeout)
+
+    def _take_pending(self) -> List[_Sequence]:
+        pending = []
+        # Requests deferred because they target another model version go first
+        waiting = list(self._deferred)
+        self._deferred.clear()
+        # Block only when nothing is running; otherwise admit whatever is queued right now
+        block = not self._active and not waiting
+        while len(self._active) + len(pending) < self.max_batch_size:
+            if waiting:
+                sequence = waiting.pop(0)
+            else:
+                try:
+                    sequence = self._queue.get(block=block and not pending)
+                except queue.Empty:
+                    break
+                if sequence is None:
+                    self._stopped.set()
+                    break
+            if not self._active and not pending:
+                self._batch_version = sequence.version
+            if sequence.version == self._batch_version:
+                pending.append(sequence)
+            else:
+                self._deferred.append(sequence)
+        self._deferred.extend(waiting)
+        return pending
+
+    def _run(self) -> None:
+        with torch.no_grad():
+            while not self._stopped.is_set():
+                pending = self._take_pending()
+                try:
+                    if pending:
+                        self._admit(pending)
+                    if self._active:
+                        self._step()
+                except Exception as exc:
+                    logger.exception("continuous_batch_failed active=%s", len(self._active))
+                    for sequence in self._active + [s for s in pending if not s.future.done()]:
+                        if not sequence.future.done():
+                            sequence.future.set_exception(exc)
+                    self._reset_batch()
+
+        for sequence in self._active + list(self._deferred):
+            sequence.future.set_exception(RuntimeError("Scheduler stopped"))
+        self._deferred.clear()
+        self._reset_batch()
+        while True:
+            try:
+                sequence = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if sequence is not None:
+                sequence.future.set_exception(RuntimeError("Scheduler stopped"))
+
+    def _sampling_tensors(self, sequences: List[_Sequence], vocab_size: int):
+        return (*sampling_params([s.request for s in sequences], vocab_size), [s.generator for s in sequences])
+
+    def _eos_token_ids(self, tokenizer, model) -> set:
+        eos = getattr(getattr(model, "generation_config", None), "eos_token_id", None)
+        eos_ids = set(eos if isinstance(eos, (list, tuple)) else [eos])
+        eos_ids.add(tokenizer.eos_token_id)
+        eos_ids.discard(None)
+        return eos_ids
+
+    def _admit(self, pending: List[_Sequence]) -> None:
+        """Prefills new sequences and merges their caches into the running batch."""
+        tokenizer, model = self.get_model(self._batch_version)
+        admitted_at = time.perf_counter()
+        if self.queue_wait_histogram is not None:
+            for sequence in pending:
+                self.queue_wait_histogram.observe(admitted_at - sequence.enqueued_at)
+
+        texts = [self.build_prompt(tokenizer, s.request.prompt) for s in pending]
+        templated_at = time.perf_counter()
+        if self.prefix_cache is not None:
+            token_id_lists = [tokenizer(text).input_ids for text in texts]
+            tokenized_at = time.perf_counter()
+            new_layers, attention_mask, last_logits = self._prefill_from_prefix_cache(
+                tokenizer, model, token_id_lists
+            )
+        else:
+            inputs = tokenizer(texts, return_tensors="pt", padding=True)
+            tokenized_at = time.perf_counter()
+            attention_mask = inputs.attention_mask
+            position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+            outputs = model(
+                input_ids=inputs.input_ids,
+                attention_mask=attention_mask,
+                position_ids=position_ids,
+                use_cache=True,
+            )
+            new_layers = cache_to_layers(outputs.past_key_values)
+            last_logits = outputs.logits[:, -1, :]
+
+        next_tokens = sample_next_tokens(
+            last_logits, *self._sampling_tensors(pending, last_logits.shape[-1])
+        )
+        prefilled_at = time.perf_counter()
+        for sequence in pending:
+            sequence.timings.update({
+                "template": templated_at - admitted_at,
+                "tokenize": tokenized_at - templated_at,
+                "prefill": prefilled_at - tokenized_at,
+            })
+            sequence.prefilled_at = prefilled_at
+
+        if self._active:
+            self._layers, self._attention_mask = _concat_rows(
+                [self._layers, new_layers], [self._attention_mask, attention_mask]
+            )
+            self._last_tokens = torch.cat([self._last_tokens, next_tokens])
+        else:
+            self._layers = new_layers
+            self._attention_mask = attention_mask
+            self._last_tokens = next_tokens
+        self._active.extend(pending)
+
+        new_rows = list(range(len(self._active) - len(pending), len(self._active)))
+        self._record_tokens(tokenizer, model, next_tokens, new_rows)
+
+    def _shared_prefix_ids(self, tokenizer) -> tuple:
+        """Token ids every templated prompt starts with, i.e. the system preamble."""
+        if self._batch_version not in self._shared_prefixes:
+            first = tokenizer(self.build_prompt(tokenizer, "x")).input_ids
+            second = tokenizer(self.build_prompt(tokenizer, "?")).input_ids
+            length = 0
+            while length < min(len(first), len(second)) and first[length] == second[length]:
+                length += 1
+            self._shared_prefixes[self._batch_version] = tuple(first[:length])
+        return self._shared_prefixes[self._batch_version]
+
+    def _prefill_from_prefix_cache(self, tokenizer, model, token_id_lists: List[List[int]]):
+        """
+        Prefills each prompt on top of its longest cached prefix.
+
+        Runs one forward pass per prompt over the uncached suffix only, then
+        stores the prompt (and the shared system preamble) back in the cache.
+        """
+        preamble = self._shared_prefix_ids(tokenizer)
+        layer_sets, masks, last_logits = [], [], []
+        for token_ids in token_id_lists:
+            cached_length, cached_layers = self.prefix_cache.lookup(token_ids, namespace=self._batch_version)
+            # Always leave at least one token to compute logits for
+            cached_length = min(cached_length, len(token_ids) - 1)
+
+            past_key_values = None
+            if cached_length > 0:
+                past_key_values = layers_to_cache(
+                    [(k[:, :, :cached_length], v[:, :, :cached_length]) for k, v in cached_layers]
+                )
+            outputs = model(
+                input_ids=torch.tensor([token_ids[cached_length:]]),
+                attention_mask=torch.ones((1, len(token_ids)), dtype=torch.long),
+                position_ids=torch.arange(cached_length, len(token_ids)).unsqueeze(0),
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
+            layers = cache_to_layers(outputs.past_key_values)
+
+            self.prefix_cache.put(token_ids, layers, namespace=self._batch_version)
+            if preamble and cached_length < len(preamble) and tuple(token_ids[:len(preamble)]) == preamble:
+                self.prefix_cache.put(
+                    preamble,
+                    [(k[:, :, :len(preamble)].clone(), v[:, :, :len(preamble)].clone()) for k, v in layers],
+                    namespace=self._batch_version,
+                )
+
+            layer_sets.append(layers)
+            masks.append(torch.ones((1, len(token_ids)), dtype=torch.long))
+            last_logits.append(outputs.logits[:, -1, :])
+
+        layers, attention_mask = _concat_rows(layer_sets, masks)
+        return layers, attention_mask, torch.cat(last_logits)
+
+    def _step(self) -> None:
+        """Runs one batched decode step for every active sequence."""
+        tokenizer, model = self.get_model(self._batch_version)
+        if self.batch_size_histogram is not None:
+            self.batch_size_histogram.observe(len(self._active))
+
+        position_ids = self._attention_mask.sum(-1, keepdim=True)
+        self._attention_mask = torch.cat(
+            [self._attention_mask, self._attention_mask.new_ones((len(self._active), 1))], dim=1
+        )
+        outputs = model(
+            input_ids=self._last_tokens.unsqueeze(-1),
+            attention_mask=self._attention_mask,
+            position_ids=position_ids,
+            past_key_values=layers_to_cache(self._layers),
+            use_cache=True,
+        )
+        self._layers = cache_to_layers(outputs.past_key_values)
+        self._last_tokens = sample_next_tokens(
+            outputs.logits[:, -1, :],
+            *self._sampling_tensors(self._active, outputs.logits.shape[-1]),
+        )
+        self._record_tokens(tokenizer, model, self._last_tokens, list(range(len(self._active))))
+
+    def _record_tokens(self, tokenizer, model, tokens, rows: List[int]) -> None:
+        """Appends sampled tokens and evicts sequences that are finished."""
+        eos_ids = self._eos_token_ids(tokenizer, model)
+        finished = []
+        for row, token in zip(rows, tokens.tolist()):
+            sequence = self._active[row]
+            if token in eos_ids:
+                finished.append(row)
+                continue
+            sequence.generated.append(token)
+            if len(sequence.generated) >= sequence.request.max_new_tokens:
+                finished.append(row)
+
+        if not finished:
+            return
+
+        for row in finished:
+            sequence = self._active[row]
+            decoded_at = time.perf_counter()
+            text = tokenizer.decode(sequence.generated, skip_special_tokens=True)
+            sequence.timings["decode"] = decoded_at - sequence.prefilled_at
+            sequence.timings["detokenize"] = time.perf_counter() - decoded_at
+            publish_phase(sequence.request, sequence.timings, self.phase_histogram)
+            sequence.future.set_result(text)
+
+        finished_rows = set(finished)
+        keep = [row for row in range(len(self._active)) if row not in finished_rows]
+        if not keep:
+            self._reset_batch()
+            return
+
+        index = torch.tensor(keep, dtype=torch.long)
+        self._active = [self._active[row] for row in keep]
+        self._last_tokens = self._last_tokens.index_select(0, index)
+        self._attention_mask = self._attention_mask.index_select(0, index)
+        self._layers = [(k.index_select(0, index), v.index_select(0, index)) for k, v in self._layers]
+
+        # Drop leading columns that are padding for every remaining row
+        first_used = int(self._attention_mask.any(dim=0).nonzero()[0])
+        if first_used > 0:
+            self._attention_mask = self._attention_mask[:, first_used:]
+            self._layers = [(k[:, :, first_used:], v[:, :, first_used:]) for k, v in self._layers]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import Optional
 
 class PredictRequest(BaseModel):
@@ -10,8 +10,21 @@ class PredictRequest(BaseModel):
     top_p: Optional[float] = Field(0.9, ge=0.1, le=1.0)
     # Exposed top_k to make it configurable
     top_k: Optional[int] = Field(50, gt=0)
+    # Greedy decoding when False; greedy or seeded requests are deterministic and cacheable
+    do_sample: bool = Field(True)
+    seed: Optional[int] = Field(None, ge=0)
+    # Registry version to serve this request; defaults to the active version
+    model_version: Optional[str] = Field(None, min_length=1)
+
+    # Seconds spent per inference phase, filled in while serving; not part of the API
+    _phase_timings: dict = PrivateAttr(default_factory=dict)
+
+    @property
+    def phase_timings(self) -> dict:
+        return self._phase_timings
 
     model_config = {
+        "protected_namespaces": (),
         "json_schema_extra": {
             "examples": [
                 {
@@ -28,3 +41,5 @@ class PredictRequest(BaseModel):
 class PredictResponse(BaseModel):
     generated_text: str
     model_version: Optional[str] = None
+
+    model_config = {"protected_namespaces": ()}
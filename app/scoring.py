@@ -0,0 +1,182 @@
+import io
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger("mlops_api")
+
+JSON_CONTENT_TYPE = "application/json"
+NUMPY_CONTENT_TYPE = "application/x-npy"
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+SUPPORTED_CONTENT_TYPES = (JSON_CONTENT_TYPE, NUMPY_CONTENT_TYPE, ARROW_CONTENT_TYPE)
+
+
+class UnsupportedMediaTypeError(ValueError):
+    """The request body or the requested response format is not one of the supported encodings."""
+
+
+class BatchScorer:
+    """
+    Scores feature matrices with the classical joblib model in one `predict_proba` call.
+
+    The model is loaded with `mmap_mode="r"`, so its arrays are mapped from the
+    file instead of copied, and reloaded only when the file at `model_path`
+    changes (the registry swaps `artifacts/model.joblib` when a joblib version
+    is activated).
+    """
+
+    def __init__(self, model_path, version_lookup: Optional[Callable] = None, load_counter=None):
+        self.model_path = Path(model_path)
+        self.version_lookup = version_lookup
+        self.load_counter = load_counter
+        self._lock = threading.Lock()
+        self._loaded = (None, None)
+        self._fingerprint = None
+
+    def _file_fingerprint(self) -> tuple:
+        stat = os.stat(self.model_path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def current(self) -> tuple:
+        """Returns (model, version), (re)loading the model if the file changed since the last load."""
+        fingerprint = self._file_fingerprint()
+        if fingerprint == self._fingerprint:
+            return self._loaded
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                model = joblib.load(self.model_path, mmap_mode="r")
+                # Registry version of the loaded file, or the file name when it is not registered
+                version = (self.version_lookup and self.version_lookup(self.model_path)) or self.model_path.name
+                self._loaded, self._fingerprint = (model, version), fingerprint
+                if self.load_counter is not None:
+                    self.load_counter.inc()
+                logger.info(
+                    "classifier_loaded path=%s version=%s n_features=%s classes=%s",
+                    self.model_path, version, model.n_features_in_, list(model.classes_),
+                )
+            return self._loaded
+
+    def feature_names(self) -> Optional[List[str]]:
+        names = getattr(self.current()[0], "feature_names_in_", None)
+        return None if names is None else [str(name) for name in names]
+
+    def n_features(self) -> int:
+        return self.current()[0].n_features_in_
+
+    def score(self, features: np.ndarray) -> dict:
+        """
+        Scores a (rows, n_features) matrix.
+
+        Returns the predicted class per row and one probability column per
+        class as NumPy arrays, with the version of the model that scored them.
+        """
+        model, version = self.current()
+        if features.ndim != 2 or features.shape[1] != model.n_features_in_:
+            raise ValueError(f"Expected {model.n_features_in_} feature columns, got shape {features.shape}")
+        if not np.isfinite(features).all():
+            raise ValueError("Features must be finite numbers")
+        names = getattr(model, "feature_names_in_", None)
+        if names is not None:
+            import pandas as pd
+
+            # A frame over the same buffer avoids scikit-learn's feature name warning on every call
+            features = pd.DataFrame(features, columns=names, copy=False)
+        probabilities = model.predict_proba(features)
+        return {
+            "model_version": version,
+            "classes": model.classes_,
+            "predictions": model.classes_.take(probabilities.argmax(axis=1)),
+            "probabilities": probabilities,
+        }
+
+
+def _column_matrix(columns: list) -> np.ndarray:
+    """Stacks equally long 1-D columns into a C-contiguous float64 (rows, columns) matrix."""
+    lengths = {len(column) for column in columns}
+    if len(lengths) > 1:
+        raise ValueError("All feature columns must have the same length")
+    matrix = np.empty((lengths.pop() if lengths else 0, len(columns)), dtype=np.float64)
+    for index, column in enumerate(columns):
+        matrix[:, index] = column
+    return matrix
+
+
+def _ordered_columns(named_columns: dict, feature_names: Optional[List[str]], n_features: int) -> list:
+    if feature_names is not None and set(named_columns) == set(feature_names):
+        return [named_columns[name] for name in feature_names]
+    if len(named_columns) != n_features:
+        raise ValueError(f"Expected {n_features} feature columns, got {len(named_columns)}")
+    return list(named_columns.values())
+
+
+def decode_features(body: bytes, content_type: str, feature_names: Optional[List[str]], n_features: int) -> np.ndarray:
+    """
+    Decodes a batch request body into a (rows, n_features) float64 matrix.
+
+    - JSON: {"columns": [[...], ...]} with one array per feature in model
+      order, or {"columns": {"<feature name>": [...], ...}}
+    - NumPy: a .npy file holding a (rows, n_features) numeric array
+    - Arrow: an IPC stream of a table with one numeric column per feature,
+      matched by name when the names are the model's feature names
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    try:
+        if media_type == JSON_CONTENT_TYPE:
+            columns = json.loads(body)["columns"]
+            if isinstance(columns, dict):
+                columns = _ordered_columns(columns, feature_names, n_features)
+            return _column_matrix(columns)
+        if media_type == NUMPY_CONTENT_TYPE:
+            array = np.load(io.BytesIO(body), allow_pickle=False)
+            return np.ascontiguousarray(array, dtype=np.float64)
+        if media_type == ARROW_CONTENT_TYPE:
+            import pyarrow as pa
+
+            table = pa.ipc.open_stream(body).read_all()
+            columns = {name: table.column(name).to_numpy() for name in table.column_names}
+            return _column_matrix(_ordered_columns(columns, feature_names, n_features))
+    except ImportError:
+        raise UnsupportedMediaTypeError("Arrow bodies require pyarrow to be installed")
+    except (KeyError, TypeError, EOFError, OSError) as e:
+        # Empty or truncated .npy and Arrow bodies surface as EOFError/OSError from the readers
+        raise ValueError(f"Malformed {media_type} body: {e}")
+    raise UnsupportedMediaTypeError(f"Unsupported content type {media_type!r}, expected one of {SUPPORTED_CONTENT_TYPES}")
+
+
+def encode_scores(scores: dict, accept: str) -> tuple:
+    """
+    Encodes scores as (body, media_type) in the format requested by `accept`.
+
+    JSON (the default) returns {"model_version", "rows", "predictions",
+    "probabilities": {"<class>": [...]}}; Arrow returns a table with a
+    `prediction` column and one `probability_<class>` column per class.
+    """
+    classes = [str(label) for label in scores["classes"].tolist()]
+    probabilities = scores["probabilities"]
+    if ARROW_CONTENT_TYPE in accept:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise UnsupportedMediaTypeError("Arrow responses require pyarrow to be installed")
+        table = pa.table(
+            {"prediction": scores["predictions"]}
+            | {f"probability_{label}": probabilities[:, index] for index, label in enumerate(classes)}
+        ).replace_schema_metadata({"model_version": scores["model_version"]})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_CONTENT_TYPE
+
+    payload = {
+        "model_version": scores["model_version"],
+        "rows": len(probabilities),
+        "predictions": scores["predictions"].tolist(),
+        "probabilities": {label: probabilities[:, index].tolist() for index, label in enumerate(classes)},
+    }
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8"), JSON_CONTENT_TYPE
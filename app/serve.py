@@ -0,0 +1,58 @@
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import uvicorn
+
+from app.ipc import InferenceClient
+
+logger = logging.getLogger("mlops_api")
+
+
+def wait_for_inference_server(socket_path: str, process: subprocess.Popen, timeout: float) -> None:
+    """Blocks until the inference process answers a health check with a loaded model."""
+    client = InferenceClient(socket_path, pool_size=1, timeout=5)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Inference process exited with code {process.returncode}")
+        try:
+            if client.health().get("model_ready"):
+                client.close()
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Inference process not ready after {timeout}s")
+
+
+def main() -> None:
+    """
+    Starts one inference process that owns the model and several HTTP worker
+    processes that forward /predict to it, so connection handling scales
+    without loading a model copy per worker.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVE_WORKERS", "2")))
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    socket_path = os.environ.setdefault("INFERENCE_SOCKET", "/tmp/mlops-inference.sock")
+    inference_process = subprocess.Popen([sys.executable, "-m", "app.inference_server"])
+    try:
+        wait_for_inference_server(socket_path, inference_process, args.startup_timeout)
+        # HTTP workers inherit this environment and forward inference to the socket
+        os.environ["INFERENCE_MODE"] = "remote"
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        inference_process.terminate()
+        inference_process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
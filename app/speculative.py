@@ -0,0 +1,83 @@
+import threading
+import weakref
+
+
+class SpeculativeDecoder:
+    """
+    Runs `generate` with a small draft model proposing tokens for the target to verify.
+
+    Each target forward pass checks all drafted tokens at once and keeps the
+    longest prefix it agrees with plus one token of its own, so a step yields
+    between one and `num_draft_tokens + 1` tokens. Forward passes of both
+    models are counted per calling thread to report the acceptance rate
+    (accepted / drafted tokens) and the tokens produced per target step.
+    Assisted generation works on one sequence at a time.
+    """
+
+    def __init__(
+        self,
+        draft_model,
+        num_draft_tokens: int = 5,
+        acceptance_histogram=None,
+        tokens_per_step_histogram=None,
+        drafted_counter=None,
+        accepted_counter=None,
+    ):
+        self.draft_model = draft_model
+        self.acceptance_histogram = acceptance_histogram
+        self.tokens_per_step_histogram = tokens_per_step_histogram
+        self.drafted_counter = drafted_counter
+        self.accepted_counter = accepted_counter
+
+        if num_draft_tokens > 0:
+            # A fixed draft length; otherwise transformers adapts it to recent acceptances
+            draft_model.generation_config.num_assistant_tokens = num_draft_tokens
+            draft_model.generation_config.num_assistant_tokens_schedule = "constant"
+
+        self._local = threading.local()
+        self._hooked = weakref.WeakSet()
+        self._hook(draft_model, "draft")
+
+    def _hook(self, model, role: str) -> None:
+        if model in self._hooked:
+            return
+
+        def count_forward(module, args):
+            counts = getattr(self._local, "counts", None)
+            if counts is not None:
+                counts[role] += 1
+
+        model.register_forward_pre_hook(count_forward)
+        self._hooked.add(model)
+
+    def generate(self, model, **generate_kwargs):
+        """`model.generate(**generate_kwargs)` with the draft model as assistant; records acceptance."""
+        self._hook(model, "target")
+        self._local.counts = {"draft": 0, "target": 0}
+        try:
+            outputs = model.generate(**generate_kwargs, assistant_model=self.draft_model)
+            counts = self._local.counts
+        finally:
+            self._local.counts = None
+        self.record(outputs.shape[1] - generate_kwargs["input_ids"].shape[1], counts["draft"], counts["target"])
+        return outputs
+
+    def record(self, new_tokens: int, drafted: int, target_steps: int) -> dict:
+        """Publishes the statistics of one generate call and returns them."""
+        # Every target step contributes one token of its own; the rest were drafted and accepted
+        accepted = max(0, new_tokens - target_steps)
+        stats = {
+            "drafted_tokens": drafted,
+            "accepted_tokens": accepted,
+            "acceptance_rate": accepted / drafted if drafted else None,
+            "tokens_per_step": new_tokens / target_steps if target_steps else None,
+        }
+        if self.drafted_counter is not None:
+            self.drafted_counter.inc(drafted)
+        if self.accepted_counter is not None:
+            self.accepted_counter.inc(accepted)
+        if self.acceptance_histogram is not None and stats["acceptance_rate"] is not None:
+            self.acceptance_histogram.observe(min(1.0, stats["acceptance_rate"]))
+        if self.tokens_per_step_histogram is not None and stats["tokens_per_step"] is not None:
+            self.tokens_per_step_histogram.observe(stats["tokens_per_step"])
+        return stats
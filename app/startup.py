@@ -0,0 +1,106 @@
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+import psutil
+
+logger = logging.getLogger("mlops_api")
+
+
+def process_start_time() -> float:
+    """Wall-clock time at which the OS started this process, including interpreter startup."""
+    return psutil.Process(os.getpid()).create_time()
+
+
+def import_modules(names: Iterable[str]) -> None:
+    for name in names:
+        importlib.import_module(name)
+
+
+class StartupTracker:
+    """
+    Runs the slow part of startup on a background thread and records its profile.
+
+    The API answers liveness probes as soon as the startup hook returns; the
+    named phases (importing the ML stack, loading and warming up the model...)
+    run afterwards, each timed into `phase_gauge`. The service is ready once
+    every phase has finished and `is_ready` (for example "the model is
+    resident") holds.
+    """
+
+    def __init__(
+        self,
+        started_at: float,
+        phase_gauge=None,
+        ready_gauge=None,
+        ready_duration_gauge=None,
+    ):
+        self.started_at = started_at
+        self.phase_gauge = phase_gauge
+        self.ready_gauge = ready_gauge
+        self.ready_duration_gauge = ready_duration_gauge
+
+        self.phase = "starting"
+        self.error: Optional[str] = None
+        self.durations = {}
+        self._finished = threading.Event()
+        self._worker = None
+
+    def record(self, name: str, seconds: float) -> None:
+        self.durations[name] = max(0.0, seconds)
+        if self.phase_gauge is not None:
+            self.phase_gauge.labels(phase=name).set(self.durations[name])
+
+    def start(self, phases: Sequence[Tuple[str, Callable[[], object]]]) -> None:
+        """Runs `phases` in order on a daemon thread."""
+        self._worker = threading.Thread(target=self.run, args=(phases,), name="startup-loader", daemon=True)
+        self._worker.start()
+
+    def run(self, phases: Sequence[Tuple[str, Callable[[], object]]]) -> None:
+        """
+        Runs `phases` in order and records how long each took.
+
+        A failing phase is logged and the next one still runs, so a broken
+        model does not keep the classifier from loading; the first failure is
+        kept in `error` and the final phase is "failed" instead of "done".
+        """
+        for name, fn in phases:
+            self.phase = name
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as exc:
+                self.error = self.error or f"{name}: {exc.__class__.__name__}"
+                logger.critical("startup_phase_failed phase=%s", name, exc_info=True)
+            self.record(name, time.perf_counter() - start)
+        self.phase = "failed" if self.error else "done"
+        ready_after = time.time() - self.started_at
+        if self.ready_duration_gauge is not None:
+            self.ready_duration_gauge.set(ready_after)
+        if self.ready_gauge is not None:
+            # Refined by `status`, which also knows whether the model is resident
+            self.ready_gauge.set(0 if self.error else 1)
+        self._finished.set()
+        logger.info(
+            "startup_finished phase=%s seconds=%.2f profile=%s",
+            self.phase, ready_after, {name: round(seconds, 3) for name, seconds in self.durations.items()},
+        )
+
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def status(self, is_ready: bool = True) -> dict:
+        """Readiness as reported by /ready; also refreshes `ready_gauge`."""
+        ready = self.finished() and is_ready
+        if self.ready_gauge is not None:
+            self.ready_gauge.set(1 if ready else 0)
+        status = {"ready": ready, "phase": self.phase, "phase_seconds": dict(self.durations)}
+        if self.error is not None:
+            status["error"] = self.error
+        return status
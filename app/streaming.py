@@ -0,0 +1,77 @@
+import threading
+import time
+
+import torch
+from transformers import StoppingCriteria, TextIteratorStreamer
+
+
+class TimedTextStreamer(TextIteratorStreamer):
+    """
+    TextIteratorStreamer that records time-to-first-token and inter-token latency.
+
+    Timings are taken in the generation thread when each token is produced, so
+    they reflect decode speed rather than how fast the client reads the stream.
+    `generate` hands over the prompt before prefill and each token right
+    after it is sampled, which also splits the call into inference phases.
+    """
+
+    def __init__(self, tokenizer, ttft_histogram=None, inter_token_histogram=None, **kwargs):
+        super().__init__(tokenizer, **kwargs)
+        self.ttft_histogram = ttft_histogram
+        self.inter_token_histogram = inter_token_histogram
+        self.started_at = time.perf_counter()
+        self.prompt_at = None
+        self.detokenize_seconds = 0.0
+        self.first_token_at = None
+        self.last_token_at = None
+        self.token_count = 0
+
+    def put(self, value):
+        now = time.perf_counter()
+        if self.skip_prompt and self.next_tokens_are_prompt:
+            self.prompt_at = now
+        else:
+            if self.last_token_at is None:
+                self.first_token_at = now
+                if self.ttft_histogram is not None:
+                    self.ttft_histogram.observe(now - self.started_at)
+            elif self.inter_token_histogram is not None:
+                self.inter_token_histogram.observe(now - self.last_token_at)
+            self.last_token_at = now
+            # Assisted generation can hand over several accepted tokens at once
+            self.token_count += value.numel()
+        super().put(value)
+        self.detokenize_seconds += time.perf_counter() - now
+
+    @property
+    def time_to_first_token(self):
+        return None if self.first_token_at is None else self.first_token_at - self.started_at
+
+    @property
+    def decode_seconds(self):
+        return None if self.first_token_at is None else self.last_token_at - self.first_token_at
+
+    def phase_durations(self) -> dict:
+        """Prefill, decode and detokenize seconds of the finished `generate` call."""
+        if self.prompt_at is None or self.first_token_at is None:
+            return {}
+        return {
+            "prefill": self.first_token_at - self.prompt_at,
+            "decode": max(0.0, self.decode_seconds - self.detokenize_seconds),
+            "detokenize": self.detokenize_seconds,
+        }
+
+
+class CancelledCriteria(StoppingCriteria):
+    """Stops generation once `cancel_event` is set, e.g. when the client disconnects."""
+
+    def __init__(self, cancel_event: threading.Event):
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full(
+            (input_ids.shape[0],),
+            self.cancel_event.is_set(),
+            dtype=torch.bool,
+            device=input_ids.device,
+        )
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+from pathlib import Path
+
+
+def _sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _make_writable_and_retry(func, path, _exc) -> None:
+    # Windows refuses to delete read-only files, and checked-out files are read-only blob links;
+    # the writable bit is shared with the blob, which keeps its content and name
+    os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+    func(path)
+
+
+def _remove_tree(path: Path) -> None:
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=_make_writable_and_retry)
+    else:
+        shutil.rmtree(path, onerror=_make_writable_and_retry)
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for model files.
+
+    Every file is kept once under blobs/<sha256>, no matter how many model
+    versions contain it; a blob that already exists is never written again.
+    A directory is recorded as a tree (relative path -> sha256) and checked
+    out as hard links to the blobs, so an unchanged multi-gigabyte shard costs
+    one hash pass instead of a copy. Blobs are read-only because checkouts
+    share their inodes.
+    """
+
+    def __init__(self, root="artifacts/store"):
+        self.root = Path(root)
+        self.blobs_dir = self.root / "blobs"
+        self.trees_dir = self.root / "trees"
+        self.checkouts_dir = self.root / "checkouts"
+        for directory in (self.blobs_dir, self.trees_dir, self.checkouts_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / digest
+
+    def put_file(self, path) -> str:
+        """Adds one file and returns its sha256; existing content is not copied again."""
+        digest = _sha256(path)
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(exist_ok=True)
+            # Copied rather than linked: the source may be rewritten in place later
+            fd, tmp_name = tempfile.mkstemp(dir=blob.parent, prefix=".tmp-")
+            os.close(fd)
+            shutil.copyfile(path, tmp_name)
+            os.chmod(tmp_name, 0o444)
+            os.replace(tmp_name, blob)
+        return digest
+
+    def put_tree(self, directory) -> str:
+        """Adds every file below `directory` and returns the tree id."""
+        directory = Path(directory)
+        files = {
+            path.relative_to(directory).as_posix(): {"sha256": self.put_file(path), "size": path.stat().st_size}
+            for path in sorted(directory.rglob("*"))
+            if path.is_file()
+        }
+        payload = json.dumps({"files": files}, sort_keys=True, separators=(",", ":"))
+        tree_id = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        tree_file = self.trees_dir / f"{tree_id}.json"
+        if not tree_file.exists():
+            # A unique name per writer: threads of one process share a pid
+            fd, tmp_name = tempfile.mkstemp(dir=self.trees_dir, prefix=".tmp-")
+            with os.fdopen(fd, "w") as f:
+                f.write(payload)
+            os.chmod(tmp_name, 0o444)
+            os.replace(tmp_name, tree_file)
+        return tree_id
+
+    def read_tree(self, tree_id: str) -> dict:
+        with open(self.trees_dir / f"{tree_id}.json") as f:
+            return json.load(f)["files"]
+
+    def checkout(self, tree_id: str, destination=None) -> Path:
+        """
+        Materializes a tree as hard links to its blobs.
+
+        Without `destination` the shared checkout under checkouts/<tree_id> is
+        returned, created once. An existing `destination` is replaced with a
+        rename, so readers see either the old or the new tree.
+        """
+        shared = destination is None
+        destination = Path(destination) if destination is not None else self.checkouts_dir / tree_id
+        if shared and destination.exists():
+            return destination
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=destination.parent, prefix=f".{destination.name}-"))
+        for relative_path, info in self.read_tree(tree_id).items():
+            target = staging / relative_path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            _link_or_copy(self.blob_path(info["sha256"]), target)
+
+        if shared:
+            try:
+                os.replace(staging, destination)
+            except OSError:
+                # Another process checked out the same tree first
+                _remove_tree(staging)
+        elif destination.exists():
+            retired = destination.with_name(f".{destination.name}-old-{os.getpid()}")
+            os.replace(destination, retired)
+            os.replace(staging, destination)
+            _remove_tree(retired)
+        else:
+            os.replace(staging, destination)
+        return destination
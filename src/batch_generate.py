@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+# Define paths relative to this file
+PROJECT_ROOT = Path(__file__).parent.parent
+ARTIFACT_DIR = PROJECT_ROOT / "artifacts"
+
+# Prompts read ahead and sorted by token length before being cut into batches;
+# larger windows pad less but hold more prompts in memory
+BUCKET_WINDOW = 1024
+
+
+def load_checkpoint(output_path: Path, id_field: str) -> set:
+    """
+    Ids of the records already written to `output_path`.
+
+    A run killed mid-write can leave a partial last line; it is truncated so
+    the resumed run appends after the last complete record.
+    """
+    done = set()
+    if not output_path.exists():
+        return done
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            f.truncate(complete)
+    for line in data[:complete].splitlines():
+        if line.strip():
+            done.add(json.loads(line)[id_field])
+    return done
+
+
+def read_records(input_path: Path, prompt_field: str, id_field: str, done: set):
+    """
+    Streams (record_id, request_fields) from a JSONL file, skipping ids in `done`.
+
+    Each line is a JSON object with the prompt under `prompt_field` and
+    optional /predict fields (max_new_tokens, do_sample, seed, ...). Lines
+    without `id_field` are identified by their 1-based line number.
+    """
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record_id = record.get(id_field, line_number)
+            if record_id in done:
+                continue
+            fields = {key: value for key, value in record.items() if key not in (id_field, prompt_field)}
+            yield record_id, dict(fields, prompt=record.get(prompt_field))
+
+
+def length_buckets(items, key, length, batch_size: int, window: int = BUCKET_WINDOW):
+    """
+    Groups a stream of items into batches of similar length.
+
+    Reads `window` items at a time, splits them by `key` (items that may not
+    share a generate call), sorts each group by `length` and cuts it into
+    batches of at most `batch_size`, so padding is limited to neighbours of
+    similar length while memory stays bounded by the window.
+    """
+    def flush(pending):
+        groups = {}
+        for item in pending:
+            groups.setdefault(key(item), []).append(item)
+        for group in groups.values():
+            group.sort(key=length)
+            for start in range(0, len(group), batch_size):
+                yield group[start:start + batch_size]
+
+    pending = []
+    for item in items:
+        pending.append(item)
+        if len(pending) >= window:
+            yield from flush(pending)
+            pending = []
+    yield from flush(pending)
+
+
+def run_job(
+    input_path,
+    output_path,
+    prompt_field: str = "prompt",
+    id_field: str = "request_id",
+    batch_size: int = 8,
+    window: int = BUCKET_WINDOW,
+    progress=print,
+) -> dict:
+    """
+    Generates a completion for every prompt in `input_path` and appends one
+    JSON record per prompt to `output_path`, resuming after the records a
+    previous run already wrote.
+
+    Prompts are templated and generated exactly like `/predict` requests, by
+    the API's `generate_batch` on the model returned by `get_model()`.
+    Records are written in batch order, not input order; join them on
+    `id_field`. Returns the run's counts and throughput.
+    """
+    # The job owns the model, so the API module must run inference locally
+    os.environ["INFERENCE_MODE"] = "local"
+    from pydantic import ValidationError
+
+    from app import main as api
+    from app.schemas import PredictRequest
+
+    input_path, output_path = Path(input_path), Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    done = load_checkpoint(output_path, id_field)
+    if done:
+        progress(f"Resuming: {len(done)} records already in {output_path}")
+
+    # Load the active model before the clock starts so tokens/sec measures generation only
+    api.get_model()
+    counts = {"records": 0, "errors": 0, "batches": 0, "prompt_tokens": 0, "generated_tokens": 0}
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+
+        def write(records):
+            # One flush and fsync per batch: an interrupted run loses at most the batch in flight
+            out.writelines(json.dumps(record) + "\n" for record in records)
+            out.flush()
+            os.fsync(out.fileno())
+
+        def requests():
+            for record_id, fields in read_records(input_path, prompt_field, id_field, done):
+                try:
+                    req = PredictRequest(**fields)
+                    req = req.model_copy(update={"model_version": api.resolve_model_version(req.model_version)})
+                except (ValidationError, KeyError) as e:
+                    counts["errors"] += 1
+                    write([{id_field: record_id, "error": e.__class__.__name__, "detail": str(e)}])
+                    continue
+                tokenizer = api.get_model(req.model_version)[0]
+                prompt_tokens = len(tokenizer(api.build_prompt_text(tokenizer, req.prompt)).input_ids)
+                yield record_id, req, prompt_tokens
+
+        batches = length_buckets(
+            requests(),
+            key=lambda item: api.sampling_key(item[1]),
+            length=lambda item: item[2],
+            batch_size=batch_size,
+            window=window,
+        )
+        for batch in batches:
+            texts = api.generate_batch([req for _, req, _ in batch])
+            tokenizer = api.get_model(batch[0][1].model_version)[0]
+            records = []
+            for (record_id, req, prompt_tokens), text in zip(batch, texts):
+                generated_tokens = len(tokenizer(text, add_special_tokens=False).input_ids)
+                counts["prompt_tokens"] += prompt_tokens
+                counts["generated_tokens"] += generated_tokens
+                records.append({
+                    id_field: record_id,
+                    "generated_text": text,
+                    "model_version": api.model_version_label(req.model_version),
+                    "prompt_tokens": prompt_tokens,
+                    "generated_tokens": generated_tokens,
+                })
+            write(records)
+            counts["records"] += len(records)
+            counts["batches"] += 1
+            elapsed = time.perf_counter() - started
+            progress(
+                f"batch {counts['batches']}: {len(records)} prompts of ~{batch[-1][2]} tokens, "
+                f"{counts['records']} done, {counts['generated_tokens'] / elapsed:.1f} tokens/sec"
+            )
+
+    duration = time.perf_counter() - started
+    return dict(
+        counts,
+        skipped=len(done),
+        duration_seconds=round(duration, 3),
+        tokens_per_second=round(counts["generated_tokens"] / duration, 2) if duration > 0 else None,
+    )
+
+
+def main() -> None:
+    """
+    Offline batch generation over a JSONL file of prompts.
+
+    Uses the same model loading, chat template and batched `generate` as the
+    API, without an HTTP server. Prompts are bucketed by token length to keep
+    padding low, results are appended to the output file after every batch,
+    and rerunning the same command after an interruption skips the prompts
+    whose results were already written.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("input", help="JSONL file with one request object per line")
+    parser.add_argument("--output", default=str(ARTIFACT_DIR / "generations.jsonl"))
+    parser.add_argument("--prompt-field", default="prompt", help="Field holding the prompt text")
+    parser.add_argument("--id-field", default="request_id", help="Field identifying a request (default: line number)")
+    parser.add_argument("--batch-size", type=int, help="Prompts per generate call (default: BATCH_MAX_SIZE)")
+    parser.add_argument("--bucket-window", type=int, default=BUCKET_WINDOW, help="Prompts sorted by length at a time")
+    args = parser.parse_args()
+
+    batch_size = args.batch_size or int(os.environ.get("BATCH_MAX_SIZE", "8"))
+    results = run_job(
+        args.input, args.output, args.prompt_field, args.id_field, max(1, batch_size), max(1, args.bucket_window)
+    )
+    print(
+        f"records: {results['records']}  errors: {results['errors']}  skipped: {results['skipped']}  "
+        f"duration: {results['duration_seconds']}s"
+    )
+    print(f"tokens: {results['prompt_tokens']} prompt / {results['generated_tokens']} generated  "
+          f"tokens/sec: {results['tokens_per_second']}")
+    print(f"Generations saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
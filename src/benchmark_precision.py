@@ -0,0 +1,118 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+# Define paths relative to this file
+PROJECT_ROOT = Path(__file__).parent.parent
+ARTIFACT_DIR = PROJECT_ROOT / "artifacts"
+MODEL_PATH = ARTIFACT_DIR / "Qwen2.5-0.5B-Instruct"
+REPORT_PATH = ARTIFACT_DIR / "precision_benchmark.json"
+
+PROMPTS = [
+    "Write one sentence about cloud engineering.",
+    "Explain what a CI/CD pipeline does in two sentences.",
+    "List three benefits of model versioning.",
+]
+
+
+def _benchmark_precision(model_path: str, precision: str, max_new_tokens: int, runs: int, queue) -> None:
+    """Runs in a fresh process so each precision's RSS is measured in isolation."""
+    import psutil
+    import torch
+    from transformers import AutoTokenizer
+
+    from app.model_loader import load_causal_lm
+
+    process = psutil.Process(os.getpid())
+    rss_before = process.memory_info().rss
+
+    load_start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = load_causal_lm(model_path, precision)
+    load_seconds = time.perf_counter() - load_start
+    rss_loaded = process.memory_info().rss
+
+    generated_tokens = 0
+    generate_seconds = 0.0
+    with torch.no_grad():
+        for _ in range(runs):
+            for prompt in PROMPTS:
+                inputs = tokenizer([prompt], return_tensors="pt")
+                start = time.perf_counter()
+                outputs = model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=False,
+                    pad_token_id=tokenizer.eos_token_id,
+                )
+                generate_seconds += time.perf_counter() - start
+                generated_tokens += outputs.shape[1] - inputs.input_ids.shape[1]
+
+    queue.put({
+        "precision": precision,
+        "load_seconds": round(load_seconds, 3),
+        "model_rss_bytes": int(rss_loaded - rss_before),
+        "peak_rss_bytes": int(process.memory_info().rss),
+        "generated_tokens": int(generated_tokens),
+        "tokens_per_second": round(generated_tokens / generate_seconds, 2) if generate_seconds else 0.0,
+    })
+
+
+def run_benchmark(model_path, precisions, max_new_tokens=64, runs=3):
+    """Benchmarks each precision in its own process and returns one result per precision."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for precision in precisions:
+        print(f"Benchmarking precision '{precision}'...")
+        queue = context.Queue()
+        process = context.Process(
+            target=_benchmark_precision,
+            args=(str(model_path), precision, max_new_tokens, runs, queue),
+        )
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"Benchmark for '{precision}' failed with exit code {process.exitcode}")
+            results.append({"precision": precision, "error": f"exit code {process.exitcode}"})
+            continue
+        results.append(queue.get())
+    return results
+
+
+def main() -> None:
+    """
+    Compares tokens/sec and memory of the MODEL_PRECISION modes on this machine
+    so the precision can be chosen per deployment.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--model-path", default=os.environ.get("MODEL_PATH", str(MODEL_PATH)))
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "bf16", "dynamic-int8"])
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", default=str(REPORT_PATH))
+    args = parser.parse_args()
+
+    results = run_benchmark(args.model_path, args.precisions, args.max_new_tokens, args.runs)
+
+    print(f"{'precision':<14}{'tokens/sec':>12}{'model RSS (MB)':>16}{'load (s)':>10}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['precision']:<14}{'failed':>12}")
+            continue
+        print(
+            f"{result['precision']:<14}{result['tokens_per_second']:>12}"
+            f"{result['model_rss_bytes'] / 1024 ** 2:>16.1f}{result['load_seconds']:>10}"
+        )
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump({"model_path": args.model_path, "results": results}, f, indent=4)
+    print(f"Benchmark report saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Define paths relative to this file
+PROJECT_ROOT = Path(__file__).parent.parent
+ARTIFACT_DIR = PROJECT_ROOT / "artifacts"
+MODEL_PATH = ARTIFACT_DIR / "Qwen2.5-0.5B-Instruct"
+REPORT_PATH = ARTIFACT_DIR / "serving_benchmark.json"
+
+WORDS = (
+    "cloud model pipeline deploy version metric latency token batch cache drift "
+    "registry training inference monitor cluster request response prompt engineer data"
+).split()
+
+# Metrics compared against a baseline, and whether higher values are better
+BASELINE_METRICS = {
+    "throughput_rps": True,
+    "tokens_per_second": True,
+    "latency_p50_seconds": False,
+    "latency_p95_seconds": False,
+    "latency_p99_seconds": False,
+    "ttft_p50_seconds": False,
+    "ttft_p95_seconds": False,
+    "peak_rss_bytes": False,
+}
+
+
+def build_tiny_model(path) -> Path:
+    """Saves a randomly initialized two-layer Qwen2 model with a small BPE tokenizer for offline runs."""
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast, Qwen2Config, Qwen2ForCausalLM
+
+    path = Path(path)
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=512,
+        special_tokens=["<|endoftext|>", "<|im_start|>", "<|im_end|>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tokenizer.train_from_iterator([" ".join(WORDS), "You are a helpful AI assistant."] * 20, trainer)
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<|im_end|>", pad_token="<|endoftext|>")
+    tokenizer.chat_template = (
+        "{% for m in messages %}<|im_start|>{{ m['role'] }}\n{{ m['content'] }}<|im_end|>\n{% endfor %}"
+        "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+    )
+    tokenizer.save_pretrained(path)
+
+    torch.manual_seed(0)
+    config = Qwen2Config(
+        vocab_size=len(tokenizer),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=2048,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    Qwen2ForCausalLM(config).save_pretrained(path)
+    return path
+
+
+def parse_length_distribution(spec: str):
+    """Parses "8:0.5,64:0.3,256:0.2" (prompt words:weight) into ([lengths], [weights])."""
+    lengths, weights = [], []
+    for part in spec.split(","):
+        length, _, weight = part.partition(":")
+        lengths.append(int(length))
+        weights.append(float(weight or 1))
+    return lengths, weights
+
+
+def make_prompts(count: int, length_spec: str, seed: int = 0):
+    """Prompts with lengths drawn from the distribution; a leading index keeps them out of the response cache."""
+    rng = random.Random(seed)
+    lengths, weights = parse_length_distribution(length_spec)
+    return [
+        f"{i} " + " ".join(rng.choice(WORDS) for _ in range(length))
+        for i, length in enumerate(rng.choices(lengths, weights, k=count))
+    ]
+
+
+def percentile(values, q: float):
+    """Linear-interpolated percentile (q in 0..100) of a list, or None when it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+async def _send(client, endpoint: str, payload: dict):
+    """Returns (generated text, TTFT or None) of one request."""
+    if endpoint == "predict":
+        response = await client.post("/predict", json=payload)
+        response.raise_for_status()
+        return response.json()["generated_text"], None
+
+    chunks, ttft, start = [], None, time.perf_counter()
+    async with client.stream("POST", "/predict/stream", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            chunks.append(json.loads(line[len("data: "):])["text"])
+    return "".join(chunks), ttft
+
+
+async def _drive(url, prompts, concurrency, endpoint, max_new_tokens, do_sample, warmup):
+    import httpx
+
+    samples = []
+    async with httpx.AsyncClient(base_url=url, timeout=600, limits=httpx.Limits(max_connections=concurrency)) as client:
+        for prompt in prompts[:warmup]:
+            await _send(client, endpoint, {"prompt": prompt, "max_new_tokens": max_new_tokens, "do_sample": do_sample})
+
+        pending = iter(prompts[warmup:])
+
+        async def worker():
+            for prompt in pending:
+                payload = {"prompt": prompt, "max_new_tokens": max_new_tokens, "do_sample": do_sample}
+                start = time.perf_counter()
+                try:
+                    text, ttft = await _send(client, endpoint, payload)
+                    samples.append({"latency": time.perf_counter() - start, "ttft": ttft, "text": text})
+                except Exception as e:
+                    samples.append({"latency": time.perf_counter() - start, "error": e.__class__.__name__})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - start
+    return samples, duration
+
+
+def summarize(samples, duration, count_tokens) -> dict:
+    ok = [sample for sample in samples if "error" not in sample]
+    latencies = [sample["latency"] for sample in ok]
+    ttfts = [sample["ttft"] for sample in ok if sample.get("ttft") is not None]
+    output_tokens = sum(count_tokens(sample["text"]) for sample in ok)
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "duration_seconds": round(duration, 3),
+        "throughput_rps": round(len(ok) / duration, 3) if duration else 0.0,
+        "output_tokens": output_tokens,
+        "tokens_per_second": round(output_tokens / duration, 2) if duration else 0.0,
+        "latency_mean_seconds": sum(latencies) / len(latencies) if latencies else None,
+        "latency_p50_seconds": percentile(latencies, 50),
+        "latency_p95_seconds": percentile(latencies, 95),
+        "latency_p99_seconds": percentile(latencies, 99),
+        "ttft_p50_seconds": percentile(ttfts, 50),
+        "ttft_p95_seconds": percentile(ttfts, 95),
+        "ttft_p99_seconds": percentile(ttfts, 99),
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float):
+    """Returns [(metric, baseline, current, relative change)] for metrics that regressed by more than `tolerance`."""
+    regressions = []
+    for metric, higher_is_better in BASELINE_METRICS.items():
+        before, after = baseline.get(metric), results.get(metric)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append((metric, before, after, change))
+    return regressions
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(model_path, port: int, extra_env: dict, log_file):
+    """Starts uvicorn with app.main in a subprocess, serving `model_path` offline."""
+    env = dict(os.environ)
+    env.update({
+        "MODEL_PATH": str(model_path),
+        "HF_HUB_OFFLINE": "1",
+        "INFERENCE_LOG_ENABLED": "0",
+        "DRIFT_MONITOR_ENABLED": "0",
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra_env)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def wait_until_ready(url: str, server=None, timeout: float = 300) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=5).json().get("model_ready"):
+                return
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not become ready within {timeout}s")
+
+
+async def _sample_rss(pid: int, peak: list, stop: asyncio.Event) -> None:
+    import psutil
+
+    process = psutil.Process(pid)
+    while not stop.is_set():
+        try:
+            peak[0] = max(peak[0], process.memory_info().rss)
+        except psutil.Error:
+            return
+        try:
+            await asyncio.wait_for(stop.wait(), 0.1)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _server_rss(url: str):
+    """process_memory_rss_bytes from /metrics, for servers this script did not start."""
+    import httpx
+
+    for line in httpx.get(f"{url}/metrics", timeout=10).text.splitlines():
+        if line.startswith("process_memory_rss_bytes "):
+            return int(float(line.split()[1]))
+    return None
+
+
+def run_benchmark(url, prompts, concurrency, endpoint, max_new_tokens, do_sample, warmup, count_tokens, server_pid=None):
+    async def run():
+        peak, stop = [0], asyncio.Event()
+        sampler = asyncio.create_task(_sample_rss(server_pid, peak, stop)) if server_pid else None
+        try:
+            return await _drive(url, prompts, concurrency, endpoint, max_new_tokens, do_sample, warmup), peak[0]
+        finally:
+            stop.set()
+            if sampler is not None:
+                await sampler
+
+    (samples, duration), peak_rss = asyncio.run(run())
+    results = summarize(samples, duration, count_tokens)
+    results["peak_rss_bytes"] = peak_rss or _server_rss(url)
+    return results
+
+
+def main() -> None:
+    """
+    Load-tests /predict (or /predict/stream) of the serving stack and reports
+    throughput, latency percentiles, tokens/sec, TTFT and server RSS.
+
+    By default the API is started from this checkout with a tiny random model,
+    so runs are offline and comparable across commits; pass --model-path to
+    serve a real snapshot or --url to target a running server.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--model-path", help="Model snapshot to serve (default: a generated tiny model)")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--endpoint", choices=["predict", "stream"], default="predict")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--prompt-lengths", default="8:0.5,64:0.3,256:0.2", help="prompt words:weight, comma separated")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--do-sample", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to the started server")
+    parser.add_argument("--output", default=str(REPORT_PATH))
+    parser.add_argument("--baseline", help="Baseline report to compare against; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression vs. the baseline")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = args.model_path
+        if model_path is None and args.url is None:
+            print("Building tiny model...")
+            model_path = build_tiny_model(Path(tmp_dir) / "tiny-model")
+        model_path = model_path or os.environ.get("MODEL_PATH", str(MODEL_PATH))
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+        def count_tokens(text):
+            return len(tokenizer(text, add_special_tokens=False).input_ids)
+
+        server, url = None, args.url
+        log_path = Path(tmp_dir) / "server.log"
+        with open(log_path, "wb") as log_file:
+            if url is None:
+                url = f"http://127.0.0.1:{_free_port()}"
+                extra_env = dict(item.split("=", 1) for item in args.env)
+                server = start_server(model_path, int(url.rsplit(":", 1)[1]), extra_env, log_file)
+            try:
+                wait_until_ready(url, server)
+                print(f"Benchmarking {url} ({args.requests} requests, concurrency {args.concurrency})...")
+                prompts = make_prompts(args.requests + args.warmup, args.prompt_lengths, args.seed)
+                results = run_benchmark(
+                    url, prompts, args.concurrency, args.endpoint, args.max_new_tokens, args.do_sample,
+                    args.warmup, count_tokens, server.pid if server else None,
+                )
+            except Exception:
+                if server is not None:
+                    print(log_path.read_text(errors="replace")[-4000:])
+                raise
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait(30)
+
+    def fmt(value, scale=1.0, digits=4):
+        return "-" if value is None else f"{value * scale:.{digits}f}"
+
+    print(f"requests: {results['requests']}  errors: {results['errors']}  duration: {results['duration_seconds']}s")
+    print(f"throughput: {results['throughput_rps']} req/s  tokens/sec: {results['tokens_per_second']}")
+    print(
+        f"latency p50/p95/p99 (ms): {fmt(results['latency_p50_seconds'], 1000, 1)} / "
+        f"{fmt(results['latency_p95_seconds'], 1000, 1)} / {fmt(results['latency_p99_seconds'], 1000, 1)}"
+    )
+    print(f"TTFT p50/p95 (ms): {fmt(results['ttft_p50_seconds'], 1000, 1)} / {fmt(results['ttft_p95_seconds'], 1000, 1)}")
+    print(f"peak server RSS (MB): {fmt(results['peak_rss_bytes'], 1 / 1024 ** 2, 1)}")
+
+    report = {
+        "config": {
+            "model_path": None if args.model_path is None and args.url is None else str(model_path),
+            "url": args.url,
+            "endpoint": args.endpoint,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "prompt_lengths": args.prompt_lengths,
+            "max_new_tokens": args.max_new_tokens,
+            "do_sample": args.do_sample,
+            "env": args.env,
+        },
+        "results": results,
+    }
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Benchmark report saved to {output_path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for metric, before, after, change in regressions:
+            print(f"REGRESSION {metric}: {before:.4g} -> {after:.4g} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,76 +1,246 @@
-import pandas as pd
+import argparse
 import json
 from pathlib import Path
-from scipy.stats import ks_2samp
+
+import numpy as np
+import pandas as pd
+from scipy.stats import kstwo
 
 # Define paths
 PROJECT_ROOT = Path(__file__).parent.parent
 ARTIFACT_DIR = PROJECT_ROOT / "artifacts"
 REFERENCE_DATA_PATH = ARTIFACT_DIR / "reference_dataset.csv"
+REFERENCE_PROFILE_PATH = ARTIFACT_DIR / "reference_profile.npz"
 DRIFT_REPORT_PATH = ARTIFACT_DIR / "drift_report.json"
 
-def detect_drift():
+# Fine histogram bins per feature; the ECDFs used for KS and Wasserstein are exact
+# up to one bin width of the reference range
+PROFILE_BINS = 1000
+CHUNK_SIZE = 100_000
+PSI_BINS = 10
+
+
+def _numeric_columns(path, chunksize):
+    first_chunk = next(pd.read_csv(path, chunksize=min(chunksize, 10_000)))
+    return list(first_chunk.select_dtypes(include=["number"]).columns)
+
+
+def _chunks(path, columns, chunksize):
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+        yield chunk[columns].to_numpy(dtype=np.float64)
+
+
+class Histograms:
+    """
+    Per-feature histograms on fixed edges, filled one chunk at a time.
+
+    Bin 0 and bin `bins + 1` collect values below and above the reference
+    range. Counts and value sums of every feature are updated with a single
+    `bincount` per chunk.
+    """
+
+    def __init__(self, lower, width, bins=PROFILE_BINS):
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.width = np.asarray(width, dtype=np.float64)
+        self.bins = bins
+        self.counts = np.zeros((len(self.lower), bins + 2))
+        self.sums = np.zeros((len(self.lower), bins + 2))
+
+    def add(self, values: np.ndarray) -> None:
+        valid = ~np.isnan(values)
+        index = np.floor((values - self.lower) / self.width)
+        index = np.clip(np.nan_to_num(index, nan=0.0), -1, self.bins).astype(np.int64) + 1
+        flat = (index + np.arange(values.shape[1]) * (self.bins + 2))[valid]
+        size = values.shape[1] * (self.bins + 2)
+        self.counts += np.bincount(flat, minlength=size).reshape(self.counts.shape)
+        self.sums += np.bincount(flat, weights=values[valid], minlength=size).reshape(self.sums.shape)
+
+    @property
+    def totals(self) -> np.ndarray:
+        return self.counts.sum(axis=1)
+
+
+def _source_fingerprint(path) -> list:
+    stat = Path(path).stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_reference_profile(reference_path, chunksize=CHUNK_SIZE, bins=PROFILE_BINS):
+    """Streams the reference data twice (range, then histograms) and returns its profile."""
+    columns = _numeric_columns(reference_path, chunksize)
+    lower = np.full(len(columns), np.inf)
+    upper = np.full(len(columns), -np.inf)
+    for values in _chunks(reference_path, columns, chunksize):
+        lower = np.fmin(lower, np.nanmin(values, axis=0, initial=np.inf))
+        upper = np.fmax(upper, np.nanmax(values, axis=0, initial=-np.inf))
+
+    lower = np.where(np.isfinite(lower), lower, 0.0)
+    span = np.where(np.isfinite(upper), upper, lower) - lower
+    # Constant features still get a usable bin width
+    width = np.where(span > 0, span / bins, 1.0)
+    # Let the maximum fall into the last regular bin instead of the overflow bin
+    width = width * (1 + 1e-9)
+
+    histograms = Histograms(lower, width, bins)
+    for values in _chunks(reference_path, columns, chunksize):
+        histograms.add(values)
+    return {"columns": columns, "histograms": histograms, "source": _source_fingerprint(reference_path)}
+
+
+def save_reference_profile(profile, path=REFERENCE_PROFILE_PATH) -> None:
+    histograms = profile["histograms"]
+    tmp_path = Path(path).with_suffix(".tmp.npz")
+    np.savez(
+        tmp_path,
+        columns=np.array(profile["columns"]),
+        source=np.array(profile["source"], dtype=np.int64),
+        lower=histograms.lower,
+        width=histograms.width,
+        counts=histograms.counts,
+        sums=histograms.sums,
+    )
+    tmp_path.replace(path)
+
+
+def load_reference_profile(reference_path, path=REFERENCE_PROFILE_PATH):
+    """Returns the saved profile, or None if it is missing or the reference data changed."""
+    if not Path(path).exists():
+        return None
+    with np.load(path) as data:
+        if list(data["source"]) != _source_fingerprint(reference_path):
+            return None
+        histograms = Histograms(data["lower"], data["width"], data["counts"].shape[1] - 2)
+        histograms.counts = data["counts"]
+        histograms.sums = data["sums"]
+        return {"columns": [str(c) for c in data["columns"]], "histograms": histograms, "source": list(data["source"])}
+
+
+def _outer_distance(p_ref, m_ref, p_cur, m_cur):
+    """Area between two CDFs outside the binned range, with each tail's mass at its mean distance."""
+    common = np.minimum(m_ref, m_cur)
+    return np.abs(p_ref - p_cur) * common + np.where(m_ref > m_cur, p_ref, p_cur) * np.abs(m_ref - m_cur)
+
+
+def compare_histograms(reference: Histograms, current: Histograms) -> dict:
+    """KS statistic and p-value, PSI and Wasserstein distance for every feature at once."""
+    n_ref = np.maximum(reference.totals, 1)
+    n_cur = np.maximum(current.totals, 1)
+    ref_cdf = np.cumsum(reference.counts, axis=1) / n_ref[:, None]
+    cur_cdf = np.cumsum(current.counts, axis=1) / n_cur[:, None]
+
+    ks_stat = np.abs(ref_cdf - cur_cdf).max(axis=1)
+    n_eff = np.maximum(np.round(n_ref * n_cur / (n_ref + n_cur)), 1).astype(np.int64)
+    p_value = kstwo.sf(ks_stat, n_eff)
+
+    # Interior bins are uniform, so the CDF gap integrates to a sum times the bin width
+    wasserstein = np.abs(ref_cdf[:, :-1] - cur_cdf[:, :-1])[:, 1:].sum(axis=1) * reference.width
+    lower, upper = reference.lower, reference.lower + reference.width * reference.bins
+
+    def tail(hist, n, column, edge, sign):
+        mass = hist.counts[:, column] / n
+        counts = hist.counts[:, column]
+        mean = np.divide(hist.sums[:, column], counts, out=edge.copy(), where=counts > 0)
+        return mass, np.maximum(sign * (mean - edge), 0.0)
+
+    wasserstein += _outer_distance(*tail(reference, n_ref, 0, lower, -1), *tail(current, n_cur, 0, lower, -1))
+    wasserstein += _outer_distance(*tail(reference, n_ref, -1, upper, 1), *tail(current, n_cur, -1, upper, 1))
+
+    # PSI on ~equal-mass bins cut where the reference CDF crosses each decile
+    psi = np.zeros(len(ks_stat))
+    for i in range(len(ks_stat)):
+        cuts = np.unique(np.searchsorted(ref_cdf[i], np.arange(1, PSI_BINS) / PSI_BINS))
+        expected = np.diff(np.concatenate(([0.0], ref_cdf[i][cuts], [1.0])))
+        actual = np.diff(np.concatenate(([0.0], cur_cdf[i][cuts], [1.0])))
+        expected, actual = np.maximum(expected, 1e-4), np.maximum(actual, 1e-4)
+        psi[i] = np.sum((actual - expected) * np.log(actual / expected))
+
+    return {"ks_stat": ks_stat, "p_value": p_value, "psi": psi, "wasserstein": wasserstein}
+
+
+def _simulated_current_data(reference_path, columns, chunksize, rows=50):
+    """Demo input: the last rows of the reference with two features shifted."""
+    tail = None
+    for chunk in pd.read_csv(reference_path, chunksize=chunksize):
+        tail = pd.concat([tail, chunk]).tail(rows) if tail is not None else chunk.tail(rows)
+    current_data = tail.copy()
+    current_data["sepal length (cm)"] = current_data["sepal length (cm)"] * 1.5
+    current_data["petal width (cm)"] = current_data["petal width (cm)"] + 0.2
+    print("Simulating drift in 'sepal length (cm)' and 'petal width (cm)'...")
+    return [current_data[columns].to_numpy(dtype=np.float64)]
+
+
+def detect_drift(current_path=None, chunksize=CHUNK_SIZE):
     """
     Compares a reference dataset with a 'current' dataset to detect data drift
-    using the Kolmogorov-Smirnov (KS) test.
+    using the Kolmogorov-Smirnov (KS) test, and reports PSI and Wasserstein
+    distance per feature as well.
+
+    Both datasets are streamed in chunks. The reference is summarized once
+    into `reference_profile.npz` and reused until the reference file changes.
+    Without `current_path`, drift is simulated on the tail of the reference.
     """
-    # 1. Load reference data
+    # 1. Load (or build) the reference profile
     if not REFERENCE_DATA_PATH.exists():
         raise FileNotFoundError(
             f"Reference dataset not found at {REFERENCE_DATA_PATH}. "
             "Run 'python -m src.train' first."
         )
-    reference_data = pd.read_csv(REFERENCE_DATA_PATH)
-
-    # 2. Simulate current data with drift
-    # For this demo, we'll take a slice of the reference data and modify it
-    # to ensure drift is detected. In a real system, this would be live data.
-    current_data = reference_data.copy().tail(50)
-    current_data["sepal length (cm)"] = current_data["sepal length (cm)"] * 1.5
-    current_data["petal width (cm)"] = current_data["petal width (cm)"] + 0.2
+    profile = load_reference_profile(REFERENCE_DATA_PATH, REFERENCE_PROFILE_PATH)
+    if profile is None:
+        print(f"Building reference profile from {REFERENCE_DATA_PATH}...")
+        profile = build_reference_profile(REFERENCE_DATA_PATH, chunksize)
+        save_reference_profile(profile, REFERENCE_PROFILE_PATH)
+    columns = profile["columns"]
+    reference = profile["histograms"]
 
-    print("Simulating drift in 'sepal length (cm)' and 'petal width (cm)'...")
+    # 2. Profile the current data on the reference bins
+    current = Histograms(reference.lower, reference.width, reference.bins)
+    if current_path is None:
+        current_chunks = _simulated_current_data(REFERENCE_DATA_PATH, columns, chunksize)
+    else:
+        current_chunks = _chunks(current_path, columns, chunksize)
+    for values in current_chunks:
+        current.add(values)
 
-    # 3. Perform Drift Detection (KS Test)
+    # 3. Perform Drift Detection
+    # Null hypothesis: the two distributions are identical
+    # If p-value < 0.05, we reject null hypothesis -> Drift Detected
+    scores = compare_histograms(reference, current)
     drift_results = {
         "drift_detected": False,
         "drifted_features": {},
         "metrics": {}
     }
-    
-    # Check each numerical column
-    numeric_columns = reference_data.select_dtypes(include=['number']).columns
-    
-    for col in numeric_columns:
-        # Run KS test
-        # Null hypothesis: the two distributions are identical
-        # If p-value < 0.05, we reject null hypothesis -> Drift Detected
-        stat, p_value = ks_2samp(reference_data[col], current_data[col])
-        
-        # Convert numpy bool to python bool for JSON serialization
-        is_drifted = bool(p_value < 0.05)
-        
+    for i, col in enumerate(columns):
+        is_drifted = bool(scores["p_value"][i] < 0.05)
         drift_results["metrics"][col] = {
-            "ks_stat": float(stat),
-            "p_value": float(p_value),
-            "drift_detected": is_drifted
+            "ks_stat": float(scores["ks_stat"][i]),
+            "p_value": float(scores["p_value"][i]),
+            "drift_detected": is_drifted,
+            "psi": float(scores["psi"][i]),
+            "wasserstein": float(scores["wasserstein"][i]),
         }
-        
         if is_drifted:
-            drift_results["drifted_features"][col] = float(p_value)
+            drift_results["drifted_features"][col] = float(scores["p_value"][i])
             drift_results["drift_detected"] = True
 
     # 4. Save the report
     with open(DRIFT_REPORT_PATH, 'w') as f:
         json.dump(drift_results, f, indent=4)
-        
+
     print(f"Drift report saved to {DRIFT_REPORT_PATH}")
-    
+
     if drift_results["drift_detected"]:
         print("Data drift detected!")
         print(f"Drifted features: {list(drift_results['drifted_features'].keys())}")
     else:
         print("No data drift detected.")
+    return drift_results
+
 
 if __name__ == "__main__":
-    detect_drift()
+    parser = argparse.ArgumentParser(description="Detect drift between the reference dataset and current data.")
+    parser.add_argument("--current", help="CSV with current data; drift is simulated when omitted")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    detect_drift(args.current, args.chunksize)
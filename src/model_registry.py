@@ -1,69 +1,271 @@
 import os
 import json
+import shutil
+import sqlite3
+import threading
 import joblib
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+from src.artifact_store import ArtifactStore
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS models ("
+    "version TEXT PRIMARY KEY, path TEXT NOT NULL, format TEXT NOT NULL, model_name TEXT, "
+    "metrics TEXT NOT NULL, created_at TEXT NOT NULL, is_active INTEGER NOT NULL DEFAULT 0)",
+    # At most one row can be active; the partial index also makes the lookup a single probe
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_models_active ON models (is_active) WHERE is_active = 1",
+    "CREATE INDEX IF NOT EXISTS idx_models_created_at ON models (created_at)",
+    "CREATE TABLE IF NOT EXISTS model_metrics ("
+    "version TEXT NOT NULL, name TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (version, name))",
+    "CREATE INDEX IF NOT EXISTS idx_model_metrics_value ON model_metrics (name, value)",
+)
+
+
+def _new_version():
+    return datetime.now().strftime("%Y%m%d_%H%M%S")
+
+
 class ModelRegistry:
-    def __init__(self, registry_path="artifacts/registry"):
+    """
+    Model versions stored in a SQLite database inside the registry directory.
+
+    Every write is one transaction, so concurrent CI jobs cannot lose each
+    other's updates and exactly one version is ever active. Reads are served
+    from an in-memory copy that is only refreshed after the database changed.
+    A legacy metadata.json is imported the first time the database is created.
+
+    Model files are written into a content-addressed `ArtifactStore` (by
+    default artifacts/store, shared with src/train.py), so identical models
+    and unchanged shards are stored once.
+    """
+
+    def __init__(self, registry_path="artifacts/registry", store=None):
         self.registry_path = Path(registry_path)
-        self.registry_path.mkdir(exist_ok=True)
+        self.registry_path.mkdir(parents=True, exist_ok=True)
+        self.store = store or ArtifactStore(self.registry_path.parent / "store")
+        self.db_file = self.registry_path / "registry.db"
         self.metadata_file = self.registry_path / "metadata.json"
-    
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._transaction() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+        self._cache = None
+        self._cache_data_version = None
+        self._loaded_model = (None, None)
+        self._import_legacy_metadata()
+
     def save_model(self, model, metrics, version=None):
-        if version is None:
-            version = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        model_path = self.registry_path / f"model_v{version}.joblib"
-        joblib.dump(model, model_path)
-        
-        metadata = self._load_metadata()
-        metadata[version] = {
-            "path": str(model_path),
-            "metrics": metrics,
-            "created_at": datetime.now().isoformat(),
-            "is_active": False
-        }
-        self._save_metadata(metadata)
-        return version
-    
+        fd, tmp_name = tempfile.mkstemp(dir=self.registry_path, suffix=".joblib")
+        os.close(fd)
+        try:
+            joblib.dump(model, tmp_name)
+            model_path = self.store.blob_path(self.store.put_file(tmp_name))
+        finally:
+            os.remove(tmp_name)
+
+        return self._insert(version, str(model_path), "joblib", None, metrics)
+
+    def register_model_dir(self, model_dir, metrics, version=None, model_name=None):
+        """
+        Registers a saved Hugging Face model directory (e.g. an LLM snapshot) as a version.
+
+        The files are added to the artifact store and the version points at a
+        hard-linked checkout of them, so later changes to `model_dir` do not
+        affect it.
+        """
+        return self.register_tree(self.store.put_tree(model_dir), metrics, version, model_name)
+
+    def register_tree(self, tree_id, metrics, version=None, model_name=None):
+        """Registers a model directory that is already in the artifact store."""
+        model_path = self.store.checkout(tree_id)
+        return self._insert(version, str(model_path), "hf", model_name, metrics)
+
     def set_active_model(self, version):
-        metadata = self._load_metadata()
-        for v in metadata:
-            metadata[v]["is_active"] = (v == version)
-        self._save_metadata(metadata)
-        
-        # Create symlink to active model (Linux) or copy (Windows)
-        import os
-        import shutil
+        with self._transaction() as conn:
+            row = conn.execute("SELECT path, format FROM models WHERE version = ?", (version,)).fetchone()
+            if row is None:
+                raise KeyError(version)
+            conn.execute("UPDATE models SET is_active = 0 WHERE is_active = 1")
+            conn.execute("UPDATE models SET is_active = 1 WHERE version = ?", (version,))
+
+        # Model directories are served straight from their path
+        model_path, model_format = Path(row[0]), row[1]
+        if model_format == "hf":
+            return
+
+        # Point artifacts/model.joblib at the active blob: symlink (Linux/CI), hard link or
+        # copy (Windows), written next to the target and renamed so readers never see a missing file
         active_path = Path("artifacts/model.joblib")
-        if active_path.exists():
-            active_path.unlink()
-        
-        model_path = Path(metadata[version]["path"])
-        
-        # Try symlink first (Linux/CI), fallback to copy (Windows)
+        tmp_path = active_path.with_suffix(".joblib.tmp")
+        if tmp_path.exists() or tmp_path.is_symlink():
+            tmp_path.unlink()
         try:
-            active_path.symlink_to(model_path.resolve())
+            tmp_path.symlink_to(model_path.resolve())
         except (OSError, NotImplementedError):
-            shutil.copy2(model_path, active_path)
-    
+            try:
+                os.link(model_path, tmp_path)
+            except OSError:
+                shutil.copy2(model_path, tmp_path)
+        os.replace(tmp_path, active_path)
+
     def get_active_model(self):
-        metadata = self._load_metadata()
-        for version, info in metadata.items():
-            if info.get("is_active"):
-                return version, joblib.load(info["path"])
-        return None, None
-    
-    def list_models(self):
-        return self._load_metadata()
-    
-    def _load_metadata(self):
-        if self.metadata_file.exists():
+        version, info = self.get_active_version()
+        if version is None:
+            return None, None
+        with self._lock:
+            if self._loaded_model[0] != version:
+                self._loaded_model = (version, joblib.load(info["path"]))
+            return self._loaded_model
+
+    def get_active_version(self):
+        """Returns (version, metadata) of the active model without loading it."""
+        versions, active = self._snapshot()
+        if active is None:
+            return None, None
+        return active, versions[active]
+
+    def get_version(self, version):
+        return self._snapshot()[0].get(version)
+
+    def list_models(self, active=None, model_format=None, created_after=None, created_before=None,
+                    min_metrics=None, sort_metric=None, descending=True, limit=None, offset=0):
+        """
+        Returns {version: metadata}, newest first unless sorted by `sort_metric`.
+
+        Filters are combined: `min_metrics` maps a metric name to its minimum
+        value. `limit` and `offset` paginate the sorted result.
+        """
+        joins, join_params, clauses, params = [], [], [], []
+        if active is not None:
+            clauses.append("m.is_active = ?")
+            params.append(int(active))
+        if model_format is not None:
+            clauses.append("m.format = ?")
+            params.append(model_format)
+        if created_after is not None:
+            clauses.append("m.created_at >= ?")
+            params.append(created_after)
+        if created_before is not None:
+            clauses.append("m.created_at < ?")
+            params.append(created_before)
+        for i, (name, minimum) in enumerate((min_metrics or {}).items()):
+            joins.append(f"JOIN model_metrics f{i} ON f{i}.version = m.version AND f{i}.name = ? AND f{i}.value >= ?")
+            join_params += [name, minimum]
+
+        order = "m.created_at"
+        if sort_metric is not None:
+            joins.append("JOIN model_metrics s ON s.version = m.version AND s.name = ?")
+            join_params.append(sort_metric)
+            order = "s.value"
+
+        query = "SELECT m.version FROM models m " + " ".join(joins)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += f" ORDER BY {order} {'DESC' if descending else 'ASC'}, m.version LIMIT ? OFFSET ?"
+        params = join_params + params + [-1 if limit is None else limit, offset]
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        versions = self._snapshot()[0]
+        return {row[0]: versions[row[0]] for row in rows if row[0] in versions}
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self._cache = None
+
+    def _insert(self, version, path, model_format, model_name, metrics):
+        """
+        Adds a new version and returns its id.
+
+        Without an explicit `version` the id is the current second, suffixed
+        with _1, _2... when another writer already took it; an explicit
+        version that is already registered raises ValueError.
+        """
+        base = version or _new_version()
+        candidate, suffix = base, 0
+        with self._transaction() as conn:
+            while True:
+                try:
+                    conn.execute(
+                        "INSERT INTO models (version, path, format, model_name, metrics, created_at, is_active) "
+                        "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                        (candidate, path, model_format, model_name, json.dumps(metrics), datetime.now().isoformat()),
+                    )
+                    break
+                except sqlite3.IntegrityError:
+                    if version is not None:
+                        raise ValueError(f"Model version {version!r} is already registered")
+                    suffix += 1
+                    candidate = f"{base}_{suffix}"
+            self._insert_metrics(conn, candidate, metrics)
+        return candidate
+
+    def _insert_metrics(self, conn, version, metrics):
+        # Numeric metrics are also stored as rows so listings can filter and sort on them
+        conn.executemany(
+            "INSERT INTO model_metrics (version, name, value) VALUES (?, ?, ?)",
+            [
+                (version, name, float(value))
+                for name, value in (metrics or {}).items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool)
+            ],
+        )
+
+    def _snapshot(self):
+        """Returns ({version: metadata}, active_version), reloading only after a commit."""
+        with self._lock:
+            # data_version changes whenever another connection (e.g. a CI job) commits
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._cache is None or data_version != self._cache_data_version:
+                rows = self._conn.execute(
+                    "SELECT version, path, format, model_name, metrics, created_at, is_active FROM models"
+                ).fetchall()
+                versions, active = {}, None
+                for version, path, model_format, model_name, metrics, created_at, is_active in rows:
+                    versions[version] = {
+                        "path": path,
+                        "format": model_format,
+                        "model_name": model_name,
+                        "metrics": json.loads(metrics),
+                        "created_at": created_at,
+                        "is_active": bool(is_active),
+                    }
+                    if is_active:
+                        active = version
+                self._cache = (versions, active)
+                self._cache_data_version = data_version
+            return self._cache
+
+    def _import_legacy_metadata(self):
+        if not self.metadata_file.exists():
+            return
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM models LIMIT 1").fetchone() is not None:
+                return
             with open(self.metadata_file) as f:
-                return json.load(f)
-        return {}
-    
-    def _save_metadata(self, metadata):
-        with open(self.metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
\ No newline at end of file
+                metadata = json.load(f)
+            for version, info in metadata.items():
+                conn.execute(
+                    "INSERT INTO models (version, path, format, model_name, metrics, created_at, is_active) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        version, info["path"], info.get("format", "joblib"), info.get("model_name"),
+                        json.dumps(info.get("metrics", {})), info.get("created_at", ""),
+                        int(bool(info.get("is_active"))),
+                    ),
+                )
+                self._insert_metrics(conn, version, info.get("metrics", {}))
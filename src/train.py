@@ -1,53 +1,283 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import mlflow
+import hashlib
+import json
 import os
-import shutil
+import tempfile
+import threading
+import time
+
+# torch, transformers and mlflow are imported by the functions that use them, so importing this module stays cheap
+from src.model_registry import ModelRegistry
 
 # Define paths relative to this file
 PROJECT_ROOT = Path(__file__).parent.parent
 ARTIFACT_DIR = PROJECT_ROOT / "artifacts"
 # Update path for the new model
 MODEL_PATH = ARTIFACT_DIR / "Qwen2.5-0.5B-Instruct"
+# Fingerprint of the last completed run and progress of its MLflow uploads
+TRAIN_STATE_PATH = ARTIFACT_DIR / "train_state.json"
+# Code that shapes the saved snapshot; editing it invalidates the cached output
+FINGERPRINT_FILES = [PROJECT_ROOT / "src" / "train.py", PROJECT_ROOT / "app" / "model_loader.py", PROJECT_ROOT / "app" / "backends.py"]
+# Set TRAIN_FORCE=1 to rebuild the snapshot even when the fingerprint is unchanged
+TRAIN_FORCE = os.environ.get("TRAIN_FORCE", "0") == "1"
+TRAIN_UPLOAD_WORKERS = int(os.environ.get("TRAIN_UPLOAD_WORKERS", "4"))
+# Serving backend to prepare for: "onnx" adds an ONNX export to the snapshot,
+# "compile" fills the torch.compile kernel cache the API reuses on this machine
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "eager")
+TORCH_COMPILE_CACHE_DIR = Path(os.environ.get("TORCH_COMPILE_CACHE_DIR", ARTIFACT_DIR / "torch_compile_cache"))
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+
+@contextmanager
+def timed_stage(name, stage_seconds):
+    start = time.perf_counter()
+    yield
+    stage_seconds[name] = time.perf_counter() - start
+
+def upstream_revision(model_name):
+    """Commit sha of the model on the hub, or None when it cannot be resolved."""
+    try:
+        from huggingface_hub import HfApi
+        return HfApi().model_info(model_name).sha
+    except Exception as e:
+        print(f"Could not resolve upstream revision for '{model_name}': {e.__class__.__name__}")
+        return None
+
+def pipeline_fingerprint(model_name, revision, precision, backend):
+    digest = hashlib.sha256()
+    # Only the ONNX backend changes the snapshot's contents
+    digest.update(json.dumps([model_name, revision, precision, backend == "onnx"]).encode("utf-8"))
+    for path in FINGERPRINT_FILES:
+        # Normalize line endings so Windows and Linux checkouts agree
+        digest.update(path.read_bytes().replace(b"\r\n", b"\n"))
+    return digest.hexdigest()
+
+def load_state():
+    if TRAIN_STATE_PATH.exists():
+        with open(TRAIN_STATE_PATH) as f:
+            return json.load(f)
+    return {}
+
+def save_state(state):
+    tmp_path = TRAIN_STATE_PATH.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, TRAIN_STATE_PATH)
+
+def outputs_intact(store, tree_id):
+    """True when MODEL_PATH still holds exactly the files of `tree_id`, checked without hashing."""
+    try:
+        files = store.read_tree(tree_id)
+    except FileNotFoundError:
+        return False
+    present = {p.relative_to(MODEL_PATH).as_posix() for p in MODEL_PATH.rglob("*") if p.is_file()} if MODEL_PATH.exists() else set()
+    if present != set(files):
+        return False
+    for relative_path, info in files.items():
+        path = MODEL_PATH / relative_path
+        blob = store.blob_path(info["sha256"])
+        if blob.exists() and os.path.samefile(path, blob):
+            continue
+        # Checkouts copied on filesystems without hard links are compared by size
+        if path.stat().st_size != info["size"]:
+            return False
+    return True
+
+def build_snapshot(model_name, revision, precision, backend, registry, stage_seconds):
+    """Downloads the model and tokenizer and adds the snapshot to the artifact store."""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    from app.backends import ONNX_DIR, export_onnx
+    from app.model_loader import PRECISION_DTYPES, write_snapshot_manifest
+
+    print(f"Downloading model and tokenizer for '{model_name}'...")
+    with timed_stage("download", stage_seconds):
+        # Download the model (removed trust_remote_code=True)
+        load_kwargs = {"revision": revision} if revision else {}
+        # bf16 snapshots are stored preconverted so serving with MODEL_PRECISION=bf16 maps them as-is;
+        # fp32 and int8 get float32 weights even when the checkpoint is stored in bf16
+        load_kwargs["dtype"] = PRECISION_DTYPES[precision]
+        model = AutoModelForCausalLM.from_pretrained(model_name, **load_kwargs)
+        # Download the tokenizer (removed trust_remote_code=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name, **({"revision": revision} if revision else {}))
+
+    with tempfile.TemporaryDirectory(dir=ARTIFACT_DIR, prefix=".train-") as staging_dir:
+        with timed_stage("save", stage_seconds):
+            # A single unsharded safetensors file can be memory-mapped in one piece
+            model.save_pretrained(staging_dir, safe_serialization=True, max_shard_size="100GB")
+            tokenizer.save_pretrained(staging_dir)
+            manifest = write_snapshot_manifest(model, staging_dir, model_name)
+        if backend == "onnx":
+            with timed_stage("export", stage_seconds):
+                export_onnx(model, Path(staging_dir) / ONNX_DIR)
+        with timed_stage("store", stage_seconds):
+            tree_id = registry.store.put_tree(staging_dir)
+    print(f"Snapshot stored as {manifest['dtype']} tree {tree_id}")
+    return tree_id
+
+def populate_compile_cache(precision):
+    """Compiles the served model and runs the API's warm-up shapes so TORCH_COMPILE_CACHE_DIR holds its kernels."""
+    from transformers import AutoTokenizer
+
+    from app.backends import WARMUP_PROMPTS, load_inference_model, warm_up
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH, local_files_only=True)
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = load_inference_model(str(MODEL_PATH), precision, "compile", compile_cache_dir=TORCH_COMPILE_CACHE_DIR)
+    seconds = warm_up(tokenizer, model, WARMUP_PROMPTS, sorted({1, BATCH_MAX_SIZE}))
+    print(f"Compiled kernels cached in {TORCH_COMPILE_CACHE_DIR} ({seconds:.1f}s)")
+
+def run_exists(run_id):
+    import mlflow
+
+    try:
+        mlflow.tracking.MlflowClient().get_run(run_id)
+        return True
+    except Exception:
+        return False
+
+def upload_artifacts(run_id, store, tree_id, upload_state, on_progress):
+    """
+    Logs the snapshot files under the run's "model" artifact path in parallel.
+
+    Files already recorded in `upload_state["uploaded"]` are skipped, so an
+    interrupted upload resumes into the same run with only the missing files.
+    """
+    import mlflow
+
+    client = mlflow.tracking.MlflowClient()
+    uploaded = set(upload_state.setdefault("uploaded", []))
+    pending = [name for name in sorted(store.read_tree(tree_id)) if name not in uploaded]
+    lock = threading.Lock()
+
+    def upload(relative_path):
+        parent = Path(relative_path).parent.as_posix()
+        artifact_path = "model" if parent == "." else f"model/{parent}"
+        client.log_artifact(run_id, str(MODEL_PATH / relative_path), artifact_path)
+        with lock:
+            upload_state["uploaded"].append(relative_path)
+            on_progress()
+
+    with ThreadPoolExecutor(max_workers=max(1, TRAIN_UPLOAD_WORKERS)) as pool:
+        list(pool.map(upload, pending))
+    upload_state["complete"] = True
+    on_progress()
+    return len(pending)
 
 def main() -> None:
     """
     Downloads the Qwen/Qwen2.5-0.5B-Instruct model and tokenizer from Hugging Face,
-    saves them to the artifacts directory, and logs them to MLflow.
+    saves them to the artifacts directory as an mmap-loadable safetensors snapshot,
+    registers the snapshot as a model version and logs it to MLflow.
+
+    Files go through the content-addressed artifact store: only content it has
+    not seen before is written, and the model directory is swapped to hard
+    links of the new snapshot in one rename. When the upstream revision,
+    precision and training code match the last run and the model directory is
+    intact, the download and save are skipped; artifacts already uploaded to
+    the current tracking server are not uploaded again.
+
+    INFERENCE_BACKEND=onnx adds an ONNX export with KV-cache inputs to the
+    snapshot; INFERENCE_BACKEND=compile compiles the model once so the API
+    finds its kernels in the torch.compile cache.
     """
+    import mlflow
+
+    from app.backends import SUPPORTED_BACKENDS
+    from app.model_loader import SUPPORTED_PRECISIONS
+
     print(f"Running training script from {__file__}")
     print(f"Artifact directory: {ARTIFACT_DIR}")
-    
-    # Clean the destination directory before saving to avoid Windows file locking issues
-    if MODEL_PATH.exists():
-        print(f"Cleaning existing model directory: {MODEL_PATH}")
-        shutil.rmtree(MODEL_PATH)
 
     ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    registry = ModelRegistry(ARTIFACT_DIR / "registry")
 
     # Set tracking URI to a local directory if not already set for manual runs.
     if not mlflow.get_tracking_uri() or "databricks" in mlflow.get_tracking_uri():
         mlflow.set_tracking_uri("file:./mlruns")
+    tracking_uri = mlflow.get_tracking_uri()
+
+    model_name = "Qwen/Qwen2.5-0.5B-Instruct"
+    precision = os.environ.get("MODEL_PRECISION", "fp32")
+    if precision not in SUPPORTED_PRECISIONS:
+        raise ValueError(f"Unsupported MODEL_PRECISION '{precision}', expected one of {SUPPORTED_PRECISIONS}")
+    if INFERENCE_BACKEND not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unsupported INFERENCE_BACKEND '{INFERENCE_BACKEND}', expected one of {SUPPORTED_BACKENDS}")
+    if INFERENCE_BACKEND == "onnx" and precision != "fp32":
+        raise ValueError("INFERENCE_BACKEND=onnx exports the fp32 model; set MODEL_PRECISION=fp32")
+    stage_seconds = {}
+    state = load_state()
+
+    with timed_stage("fingerprint", stage_seconds):
+        revision = upstream_revision(model_name)
+        fingerprint = pipeline_fingerprint(model_name, revision, precision, INFERENCE_BACKEND)
+        cache_hit = (
+            not TRAIN_FORCE
+            and revision is not None
+            and state.get("fingerprint") == fingerprint
+            and outputs_intact(registry.store, state.get("tree_id", ""))
+        )
 
-    with mlflow.start_run():
-        model_name = "Qwen/Qwen2.5-0.5B-Instruct"
-        mlflow.log_param("model_name", model_name)
+    if cache_hit:
+        tree_id = state["tree_id"]
+        print(f"Upstream revision {revision} and training code unchanged; reusing {MODEL_PATH}")
+    else:
+        tree_id = build_snapshot(model_name, revision, precision, INFERENCE_BACKEND, registry, stage_seconds)
+        with timed_stage("checkout", stage_seconds):
+            registry.store.checkout(tree_id, MODEL_PATH)
+    if INFERENCE_BACKEND == "compile":
+        # Kernels are machine-specific, so the cache is filled on every run; it is quick when warm
+        with timed_stage("compile", stage_seconds):
+            populate_compile_cache(precision)
 
-        print(f"Downloading model and tokenizer for '{model_name}'...")
+    if tree_id == state.get("tree_id") and state.get("registry_version"):
+        version = state["registry_version"]
+    else:
+        version = registry.register_tree(tree_id, {}, model_name=model_name)
+    print(f"Model and tokenizer saved to {MODEL_PATH} (registry version {version})")
 
-        # Download and save the model (removed trust_remote_code=True)
-        model = AutoModelForCausalLM.from_pretrained(model_name)
-        model.save_pretrained(MODEL_PATH)
+    uploads = state.get("uploads", {})
+    upload_state = uploads.get(tracking_uri, {})
+    # A recorded run may have been deleted from the tracking server since
+    if upload_state.get("tree_id") != tree_id or (upload_state.get("run_id") and not run_exists(upload_state["run_id"])):
+        upload_state = {"tree_id": tree_id, "uploaded": [], "complete": False}
+    state.update(fingerprint=fingerprint, revision=revision, tree_id=tree_id, registry_version=version)
+    uploads[tracking_uri] = upload_state
+    state["uploads"] = uploads
+    save_state(state)
 
-        # Download and save the tokenizer (removed trust_remote_code=True)
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        tokenizer.save_pretrained(MODEL_PATH)
+    # An unfinished upload of the same snapshot continues in its original run
+    resume_run_id = None if upload_state["complete"] else upload_state.get("run_id")
+    with mlflow.start_run(run_id=resume_run_id) as run:
+        params = {
+            "model_name": model_name,
+            "snapshot_precision": precision,
+            "inference_backend": INFERENCE_BACKEND,
+            "upstream_revision": revision,
+            "snapshot_tree": tree_id,
+            "registry_version": version,
+        }
+        # Params are immutable: a resumed run keeps the values it was started with
+        # (e.g. a different INFERENCE_BACKEND does not change the snapshot)
+        logged = run.data.params
+        for key in sorted(key for key in params if key in logged and logged[key] != str(params[key])):
+            print(f"Resumed run {run.info.run_id} keeps {key}={logged[key]} (this run: {params[key]})")
+        mlflow.log_params({key: value for key, value in params.items() if key not in logged})
+        mlflow.log_metric("cache_hit", int(cache_hit))
 
-        print(f"Model and tokenizer saved to {MODEL_PATH}")
+        if upload_state["complete"]:
+            mlflow.log_param("artifacts_run_id", upload_state["run_id"])
+            print(f"Model artifacts already logged in run {upload_state['run_id']}.")
+        else:
+            upload_state["run_id"] = run.info.run_id
+            with timed_stage("upload", stage_seconds):
+                count = upload_artifacts(run.info.run_id, registry.store, tree_id, upload_state, lambda: save_state(state))
+            print(f"Logged {count} model artifacts to MLflow.")
 
-        # Log the model artifacts to MLflow
-        mlflow.log_artifacts(str(MODEL_PATH), artifact_path="model")
-        print("Logged model artifacts to MLflow.")
+        mlflow.log_metrics({f"stage_{name}_seconds": seconds for name, seconds in stage_seconds.items()})
 
 if __name__ == "__main__":
     main()
@@ -1,18 +1,33 @@
 from fastapi.testclient import TestClient
 from app.main import app
-import shutil
+import json
+import subprocess
+import sys
 from pathlib import Path
 
-# This function will run before each test in this file
-def setup_function():
-    # Clear cached model artifacts to prevent file locking issues on Windows
-    model_path = Path(__file__).parent.parent / "artifacts" / "Qwen2.5-0.5B-Instruct"
-    if model_path.exists():
-        print(f"Clearing model cache at: {model_path}")
-        shutil.rmtree(model_path)
+import pytest
 
 client = TestClient(app)
 
+@pytest.fixture
+def tiny_model(tmp_path, monkeypatch):
+    """Serves a tiny local causal LM instead of the real model, so the tests run offline."""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    from app import main as api
+    from src.benchmark_serving import build_tiny_model
+
+    model_path = build_tiny_model(tmp_path / "tiny-model")
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    tokenizer.padding_side = "left"
+    model = AutoModelForCausalLM.from_pretrained(model_path).eval()
+    monkeypatch.setattr(api, "get_model", lambda version=None: (tokenizer, model))
+    # A fresh batcher picks up the patched loader; stopped again after the test
+    monkeypatch.setattr(api, "_batcher", None)
+    yield tokenizer, model
+    if api._batcher is not None:
+        api._batcher.stop()
+
 def test_root():
     response = client.get("/")
     assert response.status_code == 200
@@ -29,6 +44,8 @@ def test_health():
     assert "model_ready" in json_response
     assert "resource_usage" in json_response
     assert "uptime_seconds" in json_response
+    assert json_response["resource_usage"]["memory_rss_bytes"] > 0
+    assert json_response["resource_usage"]["thread_count"] > 0
 
 def test_metrics():
     response = client.get("/metrics")
@@ -39,7 +56,7 @@ def test_metrics():
     assert "process_memory_rss_bytes" in metrics_text
     assert "api_errors_total" in metrics_text
 
-def test_predict_valid():
+def test_predict_valid(tiny_model):
     payload = {"prompt": "Hello, world!", "max_new_tokens": 10}
     response = client.post("/predict", json=payload)
     
@@ -60,3 +77,57 @@ def test_predict_invalid_schema():
     payload = {"prompt": "test", "max_new_tokens": -5}
     response = client.post("/predict", json=payload)
     assert response.status_code == 422
+
+def test_predict_stream_invalid_schema():
+    response = client.post("/predict/stream", json={"max_new_tokens": 10})
+    assert response.status_code == 422
+
+def test_score_batch_columnar_json():
+    columns = [[5.1, 6.7], [3.5, 3.0], [1.4, 5.2], [0.2, 2.3]]
+    response = client.post("/score/batch", json={"columns": columns})
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["rows"] == 2
+    assert len(json_response["predictions"]) == 2
+    assert all(len(column) == 2 for column in json_response["probabilities"].values())
+
+    response = client.post("/score/batch", json={"columns": columns[:3]})
+    assert response.status_code == 422
+
+    response = client.post("/score/batch", content=b"", headers={"Content-Type": "application/x-npy"})
+    assert response.status_code == 422
+
+def test_ready_is_separate_from_liveness():
+    # The startup hook never ran for this client, so the model is not loaded yet
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+    assert client.get("/health").json()["startup_phase"] == "starting"
+
+def test_importing_app_does_not_import_ml_stack():
+    code = "import sys, app.main; print(sorted({'torch', 'transformers', 'mlflow'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).parent.parent)
+    assert result.stdout.strip() == "[]"
+
+def test_predict_stream_sends_tokens_in_order_then_done(tiny_model):
+    from prometheus_client import REGISTRY
+
+    from app import main as api
+
+    tokenizer, model = tiny_model
+    ttft_count = REGISTRY.get_sample_value("ml_stream_time_to_first_token_seconds_count") or 0
+
+    payload = {"prompt": "cloud model pipeline", "max_new_tokens": 12, "do_sample": False}
+    with client.stream("POST", "/predict/stream", json=payload) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [line[len("data: "):] for line in response.iter_lines() if line.startswith("data: ")]
+
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event)["text"] for event in events[:-1]]
+    assert chunks
+    input_ids = tokenizer(api.build_prompt_text(tokenizer, payload["prompt"]), return_tensors="pt").input_ids
+    expected = model.generate(input_ids, max_new_tokens=12, do_sample=False, pad_token_id=tokenizer.pad_token_id)
+    assert "".join(chunks) == tokenizer.decode(expected[0, input_ids.shape[1]:], skip_special_tokens=True)
+    assert REGISTRY.get_sample_value("ml_stream_time_to_first_token_seconds_count") == ttft_count + 1
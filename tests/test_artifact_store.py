@@ -0,0 +1,51 @@
+import os
+import stat
+
+from src.artifact_store import ArtifactStore
+
+
+def test_identical_files_are_stored_once_and_checked_out_as_links(tmp_path):
+    store = ArtifactStore(tmp_path / "store")
+    first, second = tmp_path / "first", tmp_path / "second"
+    for directory, config in ((first, b"{}"), (second, b'{"changed": true}')):
+        directory.mkdir()
+        (directory / "model.safetensors").write_bytes(b"weights" * 1000)
+        (directory / "config.json").write_bytes(config)
+
+    first_tree = store.put_tree(first)
+    second_tree = store.put_tree(second)
+
+    assert first_tree != second_tree
+    assert len([p for p in (tmp_path / "store" / "blobs").rglob("*") if p.is_file()]) == 3
+
+    destination = store.checkout(first_tree, tmp_path / "model")
+    store.checkout(second_tree, destination)
+    assert (destination / "config.json").read_bytes() == b'{"changed": true}'
+    assert (destination / "model.safetensors").stat().st_ino == (
+        store.checkout(first_tree) / "model.safetensors"
+    ).stat().st_ino
+
+
+def test_replacing_a_checkout_removes_read_only_links(tmp_path, monkeypatch):
+    store = ArtifactStore(tmp_path / "store")
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "config.json").write_bytes(b"{}")
+    first = store.put_tree(source)
+    (source / "config.json").write_bytes(b'{"changed": true}')
+    second = store.put_tree(source)
+
+    # Deleting a read-only file fails on Windows
+    unlink = os.unlink
+
+    def windows_unlink(path, *, dir_fd=None):
+        if not os.stat(path, dir_fd=dir_fd).st_mode & stat.S_IWRITE:
+            raise PermissionError(13, "Access is denied", path)
+        unlink(path, dir_fd=dir_fd)
+
+    monkeypatch.setattr(os, "unlink", windows_unlink)
+    destination = store.checkout(first, tmp_path / "model")
+    store.checkout(second, destination)
+
+    assert (destination / "config.json").read_bytes() == b'{"changed": true}'
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith(".model")] == []
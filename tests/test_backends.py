@@ -0,0 +1,45 @@
+import pytest
+import torch
+from transformers import AutoModelForCausalLM, Qwen2Config
+
+from app.backends import ONNX_DIR, export_onnx, load_inference_model
+from app.model_pool import model_nbytes
+
+
+def test_onnx_export_generates_like_eager_model(tmp_path):
+    pytest.importorskip("onnxruntime")
+    torch.manual_seed(0)
+    config = Qwen2Config(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, eos_token_id=None,
+    )
+    model = AutoModelForCausalLM.from_config(config).eval()
+    model.save_pretrained(tmp_path)
+    export_onnx(model, tmp_path / ONNX_DIR)
+
+    onnx_model = load_inference_model(str(tmp_path), backend="onnx")
+    assert model_nbytes(onnx_model) > 0
+
+    # Left-padded batch: the second prompt is two tokens shorter
+    input_ids = torch.tensor([[5, 6, 7, 8, 9], [0, 0, 3, 4, 5]])
+    attention_mask = torch.tensor([[1, 1, 1, 1, 1], [0, 0, 1, 1, 1]])
+    with torch.no_grad():
+        expected = model.generate(
+            input_ids=input_ids, attention_mask=attention_mask, max_new_tokens=8, do_sample=False, pad_token_id=0
+        )
+    outputs = onnx_model.generate(
+        input_ids=input_ids, attention_mask=attention_mask, max_new_tokens=8, do_sample=False, pad_token_id=0
+    )
+    assert torch.equal(outputs, expected)
+
+    # One forward pass on top of a cache, as the continuous scheduler runs it
+    prefill = onnx_model(input_ids=input_ids[:1, :3])
+    step = onnx_model(
+        input_ids=input_ids[:1, 3:],
+        attention_mask=torch.ones((1, 5), dtype=torch.long),
+        position_ids=torch.tensor([[3, 4]]),
+        past_key_values=prefill.past_key_values,
+    )
+    with torch.no_grad():
+        reference = model(input_ids=input_ids[:1]).logits
+    assert torch.allclose(step.logits[:, -1], reference[:, -1], atol=1e-4)
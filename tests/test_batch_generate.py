@@ -0,0 +1,45 @@
+import json
+
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from app import main as api
+from src.batch_generate import length_buckets, load_checkpoint, run_job
+from src.benchmark_serving import build_tiny_model
+
+
+def test_buckets_sort_by_length_within_each_key_and_window():
+    items = [("a", 5), ("b", 1), ("a", 3), ("a", 9), ("b", 2), ("a", 1)]
+    batches = list(length_buckets(items, key=lambda item: item[0], length=lambda item: item[1], batch_size=2, window=4))
+    # The first window holds the first four items; the last two are bucketed on their own
+    assert batches == [[("a", 3), ("a", 5)], [("a", 9)], [("b", 1)], [("b", 2)], [("a", 1)]]
+
+
+def test_interrupted_run_resumes_after_the_last_complete_record(tmp_path, monkeypatch):
+    model_path = build_tiny_model(tmp_path / "tiny-model")
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    tokenizer.padding_side = "left"
+    model = AutoModelForCausalLM.from_pretrained(model_path).eval()
+    monkeypatch.setattr(api, "get_model", lambda version=None: (tokenizer, model))
+
+    input_path = tmp_path / "prompts.jsonl"
+    lines = [{"request_id": f"r{i}", "prompt": "cloud model " * (i % 4 + 1), "max_new_tokens": 4, "do_sample": False}
+             for i in range(6)]
+    lines.append({"request_id": "invalid", "max_new_tokens": 4})
+    input_path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+
+    # A previous run wrote one record and died in the middle of the next one
+    output_path = tmp_path / "generations.jsonl"
+    output_path.write_text(json.dumps({"request_id": "r2", "generated_text": "from the first run"}) + '\n{"request_id": "r')
+    assert load_checkpoint(output_path, "request_id") == {"r2"}
+
+    results = run_job(input_path, output_path, batch_size=4, progress=lambda message: None)
+    assert results["records"] == 5 and results["errors"] == 1 and results["skipped"] == 1
+    assert results["generated_tokens"] > 0 and results["tokens_per_second"] > 0
+
+    records = {record["request_id"]: record for record in map(json.loads, output_path.read_text().splitlines())}
+    assert sorted(records) == sorted(line["request_id"] for line in lines)
+    assert records["r2"]["generated_text"] == "from the first run"
+    assert records["invalid"]["error"] == "ValidationError"
+    assert records["r0"]["model_version"] == api.model_version_label(api.active_model_version())
+
+    assert run_job(input_path, output_path, progress=lambda message: None)["records"] == 0
@@ -0,0 +1,186 @@
+import threading
+import time
+
+import pytest
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from app.batching import MicroBatcher
+from app.scheduler import ContinuousBatchScheduler, SeededSampler, sample_next_tokens
+from app.schemas import PredictRequest
+from src.benchmark_serving import build_tiny_model
+
+
+def test_concurrent_requests_are_coalesced():
+    """
+    Requests submitted within the batching window should share one run_batch call
+    and each caller should receive its own result.
+    """
+    calls = []
+
+    def run_batch(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_seconds=0.2)
+    results = {}
+
+    def worker(value):
+        results[value] = batcher.submit(value)
+
+    threads = [threading.Thread(target=worker, args=(value,)) for value in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.stop()
+
+    assert results == {0: 0, 1: 2, 2: 4, 3: 6}
+    assert len(calls) == 1
+    assert sorted(calls[0]) == [0, 1, 2, 3]
+
+
+def test_groups_are_split_by_key():
+    calls = []
+
+    def run_batch(items):
+        calls.append(list(items))
+        return items
+
+    batcher = MicroBatcher(
+        run_batch, max_batch_size=4, max_wait_seconds=0.2, group_key=lambda item: item % 2
+    )
+    threads = [threading.Thread(target=batcher.submit, args=(value,)) for value in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.stop()
+
+    assert sorted(sorted(call) for call in calls) == [[0, 2], [1, 3]]
+
+
+def test_batch_errors_are_raised_to_callers():
+    def run_batch(items):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(run_batch, max_batch_size=1, max_wait_seconds=0)
+    try:
+        batcher.submit("prompt")
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+    finally:
+        batcher.stop()
+
+
+def test_sample_next_tokens_respects_per_row_top_k():
+    logits = torch.tensor([[0.0, 5.0, 1.0, 2.0], [3.0, 0.0, 4.0, 1.0]])
+    tokens = sample_next_tokens(
+        logits,
+        temperature=torch.tensor([1.0, 0.5]),
+        top_k=torch.tensor([1, 1]),
+        top_p=torch.tensor([1.0, 0.9]),
+    )
+    assert tokens.tolist() == [1, 2]
+
+
+@pytest.fixture(scope="module")
+def tiny_lm(tmp_path_factory):
+    path = build_tiny_model(tmp_path_factory.mktemp("tiny-model"))
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    tokenizer.padding_side = "left"
+    return tokenizer, AutoModelForCausalLM.from_pretrained(path).eval()
+
+
+def _greedy_text(tokenizer, model, prompt, max_new_tokens):
+    input_ids = tokenizer(prompt, return_tensors="pt").input_ids
+    with torch.no_grad():
+        output = model.generate(
+            input_ids, max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=tokenizer.pad_token_id
+        )
+    return tokenizer.decode(output[0, input_ids.shape[1]:], skip_special_tokens=True)
+
+
+def _submit_all(scheduler, requests, delay_seconds=0.0):
+    results = [None] * len(requests)
+
+    def submit(index):
+        results[index] = scheduler.submit(requests[index], timeout=60)
+
+    threads = []
+    for index in range(len(requests)):
+        threads.append(threading.Thread(target=submit, args=(index,)))
+        threads[-1].start()
+        time.sleep(delay_seconds)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_continuous_scheduler_matches_greedy_generate_for_staggered_requests(tiny_lm):
+    tokenizer, model = tiny_lm
+    scheduler = ContinuousBatchScheduler(lambda version: tiny_lm, lambda tokenizer, prompt: prompt, max_batch_size=4)
+    prompts = ["cloud model", "deploy version metric latency token batch", "cache drift", "registry training inference"]
+    requests = [
+        PredictRequest(prompt=prompt, max_new_tokens=6 + 3 * index, do_sample=False)
+        for index, prompt in enumerate(prompts * 2)
+    ]
+    try:
+        # Requests arrive while earlier ones are decoding, so rows join a running batch
+        results = _submit_all(scheduler, requests, delay_seconds=0.01)
+    finally:
+        scheduler.stop()
+
+    for req, text in zip(requests, results):
+        assert text == _greedy_text(tokenizer, model, req.prompt, req.max_new_tokens)
+
+
+def test_finished_row_is_evicted_without_corrupting_the_others(tiny_lm):
+    tokenizer, model = tiny_lm
+    admitted = threading.Event()
+
+    def get_model(version):
+        # Holds the first prefill until the longer requests are queued behind it
+        admitted.wait(5)
+        return tiny_lm
+
+    scheduler = ContinuousBatchScheduler(get_model, lambda tokenizer, prompt: prompt, max_batch_size=4)
+    requests = [
+        PredictRequest(prompt="cloud model pipeline", max_new_tokens=2, do_sample=False),
+        PredictRequest(prompt="deploy version", max_new_tokens=24, do_sample=False),
+        PredictRequest(prompt="metric latency token batch cache", max_new_tokens=24, do_sample=False),
+    ]
+    threading.Timer(0.2, admitted.set).start()
+    try:
+        results = _submit_all(scheduler, requests, delay_seconds=0.05)
+        # The short request left after two tokens; the batch shrank to the remaining rows
+        assert not scheduler._active
+    finally:
+        scheduler.stop()
+
+    for req, text in zip(requests, results):
+        assert text == _greedy_text(tokenizer, model, req.prompt, req.max_new_tokens)
+
+
+
+def test_seeded_sampling_does_not_depend_on_the_global_rng(tiny_lm):
+    tokenizer, model = tiny_lm
+    input_ids = tokenizer("cloud model pipeline", return_tensors="pt").input_ids
+    req = PredictRequest(prompt="cloud model pipeline", max_new_tokens=12, do_sample=True, temperature=1.0, seed=7)
+
+    def sample():
+        with torch.no_grad():
+            return model.generate(
+                input_ids, max_new_tokens=12, min_new_tokens=12, do_sample=False,
+                logits_processor=[SeededSampler([req])], pad_token_id=tokenizer.pad_token_id,
+            )
+
+    # Another thread seeding the process-wide RNG does not change the seeded output...
+    torch.manual_seed(0)
+    first = sample()
+    torch.manual_seed(1)
+    state = torch.get_rng_state()
+    assert torch.equal(sample(), first)
+    # ...and seeded sampling does not draw from it
+    assert torch.equal(torch.get_rng_state(), state)
@@ -0,0 +1,19 @@
+from src.benchmark_serving import compare_to_baseline, make_prompts, percentile
+
+
+def test_prompts_follow_length_distribution_and_are_unique():
+    prompts = make_prompts(200, "4:1,40:1", seed=1)
+    lengths = {len(prompt.split()) - 1 for prompt in prompts}
+    assert lengths == {4, 40}
+    assert len(set(prompts)) == len(prompts)
+    assert make_prompts(200, "4:1,40:1", seed=1) == prompts
+
+
+def test_baseline_comparison_flags_only_regressions_beyond_tolerance():
+    assert percentile([4, 1, 3, 2], 50) == 2.5
+    assert percentile([], 99) is None
+
+    baseline = {"throughput_rps": 10.0, "latency_p95_seconds": 0.2, "ttft_p50_seconds": None, "peak_rss_bytes": 100}
+    current = {"throughput_rps": 9.5, "latency_p95_seconds": 0.3, "ttft_p50_seconds": 0.1, "peak_rss_bytes": 80}
+    regressions = compare_to_baseline(current, baseline, tolerance=0.1)
+    assert [metric for metric, *_ in regressions] == ["latency_p95_seconds"]
@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+import pandas as pd
+from scipy.stats import ks_2samp, wasserstein_distance
+
+from src import detect_drift as drift
+
+
+def _write_reference(path, rows=2000):
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        "sepal length (cm)": rng.normal(5.8, 0.8, rows),
+        "petal width (cm)": rng.normal(1.2, 0.7, rows),
+        "target": rng.integers(0, 3, rows),
+    }).to_csv(path, index=False)
+
+
+def test_drift_detection_script(tmp_path, monkeypatch):
+    _write_reference(tmp_path / "reference_dataset.csv")
+    monkeypatch.setattr(drift, "REFERENCE_DATA_PATH", tmp_path / "reference_dataset.csv")
+    monkeypatch.setattr(drift, "REFERENCE_PROFILE_PATH", tmp_path / "reference_profile.npz")
+    monkeypatch.setattr(drift, "DRIFT_REPORT_PATH", tmp_path / "drift_report.json")
+
+    report = drift.detect_drift(chunksize=300)
+
+    assert report == json.loads((tmp_path / "drift_report.json").read_text())
+    assert report["drift_detected"] is True
+    assert "sepal length (cm)" in report["drifted_features"]
+    assert "target" not in report["drifted_features"]
+    assert set(report["metrics"]["target"]) == {"ks_stat", "p_value", "drift_detected", "psi", "wasserstein"}
+    assert (tmp_path / "reference_profile.npz").exists()
+
+
+def test_binned_statistics_match_exact_ones(tmp_path):
+    _write_reference(tmp_path / "reference.csv")
+    rng = np.random.default_rng(1)
+    current = pd.DataFrame({
+        "sepal length (cm)": rng.normal(6.0, 1.0, 500),
+        "petal width (cm)": rng.normal(1.2, 0.7, 500),
+        "target": rng.integers(0, 3, 500),
+    })
+    current.to_csv(tmp_path / "current.csv", index=False)
+
+    profile = drift.build_reference_profile(tmp_path / "reference.csv", chunksize=250)
+    drift.save_reference_profile(profile, tmp_path / "profile.npz")
+    reference = drift.load_reference_profile(tmp_path / "reference.csv", tmp_path / "profile.npz")["histograms"]
+    histograms = drift.Histograms(reference.lower, reference.width, reference.bins)
+    for values in drift._chunks(tmp_path / "current.csv", profile["columns"], 128):
+        histograms.add(values)
+    scores = drift.compare_histograms(reference, histograms)
+
+    reference_data = pd.read_csv(tmp_path / "reference.csv")
+    for i, column in enumerate(profile["columns"]):
+        exact = ks_2samp(reference_data[column], current[column])
+        assert abs(scores["ks_stat"][i] - exact.statistic) < 0.01
+        assert abs(scores["wasserstein"][i] - wasserstein_distance(reference_data[column], current[column])) < 0.01
+    assert scores["psi"][0] > scores["psi"][1]
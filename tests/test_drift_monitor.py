@@ -0,0 +1,55 @@
+import random
+
+from app.drift import DriftMonitor, QuantileSketch
+
+
+def _record(prompt_words, latency):
+    return {
+        "model_version": "v1",
+        "prompt": "word " * prompt_words,
+        "output": "a b c",
+        "latency_seconds": latency,
+        "do_sample": True,
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "top_k": 50,
+        "max_new_tokens": 50,
+    }
+
+
+def test_sketch_quantiles_are_accurate_and_mergeable():
+    rng = random.Random(0)
+    values = [rng.lognormvariate(0, 1) for _ in range(10000)]
+    first, second = QuantileSketch(0.01), QuantileSketch(0.01)
+    for i, value in enumerate(values):
+        (first if i % 2 else second).add(value)
+    first.merge(second)
+
+    assert first.count == len(values)
+    exact_median = sorted(values)[len(values) // 2]
+    assert abs(first.quantile(0.5) - exact_median) / exact_median < 0.03
+
+    restored = QuantileSketch.from_dict(first.to_dict())
+    assert restored.quantile(0.9) == first.quantile(0.9)
+
+
+def test_monitor_bootstraps_reference_and_flags_shifted_traffic(tmp_path):
+    rng = random.Random(0)
+    monitor = DriftMonitor(
+        tmp_path / "reference.json",
+        count_tokens=lambda version, text: len(text.split()),
+        reference_samples=500,
+        min_samples=100,
+    )
+    for _ in range(500):
+        monitor.update(_record(rng.randint(5, 15), rng.uniform(0.1, 0.3)), now=0)
+    assert [path.name for path in tmp_path.iterdir()] == ["reference.json"]
+    assert not monitor.evaluate(now=0)["drift_detected"]
+
+    # Only the new traffic is in the window once the reference period has expired
+    for _ in range(200):
+        monitor.update(_record(rng.randint(40, 60), rng.uniform(0.1, 0.3)), now=7200)
+    status = monitor.evaluate(now=7200)
+    assert status["drift_detected"]
+    assert status["features"]["prompt_tokens"]["drift_detected"]
+    assert not status["features"]["latency_seconds"]["drift_detected"]
@@ -0,0 +1,22 @@
+import threading
+
+import pytest
+
+from app.executor import InferenceExecutor, InferenceQueueFullError
+
+
+def test_submissions_beyond_queue_are_rejected():
+    release = threading.Event()
+    executor = InferenceExecutor(max_concurrency=1, max_queue=1)
+
+    running = executor.submit(release.wait)
+    queued = executor.submit(lambda: "queued")
+    with pytest.raises(InferenceQueueFullError):
+        executor.submit(lambda: "rejected")
+
+    release.set()
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == "queued"
+    assert executor.active == 0
+    assert executor.queued == 0
+    executor.shutdown()
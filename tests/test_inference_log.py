@@ -0,0 +1,63 @@
+import gzip
+
+from app.inference_log import InferenceLog, iter_records
+
+
+class _Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+def _record(i):
+    return {"request_id": f"r{i}", "model_version": "v1", "prompt": "hello there", "output": "x" * 100}
+
+
+def test_log_rotates_by_size_and_time_and_reads_back_in_order(tmp_path):
+    written = _Counter()
+    log = InferenceLog(
+        tmp_path,
+        count_tokens=lambda version, text: len(text.split()),
+        max_bytes=1000,
+        rotate_seconds=60,
+        written_counter=written,
+    )
+    for i in range(20):
+        log.write_batch([_record(i)], now=0)
+    log.write_batch([_record(20)], now=120)
+    log.stop()
+
+    rotated = sorted(tmp_path.glob("inference-*.jsonl.gz"))
+    assert rotated and not list(tmp_path.glob("inference-*.jsonl"))
+    with gzip.open(rotated[0], "rt") as f:
+        assert f.readline().startswith('{"request_id":"r0"')
+
+    records = list(iter_records(tmp_path))
+    assert [record["request_id"] for record in records] == [f"r{i}" for i in range(21)]
+    assert records[0]["prompt_tokens"] == 2
+    assert written.value == 21
+
+
+def test_full_queue_drops_records_instead_of_blocking(tmp_path):
+    dropped = _Counter()
+    log = InferenceLog(tmp_path, max_queue=3, dropped_counter=dropped)
+    for i in range(5):
+        log.log(_record(i))
+    assert dropped.value == 2
+
+    assert log.flush() == 3
+    log.stop()
+    assert [record["request_id"] for record in iter_records(tmp_path)] == ["r0", "r1", "r2"]
+
+
+def test_two_writers_sharing_a_directory_keep_every_record(tmp_path):
+    writers = [InferenceLog(tmp_path, max_bytes=200, writer_id=f"w{n}") for n in range(2)]
+    for i in range(40):
+        writers[i % 2].write_batch([_record(i)], now=i)
+    for log in writers:
+        log.stop()
+
+    ids = sorted(record["request_id"] for record in iter_records(tmp_path))
+    assert ids == sorted(f"r{i}" for i in range(40))
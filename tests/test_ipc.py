@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from app.inference_server import InferenceServer
+from app.ipc import InferenceClient, InferenceServerError
+from app.schemas import PredictRequest
+
+
+def test_client_round_trip_through_inference_server(tmp_path):
+    def generate(payload):
+        if payload["prompt"] == "fail":
+            raise RuntimeError("boom")
+        return payload["prompt"].upper()
+
+    socket_path = str(tmp_path / "inference.sock")
+    server = InferenceServer(socket_path, generate, lambda: {"model_ready": True})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = InferenceClient(socket_path, pool_size=2)
+
+    try:
+        assert client.health() == {"model_ready": True}
+        assert client.generate(PredictRequest(prompt="hello")) == "HELLO"
+        # Pooled connections are reused for later calls
+        assert client.generate(PredictRequest(prompt="again")) == "AGAIN"
+        with pytest.raises(InferenceServerError):
+            client.generate(PredictRequest(prompt="fail"))
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_stuck_inference_process_times_out_with_504(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main as api
+
+    release = threading.Event()
+
+    def generate(payload):
+        release.wait(5)
+        return "late"
+
+    socket_path = str(tmp_path / "inference.sock")
+    server = InferenceServer(socket_path, generate, lambda: {"model_ready": True})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    inference_client = InferenceClient(socket_path, pool_size=1, timeout=0.2)
+    monkeypatch.setattr(api, "inference_client", inference_client)
+    monkeypatch.setattr(api, "response_cache", None)
+
+    try:
+        response = TestClient(api.app).post("/predict", json={"prompt": "hello", "max_new_tokens": 4})
+        assert response.status_code == 504
+        # The timed-out connection is not returned to the pool
+        assert inference_client._idle.empty()
+    finally:
+        release.set()
+        inference_client.close()
+        server.shutdown()
+        server.server_close()
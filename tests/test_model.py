@@ -0,0 +1,61 @@
+import pytest
+import torch
+from transformers import AutoModelForCausalLM, Qwen2Config
+
+from app.model_loader import load_causal_lm, quantize_dynamic_int8, write_snapshot_manifest
+
+
+def _tiny_model():
+    config = Qwen2Config(
+        vocab_size=64,
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=1,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        tie_word_embeddings=True,
+    )
+    return AutoModelForCausalLM.from_config(config).eval()
+
+
+def test_unknown_precision_is_rejected():
+    with pytest.raises(ValueError):
+        load_causal_lm("unused", precision="fp8")
+
+
+def test_dynamic_int8_quantizes_linear_layers_except_output_head():
+    model = quantize_dynamic_int8(_tiny_model())
+
+    remaining_float_linears = [
+        name for name, module in model.named_modules() if type(module) is torch.nn.Linear
+    ]
+    assert remaining_float_linears == ["lm_head"]
+
+    with torch.no_grad():
+        outputs = model.generate(torch.tensor([[1, 2, 3]]), max_new_tokens=3, do_sample=False)
+    assert outputs.shape == (1, 6)
+
+
+def test_mmap_snapshot_matches_from_pretrained(tmp_path):
+    model = _tiny_model()
+    model.save_pretrained(tmp_path, safe_serialization=True)
+    write_snapshot_manifest(model, tmp_path, "tiny")
+
+    phase_durations = {}
+    snapshot_model = load_causal_lm(str(tmp_path), "fp32", phase_durations)
+
+    assert "weights_mmap" in phase_durations
+    input_ids = torch.tensor([[1, 2, 3, 4]])
+    with torch.no_grad():
+        assert torch.allclose(model(input_ids).logits, snapshot_model(input_ids).logits)
+
+
+@pytest.mark.parametrize("precision", ["fp32", "dynamic-int8"])
+def test_bf16_checkpoint_is_served_in_float32(tmp_path, precision):
+    _tiny_model().to(torch.bfloat16).save_pretrained(tmp_path)
+    model = load_causal_lm(str(tmp_path), precision)
+
+    assert model.get_input_embeddings().weight.dtype == torch.float32
+    with torch.no_grad():
+        outputs = model.generate(torch.tensor([[1, 2, 3]]), max_new_tokens=3, do_sample=False)
+    assert outputs.shape == (1, 6)
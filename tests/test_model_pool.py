@@ -0,0 +1,90 @@
+import threading
+
+import torch
+
+from app.model_pool import ModelPool
+
+
+def _loader(loads):
+    def load(version):
+        loads.append(version)
+        return f"tokenizer-{version}", torch.nn.Linear(4, 4)
+    return load
+
+
+def test_least_recently_used_version_is_evicted_but_active_is_kept():
+    loads = []
+    pool = ModelPool(_loader(loads), active_version="a", max_models=2)
+    pool.get()
+    pool.get("b")
+    pool.get("c")
+
+    assert pool.resident_versions() == ["a", "c"]
+    pool.get("a")
+    assert loads == ["a", "b", "c"]
+
+
+def test_activate_switches_only_after_warmup():
+    warmed = threading.Event()
+    release = threading.Event()
+
+    def warmup(tokenizer, model):
+        warmed.set()
+        release.wait(5)
+
+    activated = []
+    pool = ModelPool(_loader([]), active_version="a", warmup=warmup)
+    thread = pool.activate("b", on_ready=activated.append)
+
+    assert warmed.wait(5)
+    assert pool.active_version == "a"
+    release.set()
+    thread.join(5)
+    assert pool.active_version == "b"
+    assert activated == ["b"]
+    assert pool.get()[0] == "tokenizer-b"
+
+
+def test_pinned_version_is_loaded_before_it_reaches_the_batch_loop(tmp_path, monkeypatch):
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    from app import main as api
+    from app.schemas import PredictRequest
+    from src.benchmark_serving import build_tiny_model
+
+    path = build_tiny_model(tmp_path / "tiny-model")
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    tokenizer.padding_side = "left"
+    model = AutoModelForCausalLM.from_pretrained(path).eval()
+    load_threads = []
+
+    def load(version):
+        load_threads.append(threading.current_thread().name)
+        return tokenizer, model
+
+    monkeypatch.setattr(api, "model_pool", ModelPool(load, active_version="a"))
+    monkeypatch.setattr(api, "_batcher", None)
+    try:
+        text = api.generate_text(PredictRequest(prompt="hello", max_new_tokens=2, do_sample=False, model_version="b"))
+    finally:
+        api._batcher.stop()
+
+    assert isinstance(text, str)
+    # Loaded by the caller; the batch loop only ever saw a resident version
+    assert load_threads == [threading.current_thread().name]
+
+
+def test_counting_tokens_never_loads_model_weights(tmp_path, monkeypatch):
+    from app import main as api
+    from src.benchmark_serving import build_tiny_model
+
+    path = build_tiny_model(tmp_path / "tiny-model")
+    loads = []
+    monkeypatch.setattr(api, "model_pool", ModelPool(_loader(loads), active_version="a"))
+    monkeypatch.setattr(api, "model_source_for", lambda version: (str(path), True))
+    api.load_tokenizer.cache_clear()
+    try:
+        assert api.count_tokens("b", "cloud model pipeline") > 0
+    finally:
+        api.load_tokenizer.cache_clear()
+    assert loads == []
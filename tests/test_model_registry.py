@@ -0,0 +1,70 @@
+import json
+import threading
+
+import pytest
+
+from src import model_registry
+from src.model_registry import ModelRegistry
+
+
+def test_list_models_filters_sorts_and_paginates(tmp_path):
+    registry = ModelRegistry(tmp_path / "registry")
+    for i, accuracy in enumerate([0.7, 0.9, 0.8]):
+        registry.register_model_dir(tmp_path / f"m{i}", {"accuracy": accuracy}, version=f"v{i}")
+
+    assert list(registry.list_models(min_metrics={"accuracy": 0.75}, sort_metric="accuracy")) == ["v1", "v2"]
+    assert list(registry.list_models(sort_metric="accuracy", limit=1, offset=1)) == ["v2"]
+    assert registry.list_models(active=True) == {}
+
+
+def test_concurrent_writers_and_single_active_version(tmp_path):
+    path = tmp_path / "registry"
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    (model_dir / "config.json").write_text("{}")
+    threads = [
+        threading.Thread(target=lambda i=i: ModelRegistry(path).register_model_dir(model_dir, {}, version=f"v{i}"))
+        for i in range(8)
+    ]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+    registry = ModelRegistry(path)
+    assert len(registry.list_models()) == 8
+    registry.set_active_model("v3")
+    # A second handle (e.g. another process) switching versions invalidates the cached read
+    ModelRegistry(path).set_active_model("v5")
+    assert registry.get_active_version()[0] == "v5"
+    assert list(registry.list_models(active=True)) == ["v5"]
+
+
+def test_legacy_metadata_is_imported(tmp_path):
+    path = tmp_path / "registry"
+    path.mkdir()
+    (path / "metadata.json").write_text(json.dumps({
+        "old": {"path": "model_vold.joblib", "metrics": {"accuracy": 1.0}, "created_at": "2024-01-01", "is_active": True}
+    }))
+
+    version, info = ModelRegistry(path).get_active_version()
+    assert version == "old"
+    assert info["format"] == "joblib"
+
+
+def test_writers_in_the_same_second_get_distinct_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "_new_version", lambda: "20240101_120000")
+    path = tmp_path / "registry"
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    (model_dir / "config.json").write_text("{}")
+
+    first = ModelRegistry(path).register_model_dir(model_dir, {"accuracy": 0.8})
+    ModelRegistry(path).set_active_model(first)
+    second = ModelRegistry(path).register_model_dir(model_dir, {"accuracy": 0.9})
+    assert (first, second) == ("20240101_120000", "20240101_120000_1")
+
+    registry = ModelRegistry(path)
+    with pytest.raises(ValueError):
+        registry.register_model_dir(model_dir, {}, version=first)
+    # The rejected re-save neither replaced the row nor deactivated it
+    assert registry.get_version(first)["metrics"] == {"accuracy": 0.8}
+    assert registry.get_active_version()[0] == first
@@ -0,0 +1,83 @@
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from app.prefix_cache import PrefixCache
+from app.scheduler import ContinuousBatchScheduler
+from app.schemas import PredictRequest
+from src.benchmark_serving import build_tiny_model
+
+
+def _layers(length, num_layers=2):
+    return [(torch.zeros(1, 2, length, 4), torch.zeros(1, 2, length, 4)) for _ in range(num_layers)]
+
+
+def test_lookup_returns_longest_cached_prefix():
+    cache = PrefixCache(max_entries=4)
+    cache.put([1, 2], _layers(2))
+    cache.put([1, 2, 3], _layers(3))
+
+    length, layers = cache.lookup([1, 2, 3, 4])
+    assert length == 3
+    assert layers[0][0].shape[2] == 3
+
+    assert cache.lookup([9, 9]) == (0, None)
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PrefixCache(max_entries=2)
+    cache.put([1], _layers(1))
+    cache.put([2], _layers(1))
+    cache.lookup([1, 5])
+    cache.put([3], _layers(1))
+
+    assert cache.lookup([2])[0] == 0
+    assert cache.lookup([1])[0] == 1
+    assert len(cache) == 2
+    assert cache.nbytes == 2 * 2 * 2 * (2 * 1 * 4 * 4)
+
+
+def test_entries_are_scoped_by_namespace():
+    cache = PrefixCache(max_entries=4)
+    cache.put([1, 2], _layers(2), namespace="v1")
+
+    assert cache.lookup([1, 2, 3], namespace="v2") == (0, None)
+    assert cache.lookup([1, 2, 3], namespace="v1")[0] == 2
+
+
+def _chat_prompt(tokenizer, prompt):
+    messages = [{"role": "system", "content": "You are a helpful AI assistant."}, {"role": "user", "content": prompt}]
+    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+
+def test_scheduler_prefill_from_cached_prefix_matches_cold_prefill(tmp_path):
+    path = build_tiny_model(tmp_path / "tiny-model")
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = AutoModelForCausalLM.from_pretrained(path).eval()
+    cache = PrefixCache(max_entries=8)
+    scheduler = ContinuousBatchScheduler(lambda version: (tokenizer, model), _chat_prompt, prefix_cache=cache)
+
+    def expected(prompt):
+        input_ids = tokenizer(_chat_prompt(tokenizer, prompt), return_tensors="pt").input_ids
+        with torch.no_grad():
+            output = model.generate(input_ids, max_new_tokens=8, do_sample=False, pad_token_id=tokenizer.pad_token_id)
+        return tokenizer.decode(output[0, input_ids.shape[1]:], skip_special_tokens=True)
+
+    def generate(prompt):
+        return scheduler.submit(PredictRequest(prompt=prompt, max_new_tokens=8, do_sample=False), timeout=60)
+
+    try:
+        cold = generate("cloud model pipeline")
+        assert (cache.hits, cache.misses) == (0, 1)
+        # The prompt and the shared system preamble were both stored
+        preamble = scheduler._shared_prefix_ids(tokenizer)
+        assert cache.lookup(list(preamble) + [0])[0] == len(preamble)
+
+        assert generate("cloud model pipeline") == cold == expected("cloud model pipeline")
+        # Another prompt with the same preamble starts from the cached preamble
+        assert generate("deploy version") == expected("deploy version")
+    finally:
+        scheduler.stop()
+    assert cache.hits == 3
+
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, LogitsProcessorList, Qwen2Config
+
+from app.profiling import FirstTokenTimer, PhaseTimer, sample_stacks
+from app.schemas import PredictRequest
+
+
+def test_phase_timer_publishes_to_requests_and_splits_generate():
+    config = Qwen2Config(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=1,
+        num_attention_heads=4, num_key_value_heads=2,
+    )
+    model = AutoModelForCausalLM.from_config(config).eval()
+    timer = PhaseTimer()
+    with timer.phase("tokenize"):
+        input_ids = torch.tensor([[1, 2, 3]])
+
+    first_token = FirstTokenTimer()
+    start = time.perf_counter()
+    with torch.no_grad():
+        model.generate(
+            input_ids, max_new_tokens=4, do_sample=False, logits_processor=LogitsProcessorList([first_token])
+        )
+    finished = time.perf_counter()
+    split = first_token.split(start, finished)
+    assert split["prefill"] > 0 and split["decode"] > 0
+    assert abs(split["prefill"] + split["decode"] - (finished - start)) < 1e-9
+
+    requests = [PredictRequest(prompt="a"), PredictRequest(prompt="b")]
+    timer.add("prefill", split["prefill"])
+    timer.publish(requests)
+    assert all(set(req.phase_timings) == {"tokenize", "prefill"} for req in requests)
+    assert "phase_timings" not in requests[0].model_dump()
+
+
+def test_stack_sampler_sees_other_threads():
+    stop = threading.Event()
+
+    def busy_waiting_worker():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    worker = threading.Thread(target=busy_waiting_worker, name="sampled-worker")
+    worker.start()
+    try:
+        stacks = sample_stacks(0.1, 0.005)
+    finally:
+        stop.set()
+        worker.join()
+    line = next(line for line in stacks.splitlines() if line.startswith("sampled-worker;"))
+    assert "busy_waiting_worker" in line
+    assert int(line.rsplit(" ", 1)[1]) > 1
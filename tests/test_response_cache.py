@@ -0,0 +1,52 @@
+import time
+
+from app.response_cache import ResponseCache, SqliteResponseCache, is_deterministic, response_cache_key
+from app.schemas import PredictRequest
+
+
+def test_only_greedy_or_seeded_requests_are_deterministic():
+    assert not is_deterministic(PredictRequest(prompt="hi"))
+    assert is_deterministic(PredictRequest(prompt="hi", do_sample=False))
+    assert is_deterministic(PredictRequest(prompt="hi", seed=7))
+
+
+def test_cache_key_ignores_sampling_params_for_greedy_requests():
+    greedy = PredictRequest(prompt="hi", do_sample=False, temperature=0.2)
+    other = PredictRequest(prompt="hi", do_sample=False, temperature=0.9)
+    assert response_cache_key(greedy, "model-a") == response_cache_key(other, "model-a")
+    assert response_cache_key(greedy, "model-a") != response_cache_key(greedy, "model-b")
+    assert response_cache_key(greedy, "model-a") != response_cache_key(greedy, "model-a", draft="draft:5")
+
+    seeded = PredictRequest(prompt="hi", seed=1)
+    assert response_cache_key(seeded, "model-a") != response_cache_key(
+        PredictRequest(prompt="hi", seed=2), "model-a"
+    )
+
+
+def test_memory_cache_evicts_and_expires():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+
+    expiring = ResponseCache(ttl_seconds=0.01)
+    expiring.set("a", "1")
+    time.sleep(0.02)
+    assert expiring.get("a") is None
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = tmp_path / "cache.db"
+    writer = SqliteResponseCache(path, max_entries=2)
+    reader = SqliteResponseCache(path, max_entries=2)
+
+    writer.set("a", "1")
+    assert reader.get("a") == "1"
+
+    writer.set("b", "2")
+    writer.set("c", "3")
+    assert reader.get("a") is None
+    assert reader.get("c") == "3"
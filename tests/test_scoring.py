@@ -0,0 +1,107 @@
+import io
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.datasets import load_iris
+from sklearn.linear_model import LogisticRegression
+
+from app.scoring import (
+    ARROW_CONTENT_TYPE,
+    NUMPY_CONTENT_TYPE,
+    BatchScorer,
+    UnsupportedMediaTypeError,
+    decode_features,
+    encode_scores,
+)
+
+
+def _fit(path, with_names=True):
+    X, y = load_iris(return_X_y=True, as_frame=with_names)
+    model = LogisticRegression(max_iter=200).fit(X, y)
+    joblib.dump(model, path)
+    return model, np.asarray(X, dtype=np.float64)
+
+
+def test_json_and_numpy_bodies_score_like_predict_proba(tmp_path):
+    model, X = _fit(tmp_path / "model.joblib")
+    scorer = BatchScorer(tmp_path / "model.joblib")
+    names = scorer.feature_names()
+    expected = model.predict_proba(pd.DataFrame(X, columns=names))
+
+    npy = io.BytesIO()
+    np.save(npy, X)
+    reversed_names = {name: X[:, index].tolist() for index, name in reversed(list(enumerate(names)))}
+    bodies = [
+        (json.dumps({"columns": X.T.tolist()}).encode(), "application/json"),
+        (json.dumps({"columns": reversed_names}).encode(), "application/json; charset=utf-8"),
+        (npy.getvalue(), NUMPY_CONTENT_TYPE),
+    ]
+    for body, content_type in bodies:
+        features = decode_features(body, content_type, names, scorer.n_features())
+        scores = scorer.score(features)
+        np.testing.assert_allclose(scores["probabilities"], expected)
+        assert scores["model_version"] == "model.joblib"
+
+    payload = json.loads(encode_scores(scores, "application/json")[0])
+    assert payload["rows"] == len(X) and payload["predictions"] == model.predict(X).tolist()
+    np.testing.assert_allclose(payload["probabilities"]["2"], expected[:, 2])
+
+
+def test_arrow_body_and_response(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    model, X = _fit(tmp_path / "model.joblib")
+    scorer = BatchScorer(tmp_path / "model.joblib")
+    names = scorer.feature_names()
+
+    arrow = pa.BufferOutputStream()
+    # Columns in reverse order are matched to the model's features by name
+    table = pa.table({name: X[:, index] for index, name in reversed(list(enumerate(names)))})
+    with pa.ipc.new_stream(arrow, table.schema) as writer:
+        writer.write_table(table)
+    features = decode_features(arrow.getvalue().to_pybytes(), ARROW_CONTENT_TYPE, names, scorer.n_features())
+    scores = scorer.score(features)
+    np.testing.assert_allclose(scores["probabilities"], model.predict_proba(pd.DataFrame(X, columns=names)))
+
+    content, media_type = encode_scores(scores, ARROW_CONTENT_TYPE)
+    result = pa.ipc.open_stream(content).read_all()
+    assert media_type == ARROW_CONTENT_TYPE
+    assert result.column_names == ["prediction", "probability_0", "probability_1", "probability_2"]
+
+
+def test_invalid_batches_are_rejected_and_model_reloads_on_swap(tmp_path):
+    _fit(tmp_path / "model.joblib", with_names=False)
+    scorer = BatchScorer(tmp_path / "model.joblib")
+    with pytest.raises(ValueError):
+        scorer.score(np.ones((3, 2)))
+    with pytest.raises(ValueError):
+        decode_features(b'{"columns": [[1, 2], [3]]}', "application/json", None, 4)
+    with pytest.raises(UnsupportedMediaTypeError):
+        decode_features(b"1,2,3,4", "text/csv", None, 4)
+    npy = io.BytesIO()
+    np.save(npy, np.ones((3, 4)))
+    for body in (b"", npy.getvalue()[:-8]):
+        with pytest.raises(ValueError):
+            decode_features(body, NUMPY_CONTENT_TYPE, None, 4)
+
+    first = scorer.current()[0]
+    assert scorer.current()[0] is first
+    replacement = tmp_path / "replacement.joblib"
+    _fit(replacement, with_names=False)
+    os.replace(replacement, tmp_path / "model.joblib")
+    assert scorer.current()[0] is not first
+
+
+def test_empty_and_truncated_arrow_bodies_are_rejected():
+    pa = pytest.importorskip("pyarrow")
+    arrow = pa.BufferOutputStream()
+    table = pa.table({f"f{index}": [1.0, 2.0] for index in range(4)})
+    with pa.ipc.new_stream(arrow, table.schema) as writer:
+        writer.write_table(table)
+    body = arrow.getvalue().to_pybytes()
+    for truncated in (b"", body[:50], body[:-20]):
+        with pytest.raises(ValueError):
+            decode_features(truncated, ARROW_CONTENT_TYPE, None, 4)
@@ -0,0 +1,82 @@
+import torch
+from transformers import AutoModelForCausalLM, Qwen2Config
+
+from app.speculative import SpeculativeDecoder
+
+
+def _tiny_model(seed):
+    torch.manual_seed(seed)
+    config = Qwen2Config(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=1,
+        num_attention_heads=4, num_key_value_heads=2, eos_token_id=None,
+    )
+    return AutoModelForCausalLM.from_config(config).eval()
+
+
+class _Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+def test_identical_draft_is_fully_accepted_and_matches_greedy_output():
+    target = _tiny_model(0)
+    draft = _tiny_model(0)
+    # Random weights are never confident; keep drafting the full length anyway
+    draft.generation_config.assistant_confidence_threshold = 0
+    drafted, accepted = _Counter(), _Counter()
+    decoder = SpeculativeDecoder(draft, num_draft_tokens=4, drafted_counter=drafted, accepted_counter=accepted)
+
+    input_ids = torch.tensor([[1, 2, 3]])
+    with torch.no_grad():
+        expected = target.generate(input_ids, max_new_tokens=20, min_new_tokens=20, do_sample=False)
+        outputs = decoder.generate(target, input_ids=input_ids, max_new_tokens=20, min_new_tokens=20, do_sample=False)
+
+    assert torch.equal(outputs, expected)
+    # Four target steps, each verifying four drafted tokens and adding one of its own
+    assert drafted.value == accepted.value == 16
+
+
+def test_statistics_count_forward_passes_of_both_models():
+    class Recorder:
+        def __init__(self):
+            self.values = []
+
+        def observe(self, value):
+            self.values.append(value)
+
+    acceptance, tokens_per_step = Recorder(), Recorder()
+    draft = _tiny_model(1)
+    draft.generation_config.assistant_confidence_threshold = 0
+    decoder = SpeculativeDecoder(
+        draft, num_draft_tokens=4, acceptance_histogram=acceptance, tokens_per_step_histogram=tokens_per_step
+    )
+    with torch.no_grad():
+        decoder.generate(_tiny_model(0), input_ids=torch.tensor([[1, 2, 3]]), max_new_tokens=12, min_new_tokens=12, do_sample=False)
+
+    assert len(acceptance.values) == 1 and 0.0 <= acceptance.values[0] <= 1.0
+    assert 1.0 <= tokens_per_step.values[0] <= 5.0
+
+
+def test_seeded_requests_generate_the_same_text_with_a_draft(tmp_path, monkeypatch):
+    from transformers import AutoTokenizer
+
+    from app import main as api
+    from app.schemas import PredictRequest
+    from src.benchmark_serving import build_tiny_model
+
+    path = build_tiny_model(tmp_path / "tiny-model")
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = AutoModelForCausalLM.from_pretrained(path).eval()
+    draft = AutoModelForCausalLM.from_pretrained(path).eval()
+    draft.generation_config.assistant_confidence_threshold = 0
+    monkeypatch.setattr(api, "get_model", lambda version=None: (tokenizer, model))
+
+    def generate(decoder):
+        monkeypatch.setattr(api, "speculative_decoder", lambda: decoder)
+        req = PredictRequest(prompt="cloud model pipeline", max_new_tokens=16, seed=3, temperature=1.0, top_p=1.0)
+        return api.generate_batch([req])
+
+    assert generate(SpeculativeDecoder(draft, num_draft_tokens=4)) == generate(None)
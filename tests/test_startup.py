@@ -0,0 +1,45 @@
+from app.startup import StartupTracker
+
+
+class _Gauge:
+    def __init__(self):
+        self.values = {}
+
+    def labels(self, phase):
+        self.phase = phase
+        return self
+
+    def set(self, value):
+        self.values[getattr(self, "phase", None)] = value
+
+
+def test_phases_are_timed_and_a_failure_does_not_stop_later_phases():
+    phases_gauge, ready_gauge = _Gauge(), _Gauge()
+    tracker = StartupTracker(0.0, phase_gauge=phases_gauge, ready_gauge=ready_gauge)
+    assert tracker.status()["ready"] is False
+
+    ran = []
+
+    def broken():
+        raise RuntimeError("no weights")
+
+    tracker.start([("model_load", broken), ("classifier_load", lambda: ran.append("classifier"))])
+    assert tracker.wait(5)
+
+    status = tracker.status(is_ready=False)
+    assert ran == ["classifier"]
+    assert status == {
+        "ready": False,
+        "phase": "failed",
+        "phase_seconds": tracker.durations,
+        "error": "model_load: RuntimeError",
+    }
+    assert set(phases_gauge.values) == {"model_load", "classifier_load"}
+    assert ready_gauge.values[None] == 0
+
+
+def test_ready_once_all_phases_finished_and_the_model_is_loaded():
+    tracker = StartupTracker(0.0)
+    tracker.run([("ml_import", lambda: None)])
+    assert tracker.status(is_ready=False)["ready"] is False
+    assert tracker.status(is_ready=True) == {"ready": True, "phase": "done", "phase_seconds": tracker.durations}